@@ -0,0 +1,336 @@
+"""
+Asynchronous actor-learner training for DQNAgent.
+
+    python actor_learner.py --path /tmp/qwixx_model --actors 4 --updates 100000
+
+Actor processes play QwixxVectorEnv games with an epsilon-greedy policy over a
+NumpyQNetwork copy of the agent's model, so they never load keras. They send
+whole episodes through a bounded queue. In the learner process a feeder thread moves the episodes
+into the agent's replay buffer and a learner thread calls agent.replay without
+pause, publishing the weights to the actors every sync_every updates through
+shared memory.
+
+replay_ratio is the number of gradient updates per transition collected. The
+learner waits for transitions when it gets ahead. When it falls behind by more
+than max_lead transitions the feeder stops draining the queue, the queue fills up
+and the actors block, so neither side runs away from the other.
+
+Every actor explores with its own fixed epsilon, by default spread from 0.4 down
+to 0.4 ** 8 over the actors as in Ape-X, the agent's epsilon isn't used.
+"""
+import argparse
+import multiprocessing as mp
+import os
+import queue
+import sys
+import threading
+import time
+from collections import deque
+
+import numpy as np
+
+from inference import NumpyQNetwork, model_layout
+from qwixx_gym.envs.qwixx_vector_env import QwixxVectorEnv
+
+
+def ape_x_epsilons(num_actors, base=0.4, alpha=7):
+    if num_actors == 1:
+        return [base]
+    return [base ** (1 + alpha * i / (num_actors - 1)) for i in range(num_actors)]
+
+
+def _unflatten(flat, shapes):
+    weights, start = [], 0
+    for shape in shapes:
+        size = int(np.prod(shape))
+        weights.append(flat[start:start + size].reshape(shape))
+        start += size
+    return weights
+
+
+def _episode(steps, terminal_observation):
+    states = np.stack([observation for observation, _, _ in steps])
+    next_states = np.concatenate([states[1:], terminal_observation[None]])
+    dones = np.zeros(len(steps), dtype=np.bool_)
+    dones[-1] = True
+    return (states, np.array([action for _, action, _ in steps]),
+            np.array([reward for _, _, reward in steps], dtype=np.float32), next_states, dones)
+
+
+def _actor(seed, epsilon, layout, shared, version, episodes_queue, stop, num_envs, send_size, env_kwargs):
+    """Plays and sends batches of (states, actions, rewards, next_states, dones, scores) until stop is set"""
+    env_seed, policy_seed = seed.spawn(2)
+    shapes, activations = layout
+    env = QwixxVectorEnv(num_envs, seed=env_seed, **env_kwargs)
+    rng = np.random.default_rng(policy_seed)
+    # don't keep the process alive for batches nobody reads any more
+    episodes_queue.cancel_join_thread()
+    seen, network = -1, None
+    observations, mask = env.reset(), env.legal_action_mask()
+    steps = [[] for _ in range(num_envs)]
+    pending, pending_size = [], 0
+    while not stop.is_set():
+        if version.value != seen:
+            with shared.get_lock():
+                seen = version.value
+                weights = _unflatten(np.frombuffer(shared.get_obj(), dtype=np.float32).copy(), shapes)
+            network = NumpyQNetwork(weights, activations)
+        greedy = np.argmax(np.where(mask, network(observations), -np.inf), axis=1)
+        explore = np.argmax(mask * rng.random(mask.shape), axis=1)
+        actions = np.where(rng.random(num_envs) < epsilon, explore, greedy)
+        next_observations, rewards, dones, info = env.step(actions)
+        for row in range(num_envs):
+            steps[row].append((observations[row], actions[row], rewards[row]))
+        for k, row in enumerate(np.flatnonzero(dones)):
+            pending.append(_episode(steps[row], info["terminal_observation"][k]) + (info["score"][row],))
+            pending_size += len(steps[row])
+            steps[row] = []
+        if pending_size >= send_size:
+            batch = tuple(np.concatenate([episode[i] for episode in pending]) for i in range(5))
+            batch += (np.array([episode[5] for episode in pending]),)
+            while not stop.is_set():
+                try:
+                    episodes_queue.put(batch, timeout=0.1)
+                    break
+                except queue.Full:
+                    pass
+            pending, pending_size = [], 0
+        observations, mask = next_observations, info["action_mask"]
+
+
+class _LockedBuffer:
+    """
+    The agent's replay buffer with the methods the feeder and learner threads share
+    serialized. agent.replay runs between sample and update_priorities without the
+    lock, priorities of slots the feeder overwrote meanwhile are dropped.
+    """
+
+    def __init__(self, buffer, lock):
+        self.buffer = buffer
+        self.lock = lock
+        # the buffer's position and added count at the last sample
+        self._sampled = 0, 0
+
+    def __getattr__(self, name):
+        return getattr(self.buffer, name)
+
+    def __len__(self):
+        return len(self.buffer)
+
+    def add_batch(self, *args):
+        with self.lock:
+            self.buffer.add_batch(*args)
+
+    def sample(self, batch_size):
+        with self.lock:
+            self._sampled = self.buffer.position, self.buffer.added
+            return self.buffer.sample(batch_size)
+
+    def update_priorities(self, indices, td_errors):
+        with self.lock:
+            position, added = self._sampled
+            # the new transitions and the slot after them were written from position on
+            kept = (indices - position) % self.buffer.capacity > self.buffer.added - added
+            if kept.any():
+                self.buffer.update_priorities(indices[kept], td_errors[kept])
+
+    def save(self, directory):
+        with self.lock:
+            self.buffer.save(directory)
+
+
+class ActorLearner:
+    """
+    Trains agent, a DQNAgent with a model of Dense layers, see the module docstring.
+    start launches the actors and threads, run trains for a number of updates or
+    seconds and stops everything again.
+    """
+
+    def __init__(self, agent, num_actors=None, envs_per_actor=16, batch_size=32, replay_ratio=0.25,
+                 max_lead=10000, warmup=1000, sync_every=100, queue_size=16, send_size=256,
+                 epsilons=None, seed=None, start_method="spawn", **env_kwargs):
+        self.agent = agent
+        self.num_actors = num_actors or max(1, (os.cpu_count() or 2) - 1)
+        self.envs_per_actor = envs_per_actor
+        self.batch_size = batch_size
+        self.replay_ratio = replay_ratio
+        self.max_lead = max_lead
+        self.warmup = warmup
+        self.sync_every = sync_every
+        self.send_size = send_size
+        self.epsilons = epsilons or ape_x_epsilons(self.num_actors)
+        self.seed = seed
+        self.env_kwargs = env_kwargs
+        self.transitions = 0
+        self.episodes = 0
+        self.updates = 0
+        self.scores = deque(maxlen=1000)
+        self.error = None
+        self._context = mp.get_context(start_method)
+        self._queue = self._context.Queue(queue_size)
+        self._stop = self._context.Event()
+        self._progress = threading.Condition()
+        self._buffer_lock = threading.Lock()
+        self._layout = [weight.shape for weight in agent.model.get_weights()], model_layout(agent.model)
+        size = sum(int(np.prod(shape)) for shape in self._layout[0])
+        self._weights = self._context.Array("f", size)
+        self._version = self._context.Value("q", 0)
+        self._actors = []
+        self._threads = []
+        self._started = None
+
+    def start(self):
+        self._publish()
+        self.agent.memory = _LockedBuffer(self.agent.memory, self._buffer_lock)
+        seeds = np.random.SeedSequence(self.seed).spawn(self.num_actors)
+        for seed, epsilon in zip(seeds, self.epsilons):
+            actor = self._context.Process(target=_actor, daemon=True, args=(
+                seed, epsilon, self._layout, self._weights, self._version, self._queue, self._stop,
+                self.envs_per_actor, self.send_size, self.env_kwargs))
+            actor.start()
+            self._actors.append(actor)
+        self._threads = [threading.Thread(target=self._guard, args=(target,), daemon=True)
+                         for target in (self._feed, self._learn)]
+        for thread in self._threads:
+            thread.start()
+        self._started = time.perf_counter()
+
+    def run(self, num_updates=None, duration=None, log_every=10.0):
+        """Trains until num_updates updates or duration seconds, logging every log_every seconds"""
+        if self._started is None:
+            self.start()
+        last_log = time.perf_counter()
+        try:
+            while self.error is None:
+                now = time.perf_counter()
+                if num_updates is not None and self.updates >= num_updates:
+                    break
+                if duration is not None and now - self._started >= duration:
+                    break
+                if log_every and now - last_log >= log_every:
+                    last_log = now
+                    print(self.summary())
+                time.sleep(0.05)
+        finally:
+            self.stop()
+        if self.error is not None:
+            raise self.error
+        return self.stats()
+
+    def stop(self):
+        self._stop.set()
+        with self._progress:
+            self._progress.notify_all()
+        for thread in self._threads:
+            thread.join()
+        # drain what the actors still put so none of them blocks on a full pipe
+        deadline = time.perf_counter() + 5
+        while any(actor.is_alive() for actor in self._actors) and time.perf_counter() < deadline:
+            try:
+                self._queue.get(timeout=0.05)
+            except queue.Empty:
+                pass
+        for actor in self._actors:
+            actor.join(timeout=1)
+            if actor.is_alive():
+                actor.terminate()
+        self._actors, self._threads = [], []
+        if isinstance(self.agent.memory, _LockedBuffer):
+            self.agent.memory = self.agent.memory.buffer
+
+    def stats(self):
+        elapsed = time.perf_counter() - (self._started or time.perf_counter())
+        return {
+            "elapsed": elapsed,
+            "transitions": self.transitions,
+            "episodes": self.episodes,
+            "updates": self.updates,
+            "transitions_per_second": self.transitions / max(elapsed, 1e-9),
+            "updates_per_second": self.updates / max(elapsed, 1e-9),
+            "mean_score": float(np.mean(self.scores)) if self.scores else None,
+        }
+
+    def summary(self):
+        stats = self.stats()
+        return "{:8.0f}s {:>12,d} transitions {:>10,.0f}/s {:>10,d} updates {:>8,.1f}/s  score {}".format(
+            stats["elapsed"], stats["transitions"], stats["transitions_per_second"], stats["updates"],
+            stats["updates_per_second"],
+            "-" if stats["mean_score"] is None else "{:.1f}".format(stats["mean_score"]))
+
+    def _guard(self, target):
+        try:
+            target()
+        except Exception as e:
+            self.error = e
+            self._stop.set()
+
+    def _publish(self):
+        flat = np.concatenate([weight.ravel() for weight in self.agent.model.get_weights()])
+        with self._weights.get_lock():
+            np.frombuffer(self._weights.get_obj(), dtype=np.float32)[:] = flat
+            self._version.value += 1
+
+    def _behind(self):
+        return self.replay_ratio and self.transitions - self.updates / self.replay_ratio > self.max_lead
+
+    def _feed(self):
+        while not self._stop.is_set():
+            with self._progress:
+                while self._behind() and not self._stop.is_set():
+                    self._progress.wait(0.1)
+            try:
+                states, actions, rewards, next_states, dones, scores = self._queue.get(timeout=0.1)
+            except queue.Empty:
+                continue
+            self.agent.memory.add_batch(states, actions, rewards, next_states, dones)
+            with self._progress:
+                self.transitions += len(states)
+                self.episodes += len(scores)
+                self.scores.extend(scores.tolist())
+                self._progress.notify_all()
+
+    def _learn(self):
+        while not self._stop.is_set():
+            with self._progress:
+                while not self._stop.is_set() and (self.transitions < self.warmup
+                                                   or self.updates >= self.replay_ratio * self.transitions):
+                    self._progress.wait(0.1)
+            if self._stop.is_set():
+                return
+            self.agent.replay(self.batch_size)
+            with self._progress:
+                self.updates += 1
+                self._progress.notify_all()
+            if self.updates % self.sync_every == 0:
+                self._publish()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--path", default="/tmp/qwixx_model", help="where the agent's model is saved")
+    parser.add_argument("--actors", type=int, default=None, help="actor processes, cores - 1 by default")
+    parser.add_argument("--envs-per-actor", type=int, default=16)
+    parser.add_argument("--updates", type=int, default=None)
+    parser.add_argument("--duration", type=float, default=None, help="seconds to train")
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--replay-ratio", type=float, default=0.25, help="gradient updates per transition")
+    parser.add_argument("--memory-size", type=int, default=100000)
+    parser.add_argument("--prioritized", action="store_true")
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args(argv)
+
+    from dll_agent import DQNAgent
+    from qwixx_gym.envs.qwixx_spaces import action_space
+    from qwixx_gym.envs.qwixx_rules import NUM_ACTIONS, OBSERVATION_SIZE
+    agent = DQNAgent(args.path, 0.99, action_space(), gamma=0.65, state_size=OBSERVATION_SIZE,
+                     action_size=NUM_ACTIONS, memory_size=args.memory_size, prioritized=args.prioritized,
+                     flat_actions=True)
+    trainer = ActorLearner(agent, args.actors, args.envs_per_actor, args.batch_size, args.replay_ratio,
+                           seed=args.seed)
+    print(trainer.run(args.updates, args.duration))
+    agent.save()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
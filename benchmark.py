@@ -0,0 +1,225 @@
+"""
+Throughput benchmarks for the qwixx envs and DQNAgent.
+
+    python benchmark.py --output baseline.json
+    python benchmark.py --compare baseline.json --threshold 0.1
+
+Every benchmark reports operations per second, the best of --repeat runs of at
+least --min-time seconds each. With --compare the results are checked against a
+saved run and the exit code is 1 when any benchmark got slower by more than the
+threshold.
+"""
+import argparse
+import json
+import platform
+import sys
+import time
+from itertools import cycle
+
+import numpy as np
+
+from qwixx_gym.envs.qwixx_one_hot_env import QwixxOneHotEnv
+from qwixx_gym.envs.qwixx_simple_reward import QwixxSimple
+from qwixx_gym.envs.qwixx_vector_env import QwixxVectorEnv
+
+BENCHMARKS = {}
+
+
+def benchmark(name, ops=1):
+    """Registers a setup function returning the callable to time, ops operations per call"""
+
+    def register(setup):
+        BENCHMARKS[name] = (setup, ops)
+        return setup
+
+    return register
+
+
+def _stepper(env, unchecked=False):
+    """Steps env with legal random actions, resetting finished games"""
+    actions = cycle(np.random.randint(0, 1 << 30, size=1 << 16).tolist())
+    env_step = env.step_unchecked if unchecked else env.step
+
+    def step():
+        legal = np.flatnonzero(env.legal_action_mask())
+        _, _, done, _ = env_step(legal[next(actions) % len(legal)])
+        if done:
+            env.reset()
+
+    return step
+
+
+@benchmark("one_hot.step")
+def _one_hot_step(args):
+    return _stepper(QwixxOneHotEnv(backend="python"))
+
+
+@benchmark("one_hot.step_unchecked")
+def _one_hot_step_unchecked(args):
+    return _stepper(QwixxOneHotEnv(backend="python"), unchecked=True)
+
+
+@benchmark("kernel.step_unchecked")
+def _kernel_step_unchecked(args):
+    return _stepper(QwixxOneHotEnv(backend="kernel"), unchecked=True)
+
+
+@benchmark("simple.step")
+def _simple_step(args):
+    return _stepper(QwixxSimple())
+
+
+@benchmark("one_hot.reset")
+def _reset(args):
+    return QwixxOneHotEnv(backend="python").reset
+
+
+@benchmark("one_hot.serialize_state")
+def _serialize_state(args):
+    return QwixxOneHotEnv(backend="python")._serialize_state
+
+
+@benchmark("one_hot.roll_dice")
+def _roll_dice(args):
+    return QwixxOneHotEnv(backend="python")._roll_dice
+
+
+@benchmark("one_hot.calculate_reward")
+def _calculate_reward(args):
+    env = QwixxOneHotEnv(backend="python")
+    return lambda: env.calculate_reward([(1, 5)], 0)
+
+
+@benchmark("one_hot.calculate_skip_reward")
+def _calculate_skip_reward(args):
+    return QwixxOneHotEnv(backend="python").calculate_skip_reward
+
+
+def _register_batched():
+    for size in (64, 1024):
+        def vector_step(args, size=size):
+            env = QwixxVectorEnv(size)
+            preference = np.random.random((size, 45))
+            # a fixed random preference over the legal actions of every game
+            return lambda: env.step(np.argmax(env.legal_action_mask() * preference, axis=1))
+
+        benchmark("vector.step[{}]".format(size), ops=size)(vector_step)
+
+        def baseline_step(args, size=size):
+            from qwixx_gym.envs.qwixx_baselines import make_policy
+            env = QwixxVectorEnv(size, copy=False)
+            policy = make_policy("greedy_min_skip")
+            return lambda: env.step(policy(env))
+
+        benchmark("baselines.greedy_min_skip[{}]".format(size), ops=size)(baseline_step)
+
+    for batch_size in (32, 256, 1024):
+        def replay(args, batch_size=batch_size):
+            from dll_agent import DQNAgent
+            env = QwixxOneHotEnv()
+            agent = DQNAgent(args.agent_path, 0.99, env.action_space,
+                             state_size=env.observation_space.shape[-1],
+                             action_size=env.action_space.n, memory_size=4 * batch_size)
+            state = env.reset()
+            for _ in range(2 * batch_size):
+                action = agent.action_space.sample()
+                next_state, reward, done, _ = env.step(action)
+                agent.remember(state, action, reward, next_state, done)
+                state = env.reset() if done else next_state
+            return lambda: agent.replay(batch_size)
+
+        benchmark("dqn.replay[{}]".format(batch_size))(replay)
+
+
+_register_batched()
+
+
+def measure(function, ops, min_time, repeat):
+    """Best operations per second of repeat runs lasting at least min_time seconds"""
+    function()
+    calls = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(calls):
+            function()
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time / 4:
+            break
+        calls *= 2
+    calls = max(1, int(calls * min_time / max(elapsed, 1e-9)))
+    best = 0.0
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(calls):
+            function()
+        best = max(best, calls * ops / (time.perf_counter() - start))
+    return best
+
+
+def run(args):
+    results = {}
+    for name, (setup, ops) in BENCHMARKS.items():
+        if args.filter and not any(pattern in name for pattern in args.filter):
+            continue
+        np.random.seed(args.seed)
+        try:
+            function = setup(args)
+        except ImportError as e:
+            print("{:<32s} skipped, {}".format(name, e))
+            continue
+        results[name] = measure(function, ops, args.min_time, args.repeat)
+        print("{:<32s}{:>14,.0f} ops/s".format(name, results[name]))
+    return {
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "machine": platform.machine(),
+        "results": results,
+    }
+
+
+def compare(current, baseline, threshold):
+    """Prints the speed change of every benchmark, returns the names that regressed"""
+    regressed = []
+    for name, ops in current["results"].items():
+        before = baseline["results"].get(name)
+        if not before:
+            continue
+        change = ops / before - 1
+        flag = ""
+        if change < -threshold:
+            regressed.append(name)
+            flag = "  REGRESSION"
+        print("{:<32s}{:>14,.0f} -> {:>14,.0f} ops/s {:+7.1%}{}".format(name, before, ops, change, flag))
+    return regressed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--output", help="write the results as JSON to this file")
+    parser.add_argument("--compare", help="JSON results of an earlier run to compare against")
+    parser.add_argument("--threshold", type=float, default=0.1,
+                        help="relative slowdown counted as a regression")
+    parser.add_argument("--filter", nargs="*", help="only run benchmarks containing one of these")
+    parser.add_argument("--min-time", type=float, default=0.2)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--agent-path", default="/tmp/qwixx_benchmark_model",
+                        help="model directory for the DQNAgent benchmarks")
+    args = parser.parse_args(argv)
+
+    current = run(args)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(current, f, indent=2, sort_keys=True)
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressed = compare(current, baseline, args.threshold)
+        if regressed:
+            print("slower than {}: {}".format(args.compare, ", ".join(regressed)))
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,118 @@
+"""
+Checkpoints of a DQNAgent to resume training from.
+
+    checkpointer = Checkpointer(agent, "/tmp/qwixx_checkpoints")
+    extra = checkpointer.restore()  # the save's keyword arguments, None without a checkpoint
+    ...
+    checkpointer.save(episode=episode)
+
+A checkpoint is a directory checkpoint-<n> holding the model with its optimizer
+state, the target model's weights and, in agent.json, the agent's
+CHECKPOINT_ATTRIBUTES, its last ten actions and numpy's global random state. It is
+written under a temporary name and renamed when complete, then the file LATEST is
+replaced to name it, so a save cut short leaves the previous checkpoint in place.
+The newest keep checkpoints are kept.
+
+The replay buffer is saved to replay/ next to them with ReplayBuffer.save, which
+writes only the transitions added since the previous save to a new segment file and
+commits it by replacing replay/buffer.npz, and restore memory maps it instead of reading it. It is saved before the checkpoint and may hold some
+transitions more than the agent played when the checkpoint after it is missing.
+"""
+import json
+import os
+import shutil
+from collections import deque
+
+import numpy as np
+
+from replay_buffer import ReplayBuffer
+
+
+class Checkpointer:
+    """Saves agent's checkpoints to directory and restores the latest, see the module docstring"""
+
+    def __init__(self, agent, directory, keep=2):
+        self.agent = agent
+        self.directory = directory
+        self.keep = keep
+
+    def checkpoints(self):
+        """The paths of the complete checkpoints, oldest first"""
+        if not os.path.isdir(self.directory):
+            return []
+        names = sorted(name for name in os.listdir(self.directory)
+                       if name.startswith("checkpoint-") and not name.endswith(".tmp"))
+        return [os.path.join(self.directory, name) for name in names]
+
+    def latest(self):
+        try:
+            with open(os.path.join(self.directory, "LATEST")) as f:
+                path = os.path.join(self.directory, f.read().strip())
+        except FileNotFoundError:
+            return None
+        return path if os.path.isdir(path) else None
+
+    def save(self, **extra):
+        """Saves a checkpoint with the JSON serializable extra values, e.g. the episode, and returns its path"""
+        agent = self.agent
+        os.makedirs(self.directory, exist_ok=True)
+        agent.memory.save(os.path.join(self.directory, "replay"))
+        checkpoints = self.checkpoints()
+        number = int(checkpoints[-1].rsplit("-", 1)[1]) + 1 if checkpoints else 0
+        path = os.path.join(self.directory, "checkpoint-{:08d}".format(number))
+        temporary = path + ".tmp"
+        shutil.rmtree(temporary, ignore_errors=True)
+        os.makedirs(temporary)
+        agent.model.save(os.path.join(temporary, "model.h5"))
+        if agent.target_model is not None:
+            agent.target_model.save_weights(os.path.join(temporary, "target.h5"))
+        kind, keys, position, has_gauss, cached_gaussian = np.random.get_state()
+        state = {
+            "attributes": {name: getattr(agent, name) for name in agent.CHECKPOINT_ATTRIBUTES},
+            "last_ten_actions": [int(action) for action in agent.last_ten_actions],
+            "random_state": [kind, keys.tolist(), position, has_gauss, cached_gaussian],
+            "extra": extra,
+        }
+        with open(os.path.join(temporary, "agent.json"), "w") as f:
+            json.dump(state, f)
+        os.replace(temporary, path)
+        self._write_latest(os.path.basename(path))
+        for old in checkpoints[:max(len(checkpoints) + 1 - self.keep, 0)]:
+            shutil.rmtree(old, ignore_errors=True)
+        return path
+
+    def restore(self, mmap_mode="c"):
+        """
+        Loads the latest checkpoint into the agent, replacing its model and memory,
+        and returns the extra values it was saved with, None when there is none
+        """
+        path = self.latest()
+        if path is None:
+            return None
+        from keras.models import load_model
+        agent = self.agent
+        profiler = agent.profiler
+        agent.disable_profiling()
+        agent.model = load_model(os.path.join(path, "model.h5"))
+        if agent.target_model is not None and os.path.exists(os.path.join(path, "target.h5")):
+            agent.target_model.load_weights(os.path.join(path, "target.h5"))
+        agent._network = None
+        with open(os.path.join(path, "agent.json")) as f:
+            state = json.load(f)
+        for name, value in state["attributes"].items():
+            setattr(agent, name, value)
+        agent.last_ten_actions = deque(state["last_ten_actions"], maxlen=agent.last_ten_actions.maxlen)
+        kind, keys, position, has_gauss, cached_gaussian = state["random_state"]
+        np.random.set_state((kind, np.array(keys, dtype=np.uint32), position, has_gauss, cached_gaussian))
+        replay = os.path.join(self.directory, "replay")
+        if os.path.exists(os.path.join(replay, "buffer.npz")):
+            agent.memory = ReplayBuffer.load(replay, mmap_mode=mmap_mode)
+        if profiler is not None:
+            agent.enable_profiling(profiler)
+        return state["extra"]
+
+    def _write_latest(self, name):
+        temporary = os.path.join(self.directory, "LATEST.tmp")
+        with open(temporary, "w") as f:
+            f.write(name)
+        os.replace(temporary, os.path.join(self.directory, "LATEST"))
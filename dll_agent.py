@@ -1,21 +1,37 @@
 from collections import deque
-from keras.models import Sequential
-from keras.layers import Dense
-from keras.optimizers import Adam
 import numpy as np
-import random
 import os
-from keras.models import model_from_json
+from qwixx_gym.envs.qwixx_rules import ACTION_PAIRS
+from replay_buffer import ReplayBuffer
 
 
 class DQNAgent:
+    # the methods enable_profiling times, of the agent, its model and its replay buffer
+    PROFILED_METHODS = ("act", "remember", "replay", "_update_target", "save")
+    PROFILED_MODEL_METHODS = ("predict", "predict_on_batch", "train_on_batch")
+    PROFILED_MEMORY_METHODS = ("add", "sample", "update_priorities")
+    # the schedules and counters a checkpoint.Checkpointer saves and restores
+    CHECKPOINT_ATTRIBUTES = ("epsilon", "epsilon_decay", "epsilon_min", "gamma", "gamma_decay", "gamma_min",
+                             "alpha", "alpha_decay", "replays")
+
     def __init__(self, path, epsilon_decay, action_space,
                  state_size=None, action_size=None, epsilon=1.0, epsilon_min=0.01,
-                 gamma=1, alpha=.01, alpha_decay=.01, gamma_decay=1, gamma_min=0.1):
-        self.memory = deque(maxlen=100000)
+                 gamma=1, alpha=.01, alpha_decay=.01, gamma_decay=1, gamma_min=0.1,
+                 memory_size=100000, prioritized=False, target_update=None, flat_actions=False,
+                 numpy_inference=False):
+        """
+        target_update enables a target network for the next state values: an int
+        copies the weights every target_update replays, a float between 0 and 1 blends
+        them in every replay with that rate. With flat_actions act returns flat int
+        actions white + 5 * color instead of [white, color] pairs. numpy_inference
+        computes act's Q values with a NumpyQNetwork copy of the model instead of
+        model.predict, refreshed after replays.
+        """
+        self.memory = ReplayBuffer(memory_size, prioritized=prioritized)
         self.state_size = state_size
         self.action_size = action_size
         self.action_space = action_space
+        self.flat_actions = flat_actions
 
         self.epsilon = epsilon
         self.epsilon_decay = epsilon_decay
@@ -29,9 +45,25 @@ class DQNAgent:
 
         self.last_action_was_random = False
         self.model = self._build_model()
+        self.target_update = target_update
+        self.target_model = None
+        if target_update:
+            from keras.models import clone_model
+            self.target_model = clone_model(self.model)
+            self.target_model.set_weights(self.model.get_weights())
+        self.replays = 0
         self.last_ten_actions = deque(maxlen=10)
+        self.profiler = None
+        self.numpy_inference = numpy_inference
+        self._network = None
+        # RepeatGuard of act_batch, sized by the first batch
+        self._guard = None
 
     def _build_model(self):
+        # keras is imported here so env workers can import the agent module cheaply
+        from keras.layers import Dense
+        from keras.models import Sequential, model_from_json
+        from keras.optimizers import Adam
         # try:
         if (os.path.exists(os.path.join(self.path, "model.json"))
                 and os.path.exists(os.path.join(self.path, "model.h5"))):
@@ -57,13 +89,21 @@ class DQNAgent:
                       optimizer=Adam(lr=self.alpha, decay=self.alpha_decay))
         return model
 
-    def act(self, state, verbose=False):
+    def act(self, state, verbose=False, action_mask=None):
+        """action_mask, e.g. info["action_mask"], restricts both random and greedy actions to legal ones"""
         if np.random.random() <= self.epsilon:
             self.last_action_was_random = True
             # if verbose:]
-            return self.action_space.sample()
+            if action_mask is None:
+                return self._format(np.random.randint(self.action_space.n))
+            return self._format(np.random.choice(np.flatnonzero(action_mask)))
         self.last_action_was_random = False
-        weights = self.model.predict(np.array([state]))
+        if self.numpy_inference:
+            weights = self.numpy_network()(np.array([state]))
+        else:
+            weights = self.model.predict(np.array([state]))
+        if action_mask is not None:
+            weights[0][~action_mask] = -np.inf
         action = np.argmax(weights)
         frequency = sum(map(lambda x: 1 if x == action else 0, self.last_ten_actions))
         if (len(self.last_ten_actions) == 10
@@ -77,36 +117,97 @@ class DQNAgent:
         else:
             print("not random")
             self.last_ten_actions.append(action)
-        formatted_action = np.array([action % 5, action // 5])
         # indicides = weights[0].argsort()[-3:][::-1]
         # print(list(map(lambda x: (x, weights[0][x]), indicides)))
         # if verbose:
         #     print("weights", dict(enumerate(weights[0])))
         #     print("max", action)
         #     print("formatted", formatted_action)
-        assert self.action_space.contains(formatted_action), "{} {}".format(formatted_action, action)
-        return formatted_action
+        return self._format(action)
+
+    def act_batch(self, states, action_masks=None):
+        """
+        act for a batch of states, row i being env i, with one forward pass of the
+        NumpyQNetwork. The last ten actions are checked per env and
+        last_action_was_random becomes an array of flags.
+        """
+        from inference import RepeatGuard, select_actions
+        if self._guard is None or len(self._guard.length) != len(states):
+            self._guard = RepeatGuard(len(states))
+        actions, self.last_action_was_random = select_actions(
+            self.numpy_network()(states), action_masks, self.epsilon, np.random, self._guard)
+        return actions if self.flat_actions else ACTION_PAIRS[actions]
+
+    def numpy_network(self):
+        """A NumpyQNetwork with the model's current weights, e.g. to save for keras free inference"""
+        from inference import NumpyQNetwork
+        if self._network is None:
+            self._network = NumpyQNetwork.from_model(self.model)
+        return self._network
+
+    def enable_profiling(self, profiler=None, prefix="agent."):
+        """
+        Times PROFILED_METHODS and the model's and memory's methods as phases of a
+        qwixx_profiler.Profiler, a new one by default, and returns it
+        """
+        if profiler is None:
+            from qwixx_gym.envs.qwixx_profiler import Profiler
+            profiler = Profiler()
+        self.disable_profiling()
+        self.profiler = profiler
+        profiler.instrument(self, self.PROFILED_METHODS, prefix)
+        profiler.instrument(self.model, self.PROFILED_MODEL_METHODS, prefix + "model.")
+        profiler.instrument(self.memory, self.PROFILED_MEMORY_METHODS, prefix + "memory.")
+        return profiler
+
+    def disable_profiling(self):
+        if self.profiler is not None:
+            for obj in (self, self.model, self.memory):
+                self.profiler.restore(obj)
+            self.profiler = None
+
+    def _format(self, action):
+        return int(action) if self.flat_actions else ACTION_PAIRS[action]
 
     def remember(self, state, action, reward, next_state, done):
-        self.memory.append((state, action, reward, next_state, done))
+        self.memory.add(state, action, reward, next_state, done)
 
     def replay(self, batch_size):
-        x_batch, y_batch = [], []
-        minibatch = random.sample(
-            self.memory, min(len(self.memory), batch_size))
-        for state, action, reward, next_state, done in minibatch:
-            serial_action = 5 * action[0] + action[1]
-            y_target = self.model.predict(np.array([state]))
-            predict_out = self.model.predict(np.array([next_state]))[0]
-            max_predict = np.max(predict_out)
-            y_target[0][serial_action] = reward if done else reward + self.gamma * max_predict
-            x_batch.append(state)
-            y_batch.append(y_target[0])
-
-        self.model.fit(np.array(x_batch), np.array(y_batch), batch_size=len(x_batch), verbose=0)
+        minibatch = self.memory.sample(min(len(self.memory), batch_size))
+        size = len(minibatch.states)
+        states = minibatch.states.reshape(size, -1)
+        next_states = minibatch.next_states.reshape(size, -1)
+        actions = minibatch.actions
+        serial_actions = actions if actions.ndim == 1 else actions[:, 0] + 5 * actions[:, 1]
+        rows = np.arange(size)
+
+        y_batch = self.model.predict_on_batch(states)
+        target_model = self.model if self.target_model is None else self.target_model
+        predict_out = target_model.predict_on_batch(next_states)
+        targets = np.where(minibatch.dones, minibatch.rewards,
+                           minibatch.rewards + self.gamma * np.max(predict_out, axis=1))
+        td_errors = targets - y_batch[rows, serial_actions]
+        y_batch[rows, serial_actions] = targets
+
+        self.model.train_on_batch(states, y_batch, sample_weight=minibatch.weights)
+        self._network = None
+        if self.memory.prioritized:
+            self.memory.update_priorities(minibatch.indices, td_errors)
+        self.replays += 1
+        if self.target_model is not None:
+            self._update_target()
         if self.epsilon > self.epsilon_min:
             self.epsilon *= self.epsilon_decay
 
+    def _update_target(self):
+        if self.target_update >= 1:
+            if self.replays % self.target_update == 0:
+                self.target_model.set_weights(self.model.get_weights())
+            return
+        tau = self.target_update
+        self.target_model.set_weights([tau * weight + (1 - tau) * target for weight, target
+                                       in zip(self.model.get_weights(), self.target_model.get_weights())])
+
     def save(self):
         if not os.path.exists(self.path):
             os.mkdir(self.path)
@@ -0,0 +1,40 @@
+"""
+Final score distributions of the scripted baseline policies.
+
+    python evaluate_baselines.py --games 1000000 --workers 4
+    python evaluate_baselines.py --policies greedy_min_skip lock_chasing
+
+Every policy plays --games games, --envs at a time in each of --workers processes,
+see qwixx_gym.envs.qwixx_baselines. The mean is given with its 95% confidence interval.
+"""
+import argparse
+import sys
+import time
+
+from qwixx_gym.envs.qwixx_baselines import POLICIES, QUANTILES, evaluate
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--policies", nargs="*", choices=sorted(POLICIES), default=list(POLICIES))
+    parser.add_argument("--games", type=int, default=100000)
+    parser.add_argument("--envs", type=int, default=1024)
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--players", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    print("{:<20s}{:>10s}{:>22s}{:>8s}  {}".format(
+        "policy", "games", "mean (95% ci)", "std", " ".join("p{:g}".format(100 * q) for q in QUANTILES)))
+    for name in args.policies:
+        start = time.perf_counter()
+        result = evaluate(name, args.games, args.envs, args.seed, args.workers, num_players=args.players)
+        elapsed = time.perf_counter() - start
+        print("{:<20s}{:>10,d}{:>10.2f} ({:.2f}, {:.2f}){:>8.2f}  {}  {:,.0f} games/s".format(
+            name, len(result.scores), result.mean, result.low, result.high, result.std,
+            " ".join("{:g}".format(q) for q in result.quantiles), len(result.scores) / elapsed))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,3 +1,4 @@
+from checkpoint import Checkpointer
 from dll_agent import DQNAgent
 import gym
 import os
@@ -15,6 +16,12 @@ print_every = 10
 save_every = 100
 sample_every = 1000
 path = "/Users/richards/Desktop/qwixx_model"
+# time the env and agent phases, printed every print_every episodes, see qwixx_profiler
+profile = False
+# also written to this .json file, or in the Prometheus text format to a .prom file
+profile_path = None
+# resume from and save checkpoints with the replay memory here every save_every episodes, see checkpoint
+checkpoint_path = None
 
 
 def sample(sagent, senv):
@@ -23,7 +30,7 @@ def sample(sagent, senv):
     while not sis_done:
         print("Turn begin ===================", sagent.epsilon)
         senv.render()
-        saction = sagent.act(sstate, True)
+        saction = sagent.act(sstate, True, senv.legal_action_mask())
         print("white action", WHITE_ACTION_COLOR[saction[0]])
         print("color action", COLOR_ACTION[saction[1]])
         snext_state, sreward, sis_done, snotes = senv.step(saction)
@@ -36,9 +43,17 @@ def run_training():
     env = gym.make("qwixx-v0")
     state = env.reset()
     agent = DQNAgent(path, 0.99, env.action_space, gamma=0.65,
-                     state_size=66, action_size=2)
+                     state_size=env.observation_space.shape[-1], action_size=env.action_space.n)
     agent.save()
     episode = 0
+    checkpointer = None
+    if checkpoint_path:
+        checkpointer = Checkpointer(agent, checkpoint_path)
+        episode = (checkpointer.restore() or {}).get("episode", 0)
+    profiler = None
+    if profile:
+        profiler = env.unwrapped.enable_profiling()
+        agent.enable_profiling(profiler)
     now = time.time()
     game_lengths = []
     turns = 0
@@ -47,7 +62,7 @@ def run_training():
     errors = []
     while True:
         turns += 1
-        action = agent.act(state)
+        action = agent.act(state, action_mask=env.legal_action_mask())
         # print("white action", WHITE_ACTION_COLOR[action[0]])
         # print("color action", COLOR_ACTION[action[1]])
         next_state, reward, is_done, notes = env.step(action)
@@ -60,6 +75,8 @@ def run_training():
         if is_done:
             if episode % save_every == 0 and episode != 0:
                 agent.save()
+                if checkpointer is not None:
+                    checkpointer.save(episode=episode + 1)
             episode_high_score.append(max(notes.get("scores", [0])))
             errors.append(1 if "error" in notes else 0)
             if episode % print_every == 0 and episode != 0:
@@ -68,6 +85,12 @@ def run_training():
                              int((sum(errors) / print_every) * 100)))
                 episode_high_score = []
                 errors = []
+                if profiler is not None:
+                    print(profiler.summary())
+                    if profile_path and profile_path.endswith(".prom"):
+                        profiler.save_prometheus(profile_path)
+                    elif profile_path:
+                        profiler.save_json(profile_path)
             if episode % sample_every == 0 and episode != 0:
                 sample(agent, env)
             episode += 1
@@ -0,0 +1,266 @@
+"""
+Batched action selection for many envs.
+
+NumpyQNetwork runs the forward pass of DQNAgent's small Dense model in numpy, from
+weights taken off the keras model or saved to an .npz file, so selecting actions
+needs no TensorFlow. select_actions is DQNAgent.act for a batch of states:
+epsilon-greedy over the legal actions, with RepeatGuard keeping act's check of the
+last ten actions per env.
+
+InferenceServer collects the states that env threads submit and answers them with
+one forward pass per micro-batch, once max_batch requests are pending or the oldest
+one waited max_latency seconds.
+"""
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+import numpy as np
+
+from qwixx_gym.envs.qwixx_rules import NUM_ACTIONS
+
+ACTIVATIONS = {
+    "linear": lambda x: x,
+    "tanh": np.tanh,
+    "relu": lambda x: np.maximum(x, 0),
+    "sigmoid": lambda x: 1 / (1 + np.exp(-x)),
+}
+
+
+def model_layout(model):
+    """The activations of a keras model of Dense layers, ValueError for other layers"""
+    activations = []
+    for layer in model.layers:
+        activation = layer.get_config().get("activation", "linear")
+        if len(layer.get_weights()) != 2 or activation not in ACTIVATIONS:
+            raise ValueError("only Dense layers with the activations {} run in numpy, not {}".format(
+                ", ".join(ACTIVATIONS), layer.name))
+        activations.append(activation)
+    return activations
+
+
+class NumpyQNetwork:
+    """
+    Q values of a stack of Dense layers, weights as returned by keras'
+    model.get_weights(), a kernel and a bias per layer
+    """
+
+    def __init__(self, weights, activations):
+        if len(weights) != 2 * len(activations):
+            raise ValueError("{} weights for {} layers".format(len(weights), len(activations)))
+        self.activations = list(activations)
+        self.set_weights(weights)
+
+    @classmethod
+    def from_model(cls, model):
+        return cls(model.get_weights(), model_layout(model))
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as f:
+            activations = f["activations"].tolist()
+            return cls([f["weight_{}".format(i)] for i in range(2 * len(activations))], activations)
+
+    def save(self, path):
+        np.savez(path, activations=np.array(self.activations),
+                 **{"weight_{}".format(i): weight for i, weight in enumerate(self.weights)})
+
+    def get_weights(self):
+        return list(self.weights)
+
+    def set_weights(self, weights):
+        """Replaces the weights at once, a forward pass running meanwhile uses the old ones"""
+        weights = [np.asarray(weight, dtype=np.float32) for weight in weights]
+        if hasattr(self, "weights") and [w.shape for w in weights] != [w.shape for w in self.weights]:
+            raise ValueError("weight shapes changed")
+        self.weights = weights
+
+    @property
+    def shapes(self):
+        return [weight.shape for weight in self.weights]
+
+    def __call__(self, states):
+        """(N, 45) Q values of (N, 48) states"""
+        weights = self.weights
+        x = np.asarray(states, dtype=np.float32)
+        for kernel, bias, activation in zip(weights[::2], weights[1::2], self.activations):
+            x = ACTIVATIONS[activation](x @ kernel + bias)
+        return x
+
+
+class RepeatGuard:
+    """
+    DQNAgent.act's check of the last window greedy actions, for num_envs envs: a
+    greedy action taken more than limit times in a full window is replaced by the
+    second best and isn't remembered
+    """
+
+    def __init__(self, num_envs, window=10, limit=5):
+        self.window = window
+        self.limit = limit
+        self.history = np.full((num_envs, window), -1, dtype=np.int64)
+        self.length = np.zeros(num_envs, dtype=np.int64)
+        self.position = np.zeros(num_envs, dtype=np.int64)
+
+    def reset(self, env_ids=None):
+        env_ids = slice(None) if env_ids is None else env_ids
+        self.history[env_ids] = -1
+        self.length[env_ids] = 0
+        self.position[env_ids] = 0
+
+    def apply(self, q_values, greedy, env_ids):
+        """The actions to take instead of greedy and whether they were replaced"""
+        frequency = (self.history[env_ids] == greedy[:, None]).sum(1)
+        repeated = (self.length[env_ids] == self.window) & (frequency > self.limit)
+        rows = np.arange(len(greedy))
+        q_values = q_values.copy()
+        q_values[rows, greedy] = -1000000
+        actions = np.where(repeated, np.argmax(q_values, axis=1), greedy)
+        kept = env_ids[~repeated]
+        self.history[kept, self.position[kept]] = greedy[~repeated]
+        self.position[kept] = (self.position[kept] + 1) % self.window
+        self.length[kept] = np.minimum(self.length[kept] + 1, self.window)
+        return actions, repeated
+
+
+def select_actions(q_values, action_masks, epsilon, rng, guard=None, env_ids=None):
+    """
+    Epsilon-greedy flat actions over the legal actions of (N, 45) Q values, epsilon a
+    number or one per row. The guard, a RepeatGuard indexed by env_ids, only sees the
+    greedy rows, as in act. Returns the actions and whether each was not the greedy
+    one, as DQNAgent.last_action_was_random.
+    """
+    n = len(q_values)
+    if action_masks is None:
+        action_masks = np.ones(q_values.shape, dtype=np.bool_)
+    explore = rng.random(n) <= epsilon
+    actions = np.argmax(action_masks * rng.random(q_values.shape), axis=1)
+    random = explore.copy()
+    rows = np.flatnonzero(~explore)
+    q_values = np.where(action_masks[rows], q_values[rows], -np.inf)
+    greedy = np.argmax(q_values, axis=1)
+    if guard is not None:
+        env_ids = rows if env_ids is None else np.asarray(env_ids)[rows]
+        greedy, random[rows] = guard.apply(q_values, greedy, env_ids)
+    actions[rows] = greedy
+    return actions, random
+
+
+class _Request:
+    __slots__ = ("env_id", "state", "action_mask", "future")
+
+    def __init__(self, env_id, state, action_mask):
+        self.env_id = env_id
+        self.state = state
+        self.action_mask = action_mask
+        self.future = Future()
+
+
+class InferenceServer:
+    """
+    Answers act requests of num_envs envs, see the module docstring. network maps
+    (N, 48) states to Q values, a NumpyQNetwork or e.g. a keras model's
+    predict_on_batch. epsilon may be changed while serving, as a number or one per
+    env. Use it as a context manager or call start and stop.
+    """
+
+    def __init__(self, network, num_envs, epsilon=0.0, max_batch=256, max_latency=0.002, guard=True,
+                 seed=None):
+        self.network = network
+        self.num_envs = num_envs
+        self.epsilon = epsilon
+        self.max_batch = max_batch
+        self.max_latency = max_latency
+        self.guard = RepeatGuard(num_envs) if guard else None
+        self.rng = np.random.default_rng(seed)
+        self.batches = 0
+        self.requests = 0
+        self._requests = queue.Queue()
+        self._stop = threading.Event()
+        # guards _thread, so no request is queued after stop emptied the queue
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def start(self):
+        with self._lock:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._serve, daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        """Answers the batch being served and cancels the requests still waiting"""
+        with self._lock:
+            thread, self._thread = self._thread, None
+        self._stop.set()
+        if thread is not None:
+            thread.join()
+        while True:
+            try:
+                self._requests.get_nowait().future.cancel()
+            except queue.Empty:
+                break
+
+    def submit(self, env_id, state, action_mask=None):
+        """
+        A Future of the flat action for state of env env_id, one pending request per
+        env. RuntimeError when the server isn't running.
+        """
+        request = _Request(env_id, state, action_mask)
+        with self._lock:
+            if self._thread is None:
+                raise RuntimeError("the inference server isn't running")
+            self._requests.put(request)
+        return request.future
+
+    def act(self, env_id, state, action_mask=None):
+        return self.submit(env_id, state, action_mask).result()
+
+    def select(self, states, action_masks=None, env_ids=None):
+        """The flat actions and random flags of a batch of states, without queueing"""
+        env_ids = np.arange(len(states)) if env_ids is None else np.asarray(env_ids)
+        epsilon = self.epsilon if np.ndim(self.epsilon) == 0 else np.asarray(self.epsilon)[env_ids]
+        return select_actions(self.network(states), action_masks, epsilon, self.rng, self.guard, env_ids)
+
+    def _batch(self):
+        try:
+            batch = [self._requests.get(timeout=0.1)]
+        except queue.Empty:
+            return []
+        deadline = time.perf_counter() + self.max_latency
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.perf_counter()
+            try:
+                batch.append(self._requests.get(timeout=remaining) if remaining > 0
+                             else self._requests.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _serve(self):
+        while not self._stop.is_set():
+            batch = self._batch()
+            if not batch:
+                continue
+            try:
+                masks = None
+                if any(request.action_mask is not None for request in batch):
+                    masks = np.stack([np.ones(NUM_ACTIONS, dtype=np.bool_) if request.action_mask is None
+                                      else request.action_mask for request in batch])
+                actions, _ = self.select(np.stack([request.state for request in batch]), masks,
+                                         [request.env_id for request in batch])
+            except Exception as e:
+                for request in batch:
+                    request.future.set_exception(e)
+                continue
+            self.batches += 1
+            self.requests += len(batch)
+            for request, action in zip(batch, actions.tolist()):
+                request.future.set_result(action)
@@ -1,11 +1,63 @@
-from gym.envs.registration import register
+"""
+Qwixx environments. Importing the package is cheap: the envs load on first access of
+qwixx_gym.envs.<Env>, gym only when a gym space or gym.make is used.
 
-register(
-    id='qwixx-v0',
-    entry_point='qwixx_gym.envs:QwixxOneHotEnv',
-)
+The ids below are registered with gym right away when gym was imported before
+qwixx_gym, otherwise as soon as gym is imported, by a hook on the import system, so
+gym.make finds them whichever of the two came first. gym versions that load env
+plugins register them through the "gym.envs" entry point too. make builds the qwixx
+ids without gym.
+"""
+import importlib
+import importlib.util
+import sys
 
-register(
-    id='qwixx-simple-v0',
-    entry_point='qwixx_gym.envs:QwixxSimple',
-)
\ No newline at end of file
+ENV_IDS = {
+    'qwixx-v0': 'qwixx_gym.envs:QwixxOneHotEnv',
+    'qwixx-simple-v0': 'qwixx_gym.envs:QwixxSimple',
+}
+
+
+def register_envs():
+    """Registers ENV_IDS with gym, ids that are registered already are left alone"""
+    from gym.envs.registration import register, registry
+
+    registered = getattr(registry, "env_specs", registry)
+    for env_id, entry_point in ENV_IDS.items():
+        if env_id not in registered:
+            register(id=env_id, entry_point=entry_point)
+
+
+def make(env_id, **kwargs):
+    """gym.make, but the qwixx ids are built directly, without importing gym"""
+    if env_id in ENV_IDS:
+        module, name = ENV_IDS[env_id].split(":")
+        return getattr(importlib.import_module(module), name)(**kwargs)
+    import gym
+    return gym.make(env_id, **kwargs)
+
+
+class _RegisterOnGymImport:
+    """sys.meta_path finder calling register_envs once gym's first import finished"""
+
+    def find_spec(self, name, path=None, target=None):
+        if name != "gym":
+            return None
+        sys.meta_path.remove(self)
+        spec = importlib.util.find_spec(name)
+        if spec is None or spec.loader is None:
+            return spec
+        exec_module = spec.loader.exec_module
+
+        def exec_and_register(module):
+            exec_module(module)
+            register_envs()
+
+        spec.loader.exec_module = exec_and_register
+        return spec
+
+
+if sys.modules.get("gym") is not None:
+    register_envs()
+elif "gym" not in sys.modules:
+    sys.meta_path.insert(0, _RegisterOnGymImport())
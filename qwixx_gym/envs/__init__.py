@@ -1,2 +1,26 @@
-from qwixx_gym.envs.qwixx_one_hot_env import QwixxOneHotEnv
-from qwixx_gym.envs.qwixx_simple_reward import QwixxSimple
+import importlib
+
+# the envs are imported on first access, see qwixx_gym
+_MODULES = {
+    'QwixxOneHotEnv': 'qwixx_gym.envs.qwixx_one_hot_env',
+    'QwixxSimple': 'qwixx_gym.envs.qwixx_simple_reward',
+    'QwixxKernelEnv': 'qwixx_gym.envs.qwixx_kernel_env',
+    'QwixxVectorEnv': 'qwixx_gym.envs.qwixx_vector_env',
+    'QwixxSubprocVectorEnv': 'qwixx_gym.envs.qwixx_subproc_env',
+    'QwixxMultiAgentEnv': 'qwixx_gym.envs.qwixx_multi_agent_env',
+    'QwixxRecorder': 'qwixx_gym.envs.qwixx_recorder',
+    'TrajectoryReader': 'qwixx_gym.envs.qwixx_recorder',
+}
+__all__ = list(_MODULES)
+
+
+def __getattr__(name):
+    if name not in _MODULES:
+        raise AttributeError("module {!r} has no attribute {!r}".format(__name__, name))
+    value = getattr(importlib.import_module(_MODULES[name]), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_MODULES))
@@ -0,0 +1,136 @@
+"""
+Precomputed legality of the 45 flat actions, action = white + 5 * color.
+
+Whether an action is legal only depends, per color, on the latest number, whether
+the color can be locked (counts of 4 and 5 matter), the white sum and the two
+white + color sums. MOVE_TABLE holds for every color and every combination of those
+a 45 bit mask of the actions that don't break the rules on that color, the legal
+actions are the AND of the four colors' masks and the roller mask.
+"""
+import numpy as np
+
+from qwixx_gym.envs.qwixx_rules import (
+    COLORS, COLORS_MAX, COMPARE_FUNCTION, WHITE_ACTION_INDEX, COLOR_ACTION_DIE,
+    COLOR_ACTION_INDEX, NUM_ACTIONS, LOCK_COUNT, can_lock,
+)
+
+# counts only matter for locking, either right away or after the white die marked the color
+COUNT_CATEGORY = np.full(14, 2, dtype=np.intp)
+COUNT_CATEGORY[LOCK_COUNT - 1] = 0
+COUNT_CATEGORY[LOCK_COUNT] = 1
+_CATEGORY_COUNT = np.array([LOCK_COUNT - 1, LOCK_COUNT, 0])
+_SUMS = 13
+_SHIFTS = np.arange(NUM_ACTIONS, dtype=np.uint64)
+_ONE = np.uint64(1)
+_COLOR_ROWS = np.arange(len(COLORS))
+
+
+def _code_masks(c):
+    """
+    Maps the five legality bits of color c, white, white1 + color, white2 + color and
+    white followed by white1/white2 + color, to the 45 bit mask of allowed actions
+    """
+    masks = np.zeros(32, dtype=np.uint64)
+    for code in range(32):
+        for action in range(NUM_ACTIONS):
+            white_action, color_action = action % 5, action // 5
+            takes_white = WHITE_ACTION_INDEX[white_action] == c
+            takes_color = COLOR_ACTION_INDEX[color_action] == c
+            die = COLOR_ACTION_DIE[color_action]
+            if takes_white and takes_color:
+                bit = 3 + die
+            elif takes_white:
+                bit = 0
+            elif takes_color:
+                bit = 1 + die
+            else:
+                bit = None
+            if bit is None or code >> bit & 1:
+                masks[code] |= np.uint64(1 << action)
+    return masks
+
+
+def _build_move_table():
+    latest, category, white, value1, value2 = np.meshgrid(
+        np.arange(14), np.arange(3), np.arange(_SUMS), np.arange(_SUMS), np.arange(_SUMS),
+        indexing="ij", sparse=True)
+    count = _CATEGORY_COUNT[category]
+    table = np.zeros((len(COLORS), 14, 3, _SUMS, _SUMS, _SUMS), dtype=np.uint64)
+    for c, color in enumerate(COLORS):
+        def valid(value, before, marks):
+            return (COMPARE_FUNCTION[color](value, before)
+                    & ((value != COLORS_MAX[color]) | can_lock(marks)))
+
+        white_valid = valid(white, latest, count)
+        # the color die is compared against the number the white dice just marked
+        code = (white_valid.astype(np.uint8)
+                | valid(value1, latest, count) << 1
+                | valid(value2, latest, count) << 2
+                | (white_valid & valid(value1, white, count + 1)) << 3
+                | (white_valid & valid(value2, white, count + 1)) << 4)
+        table[c] = _code_masks(c)[code]
+    return table.reshape(len(COLORS), -1)
+
+
+MOVE_TABLE = _build_move_table()
+# players that didn't roll can only use the white dice
+ROLLER_BITS = np.array([(1 << 5) - 1, (1 << NUM_ACTIONS) - 1], dtype=np.uint64)
+# COLOR_BITS[c] has the actions that mark color c, cleared once another player locked it
+COLOR_BITS = np.array([sum(1 << a for a in range(NUM_ACTIONS)
+                           if c in (WHITE_ACTION_INDEX[a % 5], COLOR_ACTION_INDEX[a // 5]))
+                       for c in range(len(COLORS))], dtype=np.uint64)
+_MASKS = {}
+
+
+def action_bits(dice, counts, latest, bots_roll):
+    """Legal actions as 45 bit integers for (N, ...) batches of states"""
+    dice = np.asarray(dice, dtype=np.intp)
+    colors = dice[..., 2:]
+    index = (np.asarray(latest, dtype=np.intp) * 3 + COUNT_CATEGORY[counts]) * _SUMS
+    index = ((index + (dice[..., 0] + dice[..., 1])[..., None]) * _SUMS
+             + dice[..., 0:1] + colors) * _SUMS + dice[..., 1:2] + colors
+    bits = MOVE_TABLE[_COLOR_ROWS, index]
+    bits = bits[..., 0] & bits[..., 1] & bits[..., 2] & bits[..., 3]
+    return bits & ROLLER_BITS[np.asarray(bots_roll, dtype=np.intp)]
+
+
+def open_bits(bits, closed):
+    """Clears the actions marking any of the (..., 4) bool closed colors from bits"""
+    marking = np.bitwise_or.reduce(np.where(closed, COLOR_BITS, np.uint64(0)), axis=-1)
+    return bits & ~marking
+
+
+def unpack_bits(bits):
+    """(...,) 45 bit integers to (..., 45) bool masks"""
+    bits = np.asarray(bits, dtype="<u8")
+    return np.unpackbits(bits[..., None].view(np.uint8), axis=-1,
+                         bitorder="little")[..., :NUM_ACTIONS].view(bool)
+
+
+def action_mask(dice, counts, latest, bots_roll):
+    """Legal actions as an (N, 45) bool array for batches of states"""
+    return unpack_bits(action_bits(dice, counts, latest, bots_roll))
+
+
+def state_action_mask(dice, counts, latest, bots_roll):
+    """
+    Legal actions of a single state given as sequences of ints. Masks are cached by
+    their bits, the returned array is shared and read only.
+    """
+    white1, white2 = dice[0], dice[1]
+    bits = int(ROLLER_BITS[1 if bots_roll else 0])
+    for c in range(4):
+        index = ((latest[c] * 3 + COUNT_CATEGORY[counts[c]]) * _SUMS + white1 + white2) * _SUMS
+        index = (index + white1 + dice[c + 2]) * _SUMS + white2 + dice[c + 2]
+        bits &= MOVE_TABLE.item(c, index)
+    return bits_mask(bits)
+
+
+def bits_mask(bits):
+    """The shared read only (45,) bool mask of 45 bit legal actions, cached by bits"""
+    mask = _MASKS.get(bits)
+    if mask is None:
+        mask = unpack_bits(bits)
+        mask.flags.writeable = False
+        _MASKS[int(bits)] = mask
+    return mask
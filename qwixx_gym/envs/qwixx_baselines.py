@@ -0,0 +1,175 @@
+"""
+Scripted baseline policies and an evaluation runner for QwixxVectorEnv.
+
+A policy is called with the env and returns one flat action per game, computed for
+the whole batch with array operations. HeuristicPolicy rates every legal action by
+features of its marks, see action_features, and takes the best one. POLICIES holds
+the named baselines:
+- "random": a uniformly random legal action
+- "greedy_min_skip": marks that skip the fewest numbers, strikes rather than skip 3
+- "lock_chasing": greedy_min_skip leaning towards long rows and locking them
+- "strike_avoidance": like greedy_min_skip but never strikes when a mark is legal
+
+evaluate plays a number of games with a policy, spread over worker processes, and
+reports the distribution of final scores with a confidence interval of the mean.
+"""
+import multiprocessing as mp
+from collections import namedtuple
+
+import numpy as np
+
+from qwixx_gym.envs.qwixx_rules import (
+    ACTION_PAIRS, COLOR_ACTION_DIE, COLOR_ACTION_INDEX, MAX_VALUE, NUM_ACTIONS, WHITE_ACTION_INDEX,
+)
+from qwixx_gym.envs.qwixx_vector_env import QwixxVectorEnv
+
+# per flat action the color marked with the white sum, the color marked with the
+# color sum and the white die of the color sum, -1 where nothing is marked
+_WHITE_COLOR = WHITE_ACTION_INDEX[ACTION_PAIRS[:, 0]]
+_COLOR_COLOR = COLOR_ACTION_INDEX[ACTION_PAIRS[:, 1]]
+_COLOR_DIE = np.maximum(COLOR_ACTION_DIE[ACTION_PAIRS[:, 1]], 0)
+_WHITE_MARKS = _WHITE_COLOR >= 0
+_COLOR_MARKS = _COLOR_COLOR >= 0
+# both sums go into the same color, the color sum is compared to the white sum
+_SAME_COLOR = _WHITE_MARKS & (_WHITE_COLOR == _COLOR_COLOR)
+_WHITE_INDEX = np.maximum(_WHITE_COLOR, 0)
+_COLOR_INDEX = np.maximum(_COLOR_COLOR, 0)
+Z_95 = 1.959963984540054
+
+Features = namedtuple("Features", ["marks", "skipped", "gain", "locks", "strikes"])
+Evaluation = namedtuple("Evaluation", ["mean", "std", "low", "high", "quantiles", "scores"])
+Evaluation.__doc__ = """
+Final scores of evaluate: their mean, standard deviation, the low and high end of
+the 95% confidence interval of the mean, the QUANTILES and every game's score
+"""
+QUANTILES = (0.05, 0.25, 0.5, 0.75, 0.95)
+
+
+def action_features(dice, counts, latest, bots_roll):
+    """
+    (N, 45) features of every flat action for batches of states, only meaningful for
+    legal actions: the number of marks, the numbers the marks skip, the score they add,
+    the rows they lock and whether the action is a strike
+    """
+    dice, counts, latest = dice.astype(np.int16), counts.astype(np.int16), latest.astype(np.int16)
+    white_value = (dice[:, 0] + dice[:, 1])[:, None]
+    color_value = dice[:, _COLOR_DIE] + dice[:, _COLOR_INDEX + 2]
+    white_skipped = np.abs(white_value - latest[:, _WHITE_INDEX]) - 1
+    color_latest = np.where(_SAME_COLOR, white_value, latest[:, _COLOR_INDEX])
+    color_skipped = np.abs(color_value - color_latest) - 1
+    # the n-th mark of a row adds n points, a lock one more
+    white_locks = _WHITE_MARKS & (white_value == MAX_VALUE[_WHITE_INDEX])
+    color_locks = _COLOR_MARKS & (color_value == MAX_VALUE[_COLOR_INDEX])
+    gain = (_WHITE_MARKS * (counts[:, _WHITE_INDEX] + 1) + white_locks
+            + _COLOR_MARKS * (counts[:, _COLOR_INDEX] + _SAME_COLOR + 1) + color_locks)
+    return Features(
+        _WHITE_MARKS.astype(np.int16) + _COLOR_MARKS,
+        np.where(_WHITE_MARKS, white_skipped, 0) + np.where(_COLOR_MARKS, color_skipped, 0),
+        gain,
+        white_locks.astype(np.int16) + color_locks,
+        np.asarray(bots_roll)[:, None] & (np.arange(NUM_ACTIONS) == 0),
+    )
+
+
+class HeuristicPolicy:
+    """
+    Takes the legal action with the highest
+        mark_value * marks + gain_value * gain - skip_cost * skipped
+        + lock_value * locks - strike_cost * strikes
+    of its action_features, the first one on ties
+    """
+
+    def __init__(self, mark_value=0.0, gain_value=0.0, skip_cost=0.0, lock_value=0.0, strike_cost=0.0):
+        self.weights = (mark_value, skip_cost, gain_value, lock_value, strike_cost)
+
+    def __call__(self, env):
+        bots_roll = env.current_player == env.bot_player
+        features = action_features(env.dice, env.counts, env.latest_num, bots_roll)
+        mark_value, skip_cost, gain_value, lock_value, strike_cost = self.weights
+        values = (mark_value * features.marks - skip_cost * features.skipped + gain_value * features.gain
+                  + lock_value * features.locks - strike_cost * features.strikes)
+        return np.argmax(np.where(env.legal_action_mask(), values, -np.inf), axis=1)
+
+
+class RandomPolicy:
+    """A uniformly random legal action"""
+
+    def __init__(self, seed=None):
+        self.seed(seed)
+
+    def seed(self, seed=None):
+        """Restarts the action choices from seed, an int or np.random.SeedSequence"""
+        self.generator = np.random.default_rng(seed)
+        return [seed]
+
+    def __call__(self, env):
+        mask = env.legal_action_mask()
+        return np.argmax(mask * self.generator.random(mask.shape), axis=1)
+
+
+POLICIES = {
+    "random": RandomPolicy,
+    "greedy_min_skip": lambda: HeuristicPolicy(mark_value=1, skip_cost=1, strike_cost=2),
+    "lock_chasing": lambda: HeuristicPolicy(mark_value=1, gain_value=0.1, skip_cost=1, lock_value=10, strike_cost=2),
+    "strike_avoidance": lambda: HeuristicPolicy(mark_value=1, skip_cost=1, strike_cost=1000),
+}
+
+
+def make_policy(policy):
+    """A policy from a POLICIES name, other policies are returned as they are"""
+    if isinstance(policy, str):
+        if policy not in POLICIES:
+            raise ValueError("unknown policy {!r}, one of {}".format(policy, ", ".join(sorted(POLICIES))))
+        return POLICIES[policy]()
+    return policy
+
+
+def play(policy, num_games, num_envs=1024, seed=None, **env_kwargs):
+    """
+    Final scores of num_games games. Every one of num_envs games in parallel plays the
+    same number of games, so long games aren't cut off more often than short ones.
+    With a seed, a policy with a seed method like RandomPolicy is seeded from a child
+    of its SeedSequence, so the games are the same every time.
+    """
+    policy = make_policy(policy)
+    if seed is not None and hasattr(policy, "seed"):
+        if not isinstance(seed, np.random.SeedSequence):
+            seed = np.random.SeedSequence(seed)
+        policy.seed(seed.spawn(1)[0])
+    num_envs = min(num_envs, num_games)
+    quota = -(-num_games // num_envs)
+    env = QwixxVectorEnv(num_envs, copy=False, seed=seed, **env_kwargs)
+    scores = np.zeros((num_envs, quota), dtype=np.int16)
+    played = np.zeros(num_envs, dtype=np.int64)
+    while played.min() < quota:
+        _, _, dones, info = env.step(policy(env))
+        rows = np.flatnonzero(dones & (played < quota))
+        scores[rows, played[rows]] = info["score"][rows]
+        played[dones] += 1
+    return scores.reshape(-1)[:num_games]
+
+
+def _play(args):
+    policy, num_games, num_envs, seed, env_kwargs = args
+    return play(policy, num_games, num_envs, seed, **env_kwargs)
+
+
+def evaluate(policy, num_games=100000, num_envs=1024, seed=None, num_workers=None, **env_kwargs):
+    """
+    Plays num_games with a policy, a POLICIES name or a picklable policy when
+    num_workers processes share the games, and returns an Evaluation. The same seed
+    gives the same scores, see play.
+    """
+    num_workers = num_workers or 1
+    seeds = np.random.SeedSequence(seed).spawn(num_workers)
+    games = np.diff(np.linspace(0, num_games, num_workers + 1).astype(int))
+    jobs = [(policy, int(n), num_envs, s, env_kwargs) for n, s in zip(games, seeds) if n]
+    if num_workers == 1:
+        parts = [_play(job) for job in jobs]
+    else:
+        with mp.get_context().Pool(num_workers) as pool:
+            parts = pool.map(_play, jobs)
+    scores = np.concatenate(parts)
+    mean, std = scores.mean(), scores.std(ddof=1) if len(scores) > 1 else 0.0
+    margin = Z_95 * std / np.sqrt(len(scores))
+    return Evaluation(mean, std, mean - margin, mean + margin, np.quantile(scores, QUANTILES), scores)
@@ -0,0 +1,77 @@
+import numpy as np
+
+DEFAULT_BLOCK_SIZE = 1 << 12
+
+
+class DiceSource:
+    """
+    Die rolls from a numpy Generator, drawn block_size at a time and handed out in
+    order, so a roll is mostly a slice of the current block. A block that can't serve
+    a request is dropped and replaced, the stream only depends on the seed and the
+    sequence of requests.
+
+    seed is anything np.random.SeedSequence takes or a SeedSequence. Without a seed
+    it is drawn from the legacy global RNG, so np.random.seed keeps making runs
+    reproducible. spawn splits off independent sources, e.g. one per env of a vector
+    or multiprocess env.
+    """
+
+    def __init__(self, seed=None, block_size=DEFAULT_BLOCK_SIZE):
+        if seed is None:
+            seed = np.random.randint(np.iinfo(np.int32).max)
+        if not isinstance(seed, np.random.SeedSequence):
+            seed = np.random.SeedSequence(seed)
+        self.seed_sequence = seed
+        self.generator = np.random.default_rng(seed)
+        self.block_size = block_size
+        self._block = np.empty(0, dtype=np.int8)
+        self._list = []
+        self._index = 0
+
+    def spawn(self, n):
+        return [DiceSource(seed, self.block_size) for seed in self.seed_sequence.spawn(n)]
+
+    def get_state(self):
+        """Position in the stream, set_state returns to it and the same rolls follow"""
+        return self.generator.bit_generator.state, self._block, self._list, self._index
+
+    def set_state(self, state):
+        generator_state, self._block, self._list, self._index = state
+        self.generator.bit_generator.state = generator_state
+
+    def roll(self, n):
+        """n rolls as a list of ints"""
+        if self._index + n > len(self._block):
+            self._refill(n)
+        if self._list is None:
+            self._list = self._block.tolist()
+        index = self._index
+        self._index += n
+        return self._list[index:index + n]
+
+    def reserve(self, n):
+        """
+        The current block and the index of the next roll, with at least n rolls left,
+        for code reading the rolls itself. advance(n) takes them.
+        """
+        if self._index + n > len(self._block):
+            self._refill(n)
+        return self._block, self._index
+
+    def advance(self, n):
+        self._index += n
+
+    def rolls(self, shape):
+        """Rolls as a read only int8 array of the given shape"""
+        n = int(np.prod(shape))
+        if self._index + n > len(self._block):
+            self._refill(n)
+        index = self._index
+        self._index += n
+        return self._block[index:index + n].reshape(shape)
+
+    def _refill(self, n):
+        self._block = self.generator.integers(1, 7, size=max(self.block_size, n), dtype=np.int8)
+        self._block.flags.writeable = False
+        self._list = None
+        self._index = 0
@@ -0,0 +1,186 @@
+import numpy as np
+
+from qwixx_gym.envs import qwixx_kernels as kernels
+from qwixx_gym.envs.qwixx_action_mask import MOVE_TABLE, bits_mask
+from qwixx_gym.envs.qwixx_kernels import (
+    COUNTS_SLOT, CUSTOM_REWARD, DELTA_REWARD, DICE_SLOT, LATEST_SLOT, PLAYER_SLOT, PREVIOUS_SLOT,
+    SHAPED_REWARD, STATE_SIZE, STRIKES_SLOT, TERMINAL_REWARD, TURNS_SLOT,
+)
+from qwixx_gym.envs.qwixx_one_hot_env import QwixxOneHotEnv, _ACTION_NAMES
+from qwixx_gym.envs.qwixx_reward import ScoreDeltaReward, ShapedReward, TerminalReward
+from qwixx_gym.envs.qwixx_state import Dice, PlayerProgress, pack_state, unpack_state
+
+_REWARD_KINDS = {ShapedReward: SHAPED_REWARD, TerminalReward: TERMINAL_REWARD, ScoreDeltaReward: DELTA_REWARD}
+
+
+def _slot_property(slot):
+    def get(self):
+        return int(self._state[slot])
+
+    def set(self, value):
+        self._state[slot] = value
+
+    return property(get, set)
+
+
+class QwixxKernelEnv(QwixxOneHotEnv):
+    """
+    QwixxOneHotEnv(backend="kernel"): the game is one int64 array stepped by the
+    kernels of qwixx_kernels, compiled with numba when it is installed. Steps,
+    rewards and observations are the same as the python backend's.
+
+    The built in rewards are computed by the step kernel, other reward functions are
+    called as usual. dice and progress are Dice and PlayerProgress copies of the
+    array made on access, changes to them are written back before the next kernel
+    call. Read them again after a step, objects kept from before don't follow it.
+    """
+    backend = "kernel"
+
+    def __init__(self, *args, **kwargs):
+        self._state = np.zeros(STATE_SIZE, dtype=np.int64)
+        self._changed = np.zeros((2, 2), dtype=np.int64)
+        self._dice = Dice()
+        self._progress = PlayerProgress()
+        # the dice and progress objects hold the game instead of the array
+        self._live = False
+        super().__init__(*args, **kwargs)
+
+    current_player = _slot_property(PLAYER_SLOT)
+    num_turns = _slot_property(TURNS_SLOT)
+
+    @property
+    def dice(self):
+        if not self._live:
+            self._pull()
+        return self._dice
+
+    @dice.setter
+    def dice(self, dice):
+        if not self._live:
+            self._pull()
+        self._dice = dice
+
+    @property
+    def progress(self):
+        if not self._live:
+            self._pull()
+        return self._progress
+
+    @progress.setter
+    def progress(self, progress):
+        if not self._live:
+            self._pull()
+        self._progress = progress
+
+    @property
+    def previous_dice(self):
+        previous = self._state[PREVIOUS_SLOT:PREVIOUS_SLOT + 6]
+        return Dice(*previous.tolist()) if previous.any() else None
+
+    @previous_dice.setter
+    def previous_dice(self, dice):
+        self._state[PREVIOUS_SLOT:PREVIOUS_SLOT + 6] = 0 if dice is None else dice.values
+
+    def step_unchecked(self, action):
+        if self._live:
+            self._push()
+        reward_kind = _REWARD_KINDS.get(type(self.reward), CUSTOM_REWARD)
+        current_score = self._calculate_score() if reward_kind == CUSTOM_REWARD else 0
+        block, index = self.dice_source.reserve(6)
+        valid, reward, done, score, bits, skip, num_changed = kernels.step(
+            self._state, action, block, index, self.num_players, self.bot_player, self.skip_bias,
+            reward_kind, MOVE_TABLE, self._observation, self._changed)
+        self.last_actions = _ACTION_NAMES[action]
+        self.score = int(score)
+        observation = self._observation.copy() if self.copy else self._observation
+        info = {"score": self.score, "action_mask": bits_mask(bits)}
+        if not valid:
+            return observation, self.invalid_move_reward, True, info
+        self.dice_source.advance(6)
+        if reward_kind == CUSTOM_REWARD:
+            changed_values = [tuple(pair) for pair in self._changed[:num_changed].tolist()]
+            skip_reward = skip if not changed_values and self.reward.needs_skip_analysis else None
+            reward = self.reward(self, changed_values, current_score, skip_reward)
+        else:
+            reward = float(reward)
+        self.last_reward = reward
+        return observation, reward, bool(done), info
+
+    def legal_action_mask(self):
+        if self._live:
+            self._push()
+        return bits_mask(kernels.action_bits(self._state, self._is_bots_roll(), MOVE_TABLE))
+
+    def get_state(self):
+        if self._live:
+            self._push()
+        state = self._state.tolist()
+        return pack_state(state[DICE_SLOT:DICE_SLOT + 6], state[COUNTS_SLOT:COUNTS_SLOT + 4],
+                          state[LATEST_SLOT:LATEST_SLOT + 4], state[STRIKES_SLOT], state[TURNS_SLOT],
+                          state[PLAYER_SLOT])
+
+    def set_state(self, state):
+        dice, counts, latest, strikes, num_turns, current_player = unpack_state(state)
+        self._state[DICE_SLOT:DICE_SLOT + 6] = dice
+        self._state[COUNTS_SLOT:COUNTS_SLOT + 4] = counts
+        self._state[LATEST_SLOT:LATEST_SLOT + 4] = latest
+        self._state[STRIKES_SLOT] = strikes
+        self._state[TURNS_SLOT] = num_turns
+        self._state[PLAYER_SLOT] = current_player
+        self._live = False
+
+    def reset(self):
+        self._live = False
+        block, index = self.dice_source.reserve(6)
+        kernels.reset(self._state, block, index)
+        self.dice_source.advance(6)
+        self.last_actions = []
+        self.last_reward = None
+        self.score = 0
+        return self._serialize_state()
+
+    def _calculate_score(self):
+        if self._live:
+            self._push()
+        self.score = int(kernels.score(self._state))
+        return self.score
+
+    def _is_done(self):
+        if self._live:
+            self._push()
+        return bool(kernels.is_done(self._state))
+
+    def _roll_dice(self):
+        if self._live:
+            self._push()
+        block, index = self.dice_source.reserve(6)
+        kernels.roll(self._state, block, index)
+        self.dice_source.advance(6)
+
+    def _serialize_state(self, out=None):
+        if self._live:
+            self._push()
+        observation = self._observation if out is None else out.reshape(-1)
+        kernels.encode(self._state, self.bot_player, observation)
+        if out is not None:
+            return out
+        return observation.copy() if self.copy else observation
+
+    def _pull(self):
+        """Copies the array into the dice and progress objects, which hold the game from now on"""
+        state = self._state.tolist()
+        self._dice.values[:] = state[DICE_SLOT:DICE_SLOT + 6]
+        progress = self._progress
+        progress.counts.values[:] = state[COUNTS_SLOT:COUNTS_SLOT + 4]
+        progress.latest_num.values[:] = state[LATEST_SLOT:LATEST_SLOT + 4]
+        progress.strikes = state[STRIKES_SLOT]
+        self._live = True
+
+    def _push(self):
+        """Copies the dice and progress objects back into the array for the kernels"""
+        state, progress = self._state, self._progress
+        state[DICE_SLOT:DICE_SLOT + 6] = self._dice.values
+        state[COUNTS_SLOT:COUNTS_SLOT + 4] = progress.counts.values
+        state[LATEST_SLOT:LATEST_SLOT + 4] = progress.latest_num.values
+        state[STRIKES_SLOT] = progress.strikes
+        self._live = False
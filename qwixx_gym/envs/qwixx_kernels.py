@@ -0,0 +1,241 @@
+"""
+The single game transition as kernels over a flat int64 state array, for
+QwixxKernelEnv. The kernels are compiled in nopython mode when numba is installed,
+otherwise they run as they are, as plain Python over numpy arrays. Both give the
+results of QwixxOneHotEnv's own step, reset and _serialize_state.
+
+State layout, the indices are the *_SLOT constants:
+
+    0-5    dice, white1, white2, red, yellow, green, blue
+    6-9    counts
+    10-13  latest numbers
+    14     strikes
+    15     num_turns
+    16     current_player
+    17-22  the dice before the last roll, all 0 right after reset
+
+The big MOVE_TABLE of qwixx_action_mask is passed in rather than read as a global,
+numba would bake globals into the compiled code.
+"""
+import importlib.util
+
+import numpy as np
+
+from qwixx_gym.envs.qwixx_action_mask import COUNT_CATEGORY, ROLLER_BITS
+from qwixx_gym.envs.qwixx_rules import (
+    ASCENDING, COLOR_ACTION_DIE, COLOR_ACTION_INDEX, COLOR_SKIP, LATEST_ENCODING, LOCK_COUNT, MAX_STRIKES,
+    MAX_TURNS, MAX_VALUE, NO_SKIP, NOT_TAKEN, SCORE_TABLE, SKIP_WEIGHT_SUM, START_VALUE, STRIKE_PENALTY,
+    WHITE_ACTION_INDEX, WHITE_SKIP,
+)
+
+NUMBA_AVAILABLE = importlib.util.find_spec("numba") is not None
+if NUMBA_AVAILABLE:
+    from numba import njit
+
+    jit = njit(cache=True, nogil=True)
+else:
+    def jit(function):
+        return function
+
+DICE_SLOT, COUNTS_SLOT, LATEST_SLOT = 0, 6, 10
+STRIKES_SLOT, TURNS_SLOT, PLAYER_SLOT, PREVIOUS_SLOT = 14, 15, 16, 17
+STATE_SIZE = 23
+# reward kinds step computes itself, rewards of any other kind are left to the caller
+CUSTOM_REWARD, SHAPED_REWARD, TERMINAL_REWARD, DELTA_REWARD = -1, 0, 1, 2
+
+_MAX_VALUE = MAX_VALUE.astype(np.int64)
+_START_VALUE = START_VALUE.astype(np.int64)
+_SCORE = SCORE_TABLE.astype(np.int64)
+_WHITE_COLOR = WHITE_ACTION_INDEX.astype(np.int64)
+_COLOR_DIE = COLOR_ACTION_DIE.astype(np.int64)
+_COLOR_COLOR = COLOR_ACTION_INDEX.astype(np.int64)
+_WHITE_SKIP = WHITE_SKIP.astype(np.int64)
+_COLOR_SKIP = COLOR_SKIP.astype(np.int64)
+_SKIP_WEIGHT_SUM = SKIP_WEIGHT_SUM.astype(np.int64)
+_COUNT_CATEGORY = COUNT_CATEGORY.astype(np.int64)
+_SUMS = 13
+
+
+@jit
+def score(state):
+    total = -STRIKE_PENALTY * state[STRIKES_SLOT]
+    for c in range(4):
+        total += _SCORE[state[COUNTS_SLOT + c]]
+        if state[LATEST_SLOT + c] == _MAX_VALUE[c]:
+            total += 1
+    return total
+
+
+@jit
+def is_done(state):
+    locked = 0
+    for c in range(4):
+        if state[LATEST_SLOT + c] == _MAX_VALUE[c]:
+            locked += 1
+    return state[TURNS_SLOT] > MAX_TURNS or state[STRIKES_SLOT] == MAX_STRIKES or locked >= 2
+
+
+@jit
+def roll(state, block, index):
+    """Rolls the dice of the unlocked colors from block[index:index + 6], all six are used up"""
+    state[TURNS_SLOT] += 1
+    for die in range(6):
+        state[PREVIOUS_SLOT + die] = state[DICE_SLOT + die]
+    state[DICE_SLOT] = block[index]
+    state[DICE_SLOT + 1] = block[index + 1]
+    for c in range(4):
+        if state[LATEST_SLOT + c] != _MAX_VALUE[c]:
+            state[DICE_SLOT + 2 + c] = block[index + 2 + c]
+
+
+@jit
+def reset(state, block, index):
+    state[:] = 0
+    for c in range(4):
+        state[LATEST_SLOT + c] = _START_VALUE[c]
+    roll(state, block, index)
+    state[TURNS_SLOT] = 0
+    for die in range(6):
+        state[PREVIOUS_SLOT + die] = 0
+
+
+@jit
+def skip_reward(state, bots_roll, skip_bias):
+    """QwixxOneHotEnv.calculate_skip_reward"""
+    white = state[DICE_SLOT] + state[DICE_SLOT + 1]
+    skipped = NOT_TAKEN
+    for c in range(4):
+        skipped = min(skipped, _WHITE_SKIP[c, state[LATEST_SLOT + c], white])
+    reward = NO_SKIP if skipped == NOT_TAKEN else skipped
+    if not bots_roll:
+        return float(reward)
+    skipped = NOT_TAKEN
+    for c in range(4):
+        latest, die = state[LATEST_SLOT + c], state[DICE_SLOT + 2 + c]
+        skipped = min(skipped, _COLOR_SKIP[c, latest, state[DICE_SLOT] + die],
+                      _COLOR_SKIP[c, latest, state[DICE_SLOT + 1] + die])
+    reward = min(reward, NO_SKIP if skipped == NOT_TAKEN else skipped)
+    return float(reward - skip_bias)
+
+
+@jit
+def action_bits(state, bots_roll, move_table):
+    """Legal actions as a 45 bit integer, qwixx_action_mask.state_action_mask"""
+    white1, white2 = state[DICE_SLOT], state[DICE_SLOT + 1]
+    bits = ROLLER_BITS[1 if bots_roll else 0]
+    for c in range(4):
+        die = state[DICE_SLOT + 2 + c]
+        index = ((state[LATEST_SLOT + c] * 3 + _COUNT_CATEGORY[state[COUNTS_SLOT + c]]) * _SUMS
+                 + white1 + white2) * _SUMS
+        index = (index + white1 + die) * _SUMS + white2 + die
+        bits &= move_table[c, index]
+    return bits
+
+
+@jit
+def encode(state, bot_player, out):
+    """Writes the (48,) observation of QwixxOneHotEnv._serialize_state into out"""
+    player = state[PLAYER_SLOT]
+    out[0] = player == bot_player
+    out[1] = player
+    out[2] = bot_player
+    out[3:39] = 0
+    for die in range(6):
+        value = state[DICE_SLOT + die]
+        if value > 0:
+            out[3 + 6 * die + value - 1] = 1
+    for c in range(4):
+        out[39 + c] = state[COUNTS_SLOT + c]
+        out[43 + c] = LATEST_ENCODING[c, state[LATEST_SLOT + c]]
+    out[47] = state[STRIKES_SLOT] / 4.0
+
+
+@jit
+def _valid(state, color, value):
+    latest = state[LATEST_SLOT + color]
+    if ASCENDING[color]:
+        ordered = value > latest
+    else:
+        ordered = value < latest
+    return ordered and (value != _MAX_VALUE[color] or state[COUNTS_SLOT + color] == LOCK_COUNT)
+
+
+@jit
+def _mark(state, color, value, changed, num_changed):
+    changed[num_changed, 0] = state[LATEST_SLOT + color]
+    changed[num_changed, 1] = value
+    state[COUNTS_SLOT + color] += 1
+    state[LATEST_SLOT + color] = value
+
+
+@jit
+def step(state, action, block, index, num_players, bot_player, skip_bias, reward_kind, move_table,
+         observation, changed):
+    """
+    QwixxOneHotEnv.step_unchecked of a flat action, rolling the next dice from
+    block[index:index + 6] and writing the observation into observation. Returns
+    (valid, reward, done, score, bits, skip, num_changed):
+    - valid: False on invalid moves, which end the game without rolling. Only valid
+      moves use up the six rolls.
+    - reward: of reward_kind, 0 for CUSTOM_REWARD and invalid moves
+    - score and the legal action bits of the next state
+    - skip: the skip analysis when nothing was marked
+    - num_changed: how many (before, after) latest numbers were written into changed
+    """
+    before = score(state)
+    white_action, color_action = action % 5, action // 5
+    bots_roll = state[PLAYER_SLOT] == bot_player
+    next_player = (state[PLAYER_SLOT] + 1) % num_players
+    state[PLAYER_SLOT] = next_player
+    valid = True
+    skip = 0.0
+    num_changed = 0
+    if not bots_roll and color_action != 0:
+        # non-roller players can't take the color die
+        valid = False
+    elif bots_roll and white_action == 0 and color_action == 0:
+        state[STRIKES_SLOT] += 1
+        roll(state, block, index)
+        skip = skip_reward(state, next_player == bot_player, skip_bias)
+    else:
+        if white_action != 0:
+            color = _WHITE_COLOR[white_action]
+            value = state[DICE_SLOT] + state[DICE_SLOT + 1]
+            if _valid(state, color, value):
+                _mark(state, color, value, changed, num_changed)
+                num_changed += 1
+            else:
+                valid = False
+        if valid and color_action != 0:
+            color = _COLOR_COLOR[color_action]
+            value = state[DICE_SLOT + _COLOR_DIE[color_action]] + state[DICE_SLOT + 2 + color]
+            if _valid(state, color, value):
+                _mark(state, color, value, changed, num_changed)
+                num_changed += 1
+            else:
+                valid = False
+        if valid:
+            # the skip analysis looks at the dice of this turn
+            if num_changed == 0:
+                skip = skip_reward(state, next_player == bot_player, skip_bias)
+            roll(state, block, index)
+    after = score(state)
+    done = is_done(state)
+    reward = 0.0
+    if not valid:
+        done = True
+    elif reward_kind == SHAPED_REWARD:
+        if num_changed == 0:
+            reward = skip
+        else:
+            divisor = 1
+            for i in range(num_changed):
+                divisor += _SKIP_WEIGHT_SUM[changed[i, 0], changed[i, 1]]
+            reward = (after - before) / divisor * 100
+    elif reward_kind == TERMINAL_REWARD:
+        reward = after if done else 0.0
+    elif reward_kind == DELTA_REWARD:
+        reward = after - before
+    encode(state, bot_player, observation)
+    bits = action_bits(state, next_player == bot_player, move_table)
+    return valid, reward, done, after, bits, skip, num_changed
@@ -0,0 +1,151 @@
+import numpy as np
+
+from qwixx_gym.envs.qwixx_action_mask import action_bits, open_bits, unpack_bits
+from qwixx_gym.envs.qwixx_dice import DiceSource
+from qwixx_gym.envs.qwixx_spaces import LazySpace, action_space, observation_space
+from qwixx_gym.envs.qwixx_rules import (
+    INVALID_MOVE_REWARD, MAX_TURNS, MAX_STRIKES, MAX_VALUE, START_VALUE, WHITE_ACTION_INDEX,
+    COLOR_ACTION_DIE, COLOR_ACTION_INDEX, OBSERVATION_SIZE,
+)
+from qwixx_gym.envs.qwixx_vector_env import calculate_score, serialize_state, take
+
+
+class QwixxMultiAgentEnv:
+    """
+    One game of Qwixx with a board for every seat. The state lives in NumPy arrays
+    with one row per seat:
+    - counts, latest_num: (P, 4) int8, columns red, yellow, green, blue
+    - strikes: (P,) int8
+    and is shared by the seats otherwise:
+    - dice: (6,) int8, columns white1, white2, red, yellow, green, blue
+    - locked: (4,) bool, the rows closed for everyone
+    - current_player: the seat that rolled, num_turns
+
+    step takes one action per seat, either (P, 2) [white, color] actions or (P,)
+    flat actions decoded as in QwixxOneHotEnv.step. Every seat may mark the white sum
+    at the same time, the roller may then mark a white + color sum as well and takes
+    a strike when marking nothing. Seats that didn't roll must pass on the color dice.
+    A row locked by any seat is closed for all seats and its die is no longer rolled,
+    seats locking in the same white phase all keep their mark. A color move into a row
+    another seat locked in the white phase of the same step is forfeited: it marks
+    nothing and costs neither a penalty nor a strike, the roller couldn't know. Into
+    a row the roller locked with the white dice it is invalid, as legal_action_mask
+    says. The game ends when a seat has 4 strikes, two rows are locked, after 50
+    turns, or on an invalid move.
+
+    Observations are (P, 48), every row the QwixxOneHotEnv encoding from that seat's
+    view, so single seat agents can play any seat. Rewards are the seats' score
+    changes, invalid_move_reward for a seat that made an invalid move. info has the
+    "score" of every seat, the "locked" rows and the legal "action_mask" per seat.
+    """
+    single_action_space = LazySpace(action_space)
+    single_observation_space = LazySpace(observation_space)
+
+    def __init__(self, num_players=3, copy=True, seed=None):
+        self.num_players = num_players
+        self.copy = copy
+        self.invalid_move_reward = INVALID_MOVE_REWARD
+
+        self.dice = np.zeros(6, dtype=np.int8)
+        self.counts = np.zeros((num_players, 4), dtype=np.int8)
+        self.latest_num = np.zeros((num_players, 4), dtype=np.int8)
+        self.strikes = np.zeros(num_players, dtype=np.int8)
+        self.locked = np.zeros(4, dtype=np.bool_)
+        self.num_turns = 0
+        self.current_player = 0
+        self._seats = np.arange(num_players)
+        self._observations = np.zeros((num_players, OBSERVATION_SIZE), dtype=np.float32)
+        self._skipped = np.zeros(num_players, dtype=np.int16)
+        self.seed(seed)
+
+        self.reset()
+
+    def reset(self):
+        """Starts a new game and returns the observations of every seat"""
+        self.counts[:] = 0
+        self.latest_num[:] = START_VALUE
+        self.strikes[:] = 0
+        self.locked[:] = False
+        self.current_player = 0
+        self.dice[:] = 0
+        self._roll_dice()
+        self.num_turns = 0
+        return self._serialize_state()
+
+    def seed(self, seed=None):
+        """Restarts the dice stream from seed, an int or np.random.SeedSequence"""
+        self.dice_source = DiceSource(seed)
+        return [seed]
+
+    def step(self, actions):
+        actions = np.asarray(actions)
+        if actions.ndim == 2:
+            white_action, color_action = actions[:, 0], actions[:, 1]
+        else:
+            white_action, color_action = actions % 5, actions // 5
+        dice, counts, latest = self.dice, self.counts, self.latest_num
+
+        rolls = self._seats == self.current_player
+        # non-roller players can't take the color die
+        invalid = ~rolls & (color_action != 0)
+        strike = rolls & (white_action == 0) & (color_action == 0)
+        move = ~invalid & ~strike
+        current_score = calculate_score(counts, latest, self.strikes)
+        locked_before = self.locked.copy()
+
+        # every seat takes the white sum at once
+        rows = np.flatnonzero(move & (white_action != 0))
+        color = WHITE_ACTION_INDEX[white_action[rows]]
+        self._take(rows, color, np.full(len(rows), dice[0] + dice[1]), invalid)
+        # rows locked by the white dice are closed for the color dice
+        locked_by_others = (latest[~rolls] == MAX_VALUE).any(0) & ~locked_before
+        self.locked |= (latest == MAX_VALUE).any(0)
+
+        rows = np.flatnonzero(move & (color_action != 0) & ~invalid)
+        color = COLOR_ACTION_INDEX[color_action[rows]]
+        # moves into a row another seat just locked are forfeited, the roller's own lock makes them invalid
+        kept = ~locked_by_others[color]
+        rows, color = rows[kept], color[kept]
+        value = dice[COLOR_ACTION_DIE[color_action[rows]]] + dice[color + 2]
+        self._take(rows, color, value, invalid)
+        self.locked |= (latest == MAX_VALUE).any(0)
+        self.strikes[strike] += 1
+
+        score = calculate_score(counts, latest, self.strikes)
+        rewards = (score - current_score).astype(np.float32)
+        rewards[invalid] = self.invalid_move_reward
+        self.current_player = (self.current_player + 1) % self.num_players
+        done = bool(invalid.any())
+        if not done:
+            self._roll_dice()
+            done = (self.num_turns > MAX_TURNS or self.strikes.max() == MAX_STRIKES
+                    or self.locked.sum() >= 2)
+        info = {"score": score, "locked": self.locked.copy(), "action_mask": self.legal_action_mask()}
+        return self._serialize_state(), rewards, done, info
+
+    def legal_action_mask(self):
+        """(P, 45) bools, True where the flat action is a legal move for that seat"""
+        bits = action_bits(self.dice, self.counts, self.latest_num, self._seats == self.current_player)
+        return unpack_bits(open_bits(bits, self.locked))
+
+    def close(self):
+        pass
+
+    def _take(self, rows, color, value, invalid):
+        closed = self.locked[color]
+        invalid[rows[closed]] = True
+        open_rows = ~closed
+        take(self.counts, self.latest_num, rows[open_rows], color[open_rows], value[open_rows],
+             invalid, self._skipped)
+
+    def _roll_dice(self):
+        self.num_turns += 1
+        rolled = self.dice_source.rolls(6)
+        self.dice[:2] = rolled[:2]
+        # dice of locked rows are out of the game and keep their last value
+        self.dice[2:] = np.where(self.locked, self.dice[2:], rolled[2:])
+
+    def _serialize_state(self):
+        serialize_state(self._observations, np.broadcast_to(self.dice, (self.num_players, 6)),
+                        self.counts, self.latest_num, self.strikes, self.current_player, self._seats)
+        return self._observations.copy() if self.copy else self._observations
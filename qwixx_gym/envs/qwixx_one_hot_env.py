@@ -1,64 +1,46 @@
+import importlib.util
 import sys
-from dataclasses import dataclass
 from itertools import chain
-from typing import List
 
-from gym import spaces, Env
 import numpy as np
 
+from qwixx_gym.envs.qwixx_action_mask import state_action_mask
+from qwixx_gym.envs.qwixx_dice import DiceSource
+from qwixx_gym.envs.qwixx_outcomes import locked_mask, outcome_table
+from qwixx_gym.envs.qwixx_reward import make_reward
+from qwixx_gym.envs.qwixx_spaces import Env, LazySpace, action_space, observation_space
+from qwixx_gym.envs.qwixx_rules import (
+    WHITE_ACTION_COLOR, COLOR_ACTION, COMPARE_FUNCTION, WIN_REWARD, LOSE_REWARD,
+    SKIP_BIAS, OBSERVATION_SIZE, MAX_TURNS, MAX_STRIKES, COLORS, MAX_VALUE, WHITE_SKIP,
+    COLOR_SKIP, NO_SKIP, NOT_TAKEN, WHITE_ACTION_INDEX, COLOR_ACTION_DIE, COLOR_ACTION_INDEX,
+    RED, YELLOW, GREEN, BLUE, WHITE1, WHITE2, ACTION_PAIRS, NUM_ACTIONS, can_lock,
+)
+from qwixx_gym.envs.qwixx_state import ColorCount, PlayerProgress, Dice, pack_state, unpack_state
+
+DIE_ROWS = np.arange(6)
+# int versions of the rule tables, indexed by color
+_MAX_VALUE = MAX_VALUE.tolist()
+_COMPARE = [COMPARE_FUNCTION[c] for c in COLORS]
+_WHITE_ACTION_INDEX = WHITE_ACTION_INDEX.tolist()
+_COLOR_ACTION_DIE = COLOR_ACTION_DIE.tolist()
+_COLOR_ACTION_INDEX = COLOR_ACTION_INDEX.tolist()
+_WHITE_SKIP = WHITE_SKIP.tolist()
+_COLOR_SKIP = COLOR_SKIP.tolist()
+_ACTION_PAIRS = [tuple(pair) for pair in ACTION_PAIRS.tolist()]
+_ACTION_NAMES = [(WHITE_ACTION_COLOR[white], COLOR_ACTION[color]) for white, color in _ACTION_PAIRS]
+# number of locked colors of a lock bitmask
+_LOCKED_COUNT = [bin(mask).count("1") for mask in range(1 << len(COLORS))]
+BACKENDS = ("python", "kernel")
+
+
+def resolve_backend(backend=None):
+    """The backend to run, None picks "kernel" when numba is installed and "python" otherwise"""
+    if backend is None:
+        return "kernel" if importlib.util.find_spec("numba") is not None else "python"
+    if backend not in BACKENDS:
+        raise ValueError("unknown backend {!r}, one of {}".format(backend, ", ".join(BACKENDS)))
+    return backend
 
-@dataclass
-class ColorCount:
-    red: int
-    yellow: int
-    green: int
-    blue: int
-
-
-@dataclass
-class PlayerProgress:
-    def __init__(self):
-        self.counts = ColorCount(0, 0, 0, 0)
-        self.latest_num = ColorCount(1, 1, 13, 13)
-        self.strikes = 0
-
-
-@dataclass
-class Dice:
-    white1: int = 0
-    white2: int = 0
-    red: int = 0
-    yellow: int = 0
-    green: int = 0
-    blue: int = 0
-
-
-DIE_ROLLS = range(1, 7)
-COLORS_MAX = {"red": 12, "yellow": 12, "green": 2, "blue": 2}
-WHITE_ACTION_COLOR = [None, "red", "yellow", "blue", "green"]
-COLOR_ACTION = [None,
-                ("white1", "red"), ("white1", "yellow"), ("white1", "blue"), ("white1", "green"),
-                ("white2", "red"), ("white2", "yellow"), ("white2", "blue"), ("white2", "green"),
-                ]
-SCORE = [0, 1, 3, 6, 10, 15, 21, 28, 36, 45, 55, 66, 78]
-SKIP_WEIGHT = [None, None, 1, 2, 3, 4, 5, 6, 5, 4, 3, 2, 1]
-
-
-def less_than(left, right):
-    return left < right
-
-
-def greater_than(left, right):
-    return left > right
-
-
-COMPARE_FUNCTION = {
-    "red": greater_than, "yellow": greater_than, "green": less_than, "blue": less_than,
-}
-INVALID_MOVE_REWARD = 0
-WIN_REWARD = 1000
-LOSE_REWARD = 0
-SKIP_BIAS = -2
 
 class QwixxOneHotEnv(Env):
     """
@@ -79,9 +61,21 @@ class QwixxOneHotEnv(Env):
     - Take white 2 yellow
     - Take white 2 blue
     - Take white 2 green
+
+    step takes [white, color] pairs or flat ints white + 5 * color from 0 to 44, the
+    index into legal_action_mask and the Q values of an agent. step_unchecked takes
+    trusted flat ints only and skips the decoding and range check.
+
+    backend "python" runs the game on the objects below, "kernel" creates a
+    QwixxKernelEnv instead, which steps a flat int array with compiled kernels, see
+    qwixx_kernels. By default the kernels are used when numba is installed.
     """
-    action_space = spaces.MultiDiscrete([5, 9])
-    action_space.n = 45
+    backend = "python"
+    # the methods enable_profiling times
+    PROFILED_METHODS = ("step", "step_unchecked", "reset", "legal_action_mask", "_roll_dice",
+                        "_calculate_score", "_is_done", "_serialize_state", "calculate_skip_reward", "_reward")
+    action_space = LazySpace(action_space)
+    observation_space = LazySpace(observation_space)
     dice: Dice
     previous_dice: Dice
     current_player: int
@@ -89,174 +83,270 @@ class QwixxOneHotEnv(Env):
     env = object
     score: int
 
-    def __init__(self, num_players=3, bot_player=0):
+    def __new__(cls, *args, backend=None, **kwargs):
+        if cls is QwixxOneHotEnv and resolve_backend(backend) == "kernel":
+            from qwixx_gym.envs.qwixx_kernel_env import QwixxKernelEnv
+            cls = QwixxKernelEnv
+        return super().__new__(cls)
+
+    def __init__(self, num_players=3, bot_player=0, copy=True, debug=False, reward="shaped", backend=None):
+        if backend is not None and resolve_backend(backend) != self.backend:
+            raise ValueError("{} has no {} backend".format(type(self).__name__, backend))
         self.bot_player = bot_player
         self.num_players = num_players
-        self.observation_space = spaces.Box(-np.inf, np.inf, shape=(1, 48), dtype='float32')
+        self.copy = copy
+        # cross check the incrementally kept score against a full recomputation
+        self.debug = debug
+        self._observation = np.zeros(OBSERVATION_SIZE, dtype=np.float32)
+        self._dice_values = np.zeros(6, dtype=np.intp)
+        self._one_hot = np.zeros((6, 7), dtype=np.float32)
         self.current_player = 0
         self.num_turns = 0
         self.last_actions = []
         self.last_reward = None
-        self.invalid_move_reward = INVALID_MOVE_REWARD
+        self.previous_dice = None
+        self.solver = None
+        self.profiler = None
+        self.dice_source = DiceSource()
+        # a registered name, RewardFunction class or instance, see qwixx_reward
+        self.reward = make_reward(reward)
+        self.invalid_move_reward = self.reward.invalid_move_reward
         self.win_reward = WIN_REWARD
         self.lose_reward = LOSE_REWARD
         self.skip_bias = SKIP_BIAS
 
         self.reset()
 
+    def __getnewargs_ex__(self):
+        # copies and unpickled envs keep their backend
+        return (), {"backend": self.backend}
+
     def step(self, action):
         """Run one timestep of the environment's dynamics. When end of
         episode is reached, you are responsible for calling `reset()`
         to reset this environment's state.
         Accepts an action and returns a tuple (observation, reward, done, info).
         Args:
-            action (object): an action provided by the agent
+            action (object): a flat int or a [white, color] pair
         Returns:
             observation (object): agent's observation of the current environment
             reward (float) : amount of reward returned after previous action
             done (bool): whether the episode has ended, in which case further step() calls will return undefined results
             info (dict): contains auxiliary diagnostic information (helpful for debugging, and sometimes learning)
         """
-        if not self.action_space.contains(action):
-            # noinspection PyTypeChecker
-            action = np.array([action % 5, action // 5])
+        if not isinstance(action, (int, np.integer)):
+            if np.ndim(action):
+                white_action, color_action = action
+                if not (0 <= white_action < len(WHITE_ACTION_COLOR) and 0 <= color_action < len(COLOR_ACTION)):
+                    raise ValueError("invalid action {}".format(action))
+                action = white_action + 5 * color_action
+            action = int(action)
+        if not 0 <= action < NUM_ACTIONS:
+            raise ValueError("action {} not between 0 and {}".format(action, NUM_ACTIONS - 1))
+        return self.step_unchecked(action)
+
+    def step_unchecked(self, action):
+        """step for a flat int action known to be between 0 and 44"""
         changed_values = []
         current_score = self._calculate_score()
         next_player = (self.current_player + 1) % self.num_players
-        white_action, color_action = action
-        self.last_actions = (WHITE_ACTION_COLOR[white_action], COLOR_ACTION[color_action])
+        white_action, color_action = _ACTION_PAIRS[action]
+        self.last_actions = _ACTION_NAMES[action]
         if not self._is_bots_roll() and color_action != 0:
             # non-roller players can't take the color die
             self.current_player = next_player
-            return self._serialize_state(), self.invalid_move_reward, True, {}
+            return self._serialize_state(), self.invalid_move_reward, True, self._info()
             # {"error": "took color, did not roll", "scores": scores}
         # If it chooses not to take white or color it adds a strike
         if self._is_bots_roll() and white_action == 0 and color_action == 0:
-            self.progress.strikes += 1
+            self.progress.strike()
             self.current_player = next_player
             self._roll_dice()
-            return (self._serialize_state(), self.calculate_skip_reward(),
-                    self._is_done(), {"score": self._calculate_score()})
+            return (self._serialize_state(), self._reward([], current_score, self._skip_reward([])),
+                    self._is_done(), self._info())
             # {"action": "took strike", "scores": scores}
         self.current_player = next_player
+        latest_num = self.progress.latest_num.values
         # take white action
         if white_action != 0:
-            white_color = WHITE_ACTION_COLOR[white_action]
-            latest = self.progress.latest_num.__dict__[white_color]
+            white_color = _WHITE_ACTION_INDEX[white_action]
+            latest = latest_num[white_color]
             wdv = self._white_dice_value()
             # Checks validity of move
-            if not COMPARE_FUNCTION[white_color](wdv, latest):
-                return self._serialize_state(), self.invalid_move_reward, True, {"score": self._calculate_score()}
+            if not _COMPARE[white_color](wdv, latest):
+                return self._serialize_state(), self.invalid_move_reward, True, self._info()
                 # {"error": "took white die invalid", "latest": latest,
                 #  "value": wdv, "color": white_color, "scores": scores})
-            if wdv == COLORS_MAX[white_color] and not self._can_lock_color(white_color):
-                return self._serialize_state(), self.invalid_move_reward, True, {"score": self._calculate_score()}
+            if wdv == _MAX_VALUE[white_color] and not self._can_lock_color(white_color):
+                return self._serialize_state(), self.invalid_move_reward, True, self._info()
                 # {"error": "tried to lock without having 5",
                 #  "latest": self.progress[self.current_player].counts.__dict__[white_color],
                 #  "color": white_color, "scores": scores})
 
-            self.progress.counts.__dict__[white_color] += 1
-            self.progress.latest_num.__dict__[white_color] = wdv
+            self.progress.mark(white_color, wdv)
             changed_values.append((latest, wdv))
 
         # take color action
         if color_action != 0:
-            white_die, color = COLOR_ACTION[color_action]
-            latest = self.progress.latest_num.__dict__[color]
+            white_die, color = _COLOR_ACTION_DIE[color_action], _COLOR_ACTION_INDEX[color_action]
+            latest = latest_num[color]
             cdv = self._color_dice_value(white_die, color)
             # Checks validity of move
-            if not COMPARE_FUNCTION[color](cdv, latest):
-                return self._serialize_state(), self.invalid_move_reward, True, {"score": self._calculate_score()}
+            if not _COMPARE[color](cdv, latest):
+                return self._serialize_state(), self.invalid_move_reward, True, self._info()
                 # {"error": "took color die invalid", "latest": latest,
                 #  "value": cdv, "color": color, "white": white_die, "scores": scores})
 
-            if cdv == COLORS_MAX[color] and not self._can_lock_color(color):
+            if cdv == _MAX_VALUE[color] and not self._can_lock_color(color):
                 self.current_player = next_player
-                return self._serialize_state(), self.invalid_move_reward, True, {"score": self._calculate_score()}
+                return self._serialize_state(), self.invalid_move_reward, True, self._info()
                 # {"error": "tried to lock without having 5",
                 #  "latest": self.progress[self.current_player].counts.__dict__[color],
                 #  "color": color, "scores": scores})
 
-            self.progress.counts.__dict__[color] += 1
-            self.progress.latest_num.__dict__[color] = cdv
+            self.progress.mark(color, cdv)
             changed_values.append((latest, cdv))
         self.current_player = next_player
-        reward = self.calculate_reward(changed_values, current_score)
+        # the skip analysis looks at the dice of this turn
+        skip_reward = self._skip_reward(changed_values)
         self._roll_dice()
-        return (self._serialize_state(), reward,
-                self._is_done(), {"score": self._calculate_score()})  # {"scores": scores}
+        return (self._serialize_state(), self._reward(changed_values, current_score, skip_reward),
+                self._is_done(), self._info())  # {"scores": scores}
 
-    def calculate_skip_reward(self):
-        wdv = self._white_dice_value()
-        skipped = []
-        for color, latest in self.progress.latest_num.__dict__.items():
-            cmv = COLORS_MAX[color]
-            # check if we have passed the white value
-            if cmv >= latest and latest >= wdv:
-                continue
-            if wdv >= latest and latest >= cmv:
-                continue
-            mi = min([latest, wdv])
-            ma = max([latest, wdv])
-            if mi < ma:
-                skipped.append(len(SKIP_WEIGHT[mi + 1: ma]))
-        if skipped:
-            r = min(skipped)
+    def legal_action_mask(self):
+        """
+        45 bools, True where the flat action white + 5 * color is a legal move in the
+        current state, i.e. stepping it won't end the game with invalid_move_reward
+        """
+        return state_action_mask(self.dice.values, self.progress.counts.values,
+                                 self.progress.latest_num.values, self._is_bots_roll())
+
+    def get_state(self):
+        """
+        Snapshot of the game, dice, board, turn and rolling player, packed into one int,
+        see qwixx_state. Restore it with set_state.
+        """
+        progress = self.progress
+        return pack_state(self.dice.values, progress.counts.values, progress.latest_num.values,
+                          progress.strikes, self.num_turns, self.current_player)
+
+    def set_state(self, state):
+        dice, counts, latest, strikes, num_turns, current_player = unpack_state(state)
+        self.dice.values[:] = dice
+        self.progress.counts.values[:] = counts
+        self.progress.latest_num.values[:] = latest
+        self.progress.strikes = strikes
+        self.progress.invalidate()
+        self.num_turns = num_turns
+        self.current_player = current_player
+
+    def clone_state(self):
+        """
+        Snapshot for restore_state, the packed game of get_state and the position of
+        the dice stream, so a restored env rolls the same dice again. Much cheaper than
+        copying the env.
+        """
+        return self.get_state(), self.dice_source.get_state()
+
+    def restore_state(self, snapshot):
+        state, dice_state = snapshot
+        self.set_state(state)
+        self.dice_source.set_state(dice_state)
+
+    def simulate(self, state, action, dice):
+        """
+        Next state, reward and done of a flat action in a packed state when dice are
+        rolled next, without touching the env, see qwixx_solver.simulate. Takes (N,)
+        states and actions and (N, 6) dice as well. Rewards are the score changes.
+        """
+        from qwixx_gym.envs.qwixx_solver import simulate
+        next_states, rewards, dones = simulate(np.atleast_1d(state), np.atleast_1d(action), np.atleast_2d(dice),
+                                               self.num_players, self.bot_player)
+        if np.ndim(state) == 0:
+            return int(next_states[0]), float(rewards[0]), bool(dones[0])
+        return next_states, rewards, dones
+
+    def dice_outcomes(self, state=None):
+        """
+        Distinct rolls with their probabilities for the locked colors of a packed state,
+        the current one by default, as (K, 6) dice and (K,) probabilities. The white dice
+        are unordered, see qwixx_outcomes.
+        """
+        if state is None:
+            mask = self.progress.locked
         else:
-            r = 10
-        self.last_reward = r
+            mask = int(locked_mask(np.array(unpack_state(state)[2]) == MAX_VALUE))
+        table = outcome_table(mask)
+        return table.dice, table.probabilities
+
+    def seed(self, seed=None):
+        """Restarts the dice stream from seed, an int or np.random.SeedSequence"""
+        self.dice_source = DiceSource(seed)
+        return [seed]
+
+    def optimal_action(self, state=None):
+        """
+        Flat action with the highest expected score for a packed state, the current
+        one by default, see qwixx_solver. Assign a loaded QwixxSolver to self.solver
+        to search deeper or reuse a saved table.
+        """
+        if self.solver is None:
+            from qwixx_gym.envs.qwixx_solver import QwixxSolver
+            self.solver = QwixxSolver(num_players=self.num_players, bot_player=self.bot_player)
+        return self.solver.optimal_action(self.get_state() if state is None else state)
+
+    def enable_profiling(self, profiler=None, prefix="env."):
+        """
+        Times PROFILED_METHODS as phases prefix + name of a qwixx_profiler.Profiler, a new
+        one by default, and returns it. Unprofiled envs run their methods untouched.
+        """
+        if profiler is None:
+            from qwixx_gym.envs.qwixx_profiler import Profiler
+            profiler = Profiler()
+        self.disable_profiling()
+        self.profiler = profiler
+        profiler.instrument(self, self.PROFILED_METHODS, prefix)
+        return profiler
+
+    def disable_profiling(self):
+        if self.profiler is not None:
+            self.profiler.restore(self)
+            self.profiler = None
+
+    def calculate_skip_reward(self):
+        dice, latest_num = self.dice.values, self.progress.latest_num.values
+        wdv = dice[WHITE1] + dice[WHITE2]
+        r = min(_WHITE_SKIP[color][latest][wdv] for color, latest in enumerate(latest_num))
+        self.last_reward = NO_SKIP if r == NOT_TAKEN else r
         if not self._is_bots_roll():
             return self.last_reward
         # if bot rolled we should see is colors were skipped too
-        skipped = []
-        for color, latest in self.progress.latest_num.__dict__.items():
-            min_skip_distance = self.get_skipped_values(color, latest)
-            if min_skip_distance is not None:
-                skipped.append(min_skip_distance)
-        if skipped:
-            r = min(skipped)
-        else:
-            r = 10
-        self.last_reward = min([self.last_reward, r])
+        r = min(self._skipped_value(color, latest) for color, latest in enumerate(latest_num))
+        self.last_reward = min(self.last_reward, NO_SKIP if r == NOT_TAKEN else r)
         return self.last_reward - self.skip_bias
 
     def get_skipped_values(self, color, latest):
-        cmv = COLORS_MAX[color]
-        cval1 = self._color_dice_value('white1', color)
-        cval2 = self._color_dice_value('white2', color)
-        if cmv == latest:
-            return None
-        if cmv > latest:
-            vals = []
-            if cval1 - latest > 0:
-                vals.append(cval1)
-            if cval2 - latest > 0:
-                vals.append(cval2)
-            if not vals:
-                return None
-            return len(SKIP_WEIGHT[latest + 1: min(vals)])
-        vals = []
-        if latest - cval1 > 0:
-            vals.append(cval1)
-        if latest - cval2 > 0:
-            vals.append(cval2)
-        if not vals:
-            return None
-        return len(SKIP_WEIGHT[max(vals): latest - 1])
+        r = self._skipped_value(color, latest)
+        return None if r == NOT_TAKEN else r
+
+    def _skipped_value(self, color, latest):
+        """Fewest numbers skipped by marking a white + color sum in color, NOT_TAKEN if none can be marked"""
+        dice = self.dice.values
+        skips = _COLOR_SKIP[color][latest]
+        return min(skips[dice[WHITE1] + dice[color + 2]], skips[dice[WHITE2] + dice[color + 2]])
 
     def calculate_reward(self, changed_values, current_score):
-        if not changed_values:
-            return self.calculate_skip_reward()
-        skipped = []
-        for before, after in changed_values:
-            if after - before >= 0:
-                skipped.append(sum(SKIP_WEIGHT[before + 1: after]))
-            else:
-                skipped.append(sum(SKIP_WEIGHT[after + 1: before]))
-        divisor = sum(skipped) + 1
-        r = (self._calculate_score() - current_score) / divisor * 100
-        self.last_reward = r
-        return r
+        """Reward of the active reward function for the current state, see qwixx_reward"""
+        return self._reward(changed_values, current_score, self._skip_reward(changed_values))
+
+    def _skip_reward(self, changed_values):
+        if changed_values or not self.reward.needs_skip_analysis:
+            return None
+        return self.calculate_skip_reward()
+
+    def _reward(self, changed_values, current_score, skip_reward):
+        self.last_reward = self.reward(self, changed_values, current_score, skip_reward)
+        return self.last_reward
 
     def reset(self):
         """Resets internal state to beginning of game and starts a new game"""
@@ -286,72 +376,85 @@ class QwixxOneHotEnv(Env):
         print("New dice:", self.dice)
         print("")
 
+    def _info(self):
+        return {"score": self._calculate_score(), "action_mask": self.legal_action_mask()}
+
     def _calculate_score(self):
-        scores = []
-        for color, count in self.progress.counts.__dict__.items():
-            color_score = SCORE[count]
-            if self.progress.latest_num.__dict__[color] == COLORS_MAX[color]:
-                color_score += 1
-            scores.append(color_score)
-        scores.append(self.progress.strikes * -5)
-        self.score = sum(scores)
+        self.score = self.progress.score
+        if self.debug:
+            self._check_progress()
         return self.score
 
+    def _check_progress(self):
+        score = self.progress.full_score()
+        if score != self.progress.score:
+            raise RuntimeError("incremental score {} != recomputed {}".format(self.progress.score, score))
+        locked = [color for color, max_value in enumerate(_MAX_VALUE)
+                  if self.progress.latest_num.values[color] == max_value]
+        if sum(1 << color for color in locked) != self.progress.locked:
+            raise RuntimeError("incremental locks {:04b} != recomputed {}".format(self.progress.locked, locked))
+
+    @property
+    def locked_colors(self):
+        return [color for i, color in enumerate(COLORS) if self.progress.locked >> i & 1]
+
     def _color_is_locked(self, color):
-        max_value = COLORS_MAX[color]
-        return self.progress.latest_num.__dict__[color] == max_value
+        return self.progress.latest_num.values[color] == _MAX_VALUE[color]
 
     def _can_lock_color(self, color):
-        return self.progress.counts.__dict__[color] == 5
+        return can_lock(self.progress.counts.values[color])
 
     def _is_done(self):
-        if self.num_turns > 50:
-            return True
-        self.locked_colors = []
-        for color, max_value in COLORS_MAX.items():
-            if self.progress.strikes == 4:
-                return True
-            if self.progress.latest_num.__dict__[color] == max_value:
-                self.locked_colors.append(color)
-        return len(self.locked_colors) >= 2
+        if self.debug:
+            self._check_progress()
+        return (self.num_turns > MAX_TURNS or self.progress.strikes == MAX_STRIKES
+                or _LOCKED_COUNT[self.progress.locked] >= 2)
 
     def _roll_dice(self):
         self.num_turns += 1
-        self.previous_dice = Dice(**self.dice.__dict__)
-        self.dice.white1 = np.random.choice(DIE_ROLLS)
-        self.dice.white2 = np.random.choice(DIE_ROLLS)
-
-        if not self._color_is_locked("yellow"):
-            self.dice.yellow = np.random.choice(DIE_ROLLS)
-        if not self._color_is_locked("red"):
-            self.dice.red = np.random.choice(DIE_ROLLS)
-        if not self._color_is_locked("blue"):
-            self.dice.blue = np.random.choice(DIE_ROLLS)
-        if not self._color_is_locked("green"):
-            self.dice.green = np.random.choice(DIE_ROLLS)
+        if self.previous_dice is None:
+            self.previous_dice = self.dice.copy()
+        else:
+            self.previous_dice.values[:] = self.dice.values
+        # always draw all six dice so locks don't shift the stream
+        rolled = self.dice_source.roll(6)
+        dice = self.dice.values
+        dice[WHITE1] = rolled[WHITE1]
+        dice[WHITE2] = rolled[WHITE2]
+        locked = self.progress.locked
+        for color in range(len(COLORS)):
+            if not locked >> color & 1:
+                dice[color + 2] = rolled[color + 2]
 
     def _white_dice_value(self):
-        return self.dice.white1 + self.dice.white2
+        dice = self.dice.values
+        return dice[WHITE1] + dice[WHITE2]
 
     def _color_dice_value(self, white_die, color):
-        dice = self.dice.__dict__
-        return dice[white_die] + dice[color]
+        dice = self.dice.values
+        return dice[white_die] + dice[color + 2]
 
     def _is_bots_roll(self):
         return self.bot_player == self.current_player
 
-    def _serialize_state(self):
-        y = self._is_bots_roll()
-        a = float(y)
-        return np.array([
-            a,
-            self.current_player,
-            self.bot_player,
-            *self._serialize_dice(),
-            *self._serialize_player(),
-        ], dtype=np.float)
-
-    def _serialize_player(self) -> List[float]:
+    def _serialize_state(self, out=None):
+        """
+        Writes the observation into out, or into the env's reusable float32 buffer.
+        Without out a copy of the buffer is returned, unless the env was created with
+        copy=False. Then the buffer itself is returned and it is overwritten by the
+        next step, which suits replay writers that copy the data anyway.
+        """
+        observation = self._observation if out is None else out.reshape(-1)
+        observation[0] = self._is_bots_roll()
+        observation[1] = self.current_player
+        observation[2] = self.bot_player
+        self._serialize_dice(observation[3:39])
+        self._serialize_player(observation[39:48])
+        if out is not None:
+            return out
+        return observation.copy() if self.copy else observation
+
+    def _serialize_player(self, out):
         """
         Serializes a players board. There are only 11 possible crosses you can do,
         this excludes the lock and the number 1. Since we store the latest numbers
@@ -359,24 +462,20 @@ class QwixxOneHotEnv(Env):
         red and yellow (can't roll a 1) and subtract 2 from green and blue (can't
         roll a 1 and not counting the lock)
         """
-        return [
-            float(self.progress.counts.red),
-            float(self.progress.counts.yellow),
-            float(self.progress.counts.green),
-            float(self.progress.counts.blue),
-            float((self.progress.latest_num.red - 1) / 11.0),
-            float((self.progress.latest_num.yellow - 1) / 11.0),
-            1 - float((self.progress.latest_num.green - 2) / 11.0),
-            1 - float((self.progress.latest_num.blue - 2) / 11.0),
-            float(self.progress.strikes / 4.0),
-        ]
-
-    def _serialize_dice(self):
-        return [
-            *[1. if x == self.dice.white1 - 1 else 0.0 for x in range(6)],
-            *[1. if x == self.dice.white2 - 1 else 0.0 for x in range(6)],
-            *[1. if x == self.dice.red - 1 else 0.0 for x in range(6)],
-            *[1. if x == self.dice.yellow - 1 else 0.0 for x in range(6)],
-            *[1. if x == self.dice.green - 1 else 0.0 for x in range(6)],
-            *[1. if x == self.dice.blue - 1 else 0.0 for x in range(6)],
-        ]
+        counts, latest = self.progress.counts.values, self.progress.latest_num.values
+        out[:4] = counts
+        out[4] = (latest[RED] - 1) / 11.0
+        out[5] = (latest[YELLOW] - 1) / 11.0
+        out[6] = 1 - (latest[GREEN] - 2) / 11.0
+        out[7] = 1 - (latest[BLUE] - 2) / 11.0
+        out[8] = self.progress.strikes / 4.0
+
+    def _serialize_dice(self, out):
+        """
+        One-hot encodes the six dice into out. Column 0 of the scratch array catches
+        dice that weren't rolled yet so they encode as all zeros.
+        """
+        self._dice_values[:] = self.dice.values
+        self._one_hot.fill(0)
+        self._one_hot[DIE_ROWS, self._dice_values] = 1
+        out.reshape(6, 6)[:] = self._one_hot[:, 1:]
@@ -0,0 +1,89 @@
+"""
+Exact distributions of the next roll, so expectations over it are a dot product
+instead of an average over sampled rolls.
+
+Locked colors aren't rolled, the distribution only depends on the locked colors,
+given as a bitmask as PlayerProgress.locked. outcome_table(mask) enumerates the
+distinct rolls once per mask: the white dice unordered, since every action on white1
+has a white2 twin, and a locked color's die fixed to 1, which can't mark it. That is
+21 * 6 ** unlocked rows instead of 6 ** 6. Besides the dice a table has what the
+actions look at, the white sum and every color's two white + color sums.
+
+Quantities that only depend on the white sum or on one color's sums need just the
+marginals WHITE_SUM_PROBABILITIES and COLOR_SUM_PROBABILITIES.
+"""
+from collections import namedtuple
+
+import numpy as np
+
+from qwixx_gym.envs.qwixx_rules import COLORS
+
+OutcomeTable = namedtuple("OutcomeTable", ["dice", "probabilities", "white_sums", "color_sums"])
+OutcomeTable.__doc__ = """
+dice (K, 6) int8 rolls, probabilities (K,), white_sums (K,) int8 and color_sums
+(K, 4, 2) int8, the sums of white1 and white2 with every color's die
+"""
+NUM_MASKS = 1 << len(COLORS)
+_FACES = np.arange(1, 7)
+_TABLES = [None] * NUM_MASKS
+
+
+def _white_pairs():
+    white1, white2 = np.meshgrid(_FACES, _FACES, indexing="ij")
+    keep = white1 <= white2
+    whites = np.stack([white1[keep], white2[keep]], axis=1)
+    return whites, np.where(whites[:, 0] == whites[:, 1], 1, 2) / 36.0
+
+
+def dice_outcomes(locked):
+    """
+    Distinct rolls for the (4,) bool locked colors as (K, 6) int8 dice and their (K,)
+    probabilities, see the module docstring
+    """
+    whites, white_p = _white_pairs()
+    colors = np.meshgrid(*[[1] if lock else _FACES for lock in locked], indexing="ij")
+    colors = np.stack([c.reshape(-1) for c in colors], axis=1)
+    dice = np.concatenate([np.repeat(whites, len(colors), axis=0),
+                           np.tile(colors, (len(whites), 1))], axis=1).astype(np.int8)
+    return dice, np.repeat(white_p, len(colors)) / len(colors)
+
+
+def locked_mask(locked):
+    """Bitmask of (..., 4) bool locked colors"""
+    return (np.asarray(locked) << np.arange(len(COLORS))).sum(-1)
+
+
+def outcome_table(mask):
+    """The OutcomeTable of a locked color bitmask, built on first use"""
+    table = _TABLES[mask]
+    if table is None:
+        dice, probabilities = dice_outcomes([mask >> c & 1 for c in range(len(COLORS))])
+        color_sums = (dice[:, :2, None] + dice[:, None, 2:]).transpose(0, 2, 1)
+        for array in (dice, probabilities, color_sums):
+            array.flags.writeable = False
+        white_sums = dice[:, 0] + dice[:, 1]
+        white_sums.flags.writeable = False
+        table = _TABLES[mask] = OutcomeTable(dice, probabilities, white_sums, color_sums)
+    return table
+
+
+def expectation(mask, values):
+    """Expected value over the next roll of (K, ...) values, one row per outcome of outcome_table(mask)"""
+    return np.tensordot(outcome_table(mask).probabilities, values, axes=1)
+
+
+def _marginals():
+    whites, white_p = _white_pairs()
+    white = np.zeros(13)
+    np.add.at(white, whites.sum(1), white_p)
+    # (white1 + color, white2 + color) of ordered white dice
+    color = np.zeros((13, 13))
+    for white1 in _FACES:
+        for white2 in _FACES:
+            color[white1 + _FACES, white2 + _FACES] += 1 / 216.0
+    return white, color
+
+
+# WHITE_SUM_PROBABILITIES[s] of a white sum s, COLOR_SUM_PROBABILITIES[a, b] of an
+# unlocked color's white1 + color sum a and white2 + color sum b
+WHITE_SUM_PROBABILITIES, COLOR_SUM_PROBABILITIES = _marginals()
@@ -0,0 +1,213 @@
+"""
+Opt-in timing of the phases of a training loop, e.g. the env's _roll_dice,
+_calculate_score and _serialize_state or the agent's act and replay.
+
+Profiler.instrument replaces methods of one object by timed wrappers, set as
+instance attributes, and restore removes them again. Objects that aren't
+instrumented run their plain methods, profiling costs nothing until it is enabled.
+Times are inclusive, a step's time contains the _roll_dice it calls.
+
+Every phase counts its calls and their total, smallest and largest time and sorts
+the durations into a histogram of power of two nanosecond buckets. With
+track_allocations the bytes a call leaves allocated are summed up as well, through
+tracemalloc, which slows everything down noticeably.
+
+The numbers export as a dict, a JSON file or a Prometheus text file, and summary()
+formats them as a table.
+"""
+import json
+import os
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+# bucket b holds durations below 2 ** b nanoseconds, the last one everything longer
+HISTOGRAM_BUCKETS = 32
+
+
+class PhaseStats:
+    __slots__ = ("calls", "total_ns", "min_ns", "max_ns", "net_bytes", "histogram")
+
+    def __init__(self):
+        self.calls = 0
+        self.total_ns = 0
+        self.min_ns = None
+        self.max_ns = 0
+        self.net_bytes = 0
+        self.histogram = [0] * HISTOGRAM_BUCKETS
+
+    def add(self, duration_ns, net_bytes=0):
+        self.calls += 1
+        self.total_ns += duration_ns
+        if self.min_ns is None or duration_ns < self.min_ns:
+            self.min_ns = duration_ns
+        if duration_ns > self.max_ns:
+            self.max_ns = duration_ns
+        self.net_bytes += net_bytes
+        self.histogram[min(duration_ns.bit_length(), HISTOGRAM_BUCKETS - 1)] += 1
+
+    def quantile(self, q):
+        """Upper bound in seconds of the bucket holding the q quantile"""
+        if not self.calls:
+            return 0.0
+        seen = 0
+        for bucket, count in enumerate(self.histogram):
+            seen += count
+            if seen >= q * self.calls:
+                return min(2 ** bucket, self.max_ns) / 1e9
+        return self.max_ns / 1e9
+
+    def to_dict(self):
+        return {
+            "calls": self.calls,
+            "total_seconds": self.total_ns / 1e9,
+            "min_seconds": (self.min_ns or 0) / 1e9,
+            "max_seconds": self.max_ns / 1e9,
+            "net_bytes": self.net_bytes,
+            "histogram": list(self.histogram),
+        }
+
+
+class Profiler:
+    """Collects PhaseStats by phase name, see the module docstring"""
+
+    def __init__(self, track_allocations=False):
+        self.track_allocations = track_allocations
+        self.phases = {}
+        self.started = time.perf_counter()
+        # the original instance attributes of instrumented objects, by id
+        self._instrumented = {}
+        if track_allocations and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    def stats(self, name):
+        stats = self.phases.get(name)
+        if stats is None:
+            stats = self.phases[name] = PhaseStats()
+        return stats
+
+    def reset(self):
+        """Clears the numbers, instrumented objects stay instrumented"""
+        for stats in self.phases.values():
+            stats.__init__()
+        self.started = time.perf_counter()
+
+    @contextmanager
+    def phase(self, name):
+        """Times the with block as phase name"""
+        stats = self.stats(name)
+        before = tracemalloc.get_traced_memory()[0] if self.track_allocations else 0
+        start = time.perf_counter_ns()
+        try:
+            yield
+        finally:
+            duration = time.perf_counter_ns() - start
+            after = tracemalloc.get_traced_memory()[0] if self.track_allocations else 0
+            stats.add(duration, after - before)
+
+    def timed(self, name, function):
+        """function wrapped to record every call as phase name"""
+        stats = self.stats(name)
+        clock = time.perf_counter_ns
+
+        if self.track_allocations:
+            traced = tracemalloc.get_traced_memory
+
+            def timed(*args, **kwargs):
+                before = traced()[0]
+                start = clock()
+                try:
+                    return function(*args, **kwargs)
+                finally:
+                    stats.add(clock() - start, traced()[0] - before)
+        else:
+            def timed(*args, **kwargs):
+                start = clock()
+                try:
+                    return function(*args, **kwargs)
+                finally:
+                    stats.add(clock() - start)
+
+        timed.__wrapped__ = function
+        return timed
+
+    def instrument(self, obj, names, prefix=""):
+        """Times the methods names of obj as phases prefix + name until restore(obj)"""
+        saved = self._instrumented.setdefault(id(obj), (obj, {}))[1]
+        for name in names:
+            if name in saved:
+                continue
+            saved[name] = obj.__dict__.get(name)
+            setattr(obj, name, self.timed(prefix + name, getattr(obj, name)))
+        return obj
+
+    def restore(self, obj):
+        """Puts back the methods instrument replaced"""
+        _, saved = self._instrumented.pop(id(obj), (obj, {}))
+        for name, original in saved.items():
+            if original is None:
+                delattr(obj, name)
+            else:
+                setattr(obj, name, original)
+        return obj
+
+    def restore_all(self):
+        for obj, _ in list(self._instrumented.values()):
+            self.restore(obj)
+
+    def to_dict(self):
+        return {
+            "elapsed_seconds": time.perf_counter() - self.started,
+            "phases": {name: stats.to_dict() for name, stats in self.phases.items()},
+        }
+
+    def save_json(self, path):
+        self._write(path, json.dumps(self.to_dict(), indent=2, sort_keys=True))
+
+    def save_prometheus(self, path, metric="qwixx_phase"):
+        """Writes the phases in the Prometheus text format, e.g. for node_exporter's textfile collector"""
+        lines = [
+            "# HELP {}_seconds Duration of the calls of a phase.".format(metric),
+            "# TYPE {}_seconds histogram".format(metric),
+        ]
+        for name, stats in sorted(self.phases.items()):
+            cumulative = 0
+            for bucket, count in enumerate(stats.histogram[:-1]):
+                cumulative += count
+                lines.append('{}_seconds_bucket{{phase="{}",le="{:g}"}} {}'.format(
+                    metric, name, 2 ** bucket / 1e9, cumulative))
+            lines.append('{}_seconds_bucket{{phase="{}",le="+Inf"}} {}'.format(metric, name, stats.calls))
+            lines.append('{}_seconds_sum{{phase="{}"}} {:.9f}'.format(metric, name, stats.total_ns / 1e9))
+            lines.append('{}_seconds_count{{phase="{}"}} {}'.format(metric, name, stats.calls))
+        if self.track_allocations:
+            lines.append("# HELP {}_net_bytes Bytes the calls of a phase left allocated.".format(metric))
+            lines.append("# TYPE {}_net_bytes gauge".format(metric))
+            for name, stats in sorted(self.phases.items()):
+                lines.append('{}_net_bytes{{phase="{}"}} {}'.format(metric, name, stats.net_bytes))
+        self._write(path, "\n".join(lines) + "\n")
+
+    def summary(self):
+        """The phases as a table, the most time consuming first"""
+        elapsed = time.perf_counter() - self.started
+        header = "{:<32s}{:>10s}{:>11s}{:>8s}{:>11s}{:>11s}{:>11s}".format(
+            "phase", "calls", "total s", "share", "mean us", "p50 us", "p99 us")
+        if self.track_allocations:
+            header += "{:>12s}".format("net bytes")
+        lines = [header]
+        for name, stats in sorted(self.phases.items(), key=lambda item: -item[1].total_ns):
+            if not stats.calls:
+                continue
+            line = "{:<32s}{:>10d}{:>11.3f}{:>7.1%}{:>11.2f}{:>11.2f}{:>11.2f}".format(
+                name, stats.calls, stats.total_ns / 1e9, stats.total_ns / 1e9 / max(elapsed, 1e-9),
+                stats.total_ns / stats.calls / 1e3, stats.quantile(0.5) * 1e6, stats.quantile(0.99) * 1e6)
+            if self.track_allocations:
+                line += "{:>12d}".format(stats.net_bytes)
+            lines.append(line)
+        return "\n".join(lines)
+
+    @staticmethod
+    def _write(path, text):
+        temporary = path + ".tmp"
+        with open(temporary, "w") as f:
+            f.write(text)
+        os.replace(temporary, path)
@@ -0,0 +1,83 @@
+"""
+Reward functions of QwixxOneHotEnv, picked with the env's reward argument, e.g.
+gym.make("qwixx-v0", reward="terminal"). Built in are
+
+- "shaped": the score change of a mark divided by the skipped weight, and a skip
+  reward for steps that mark nothing, the default
+- "terminal": the final score when the game ends, 0 otherwise
+- "delta": the score change of every step, strike penalties included
+
+Other rewards subclass RewardFunction and are registered with register_reward, or
+are passed to the env as a class or instance.
+"""
+from qwixx_gym.envs.qwixx_rules import INVALID_MOVE_REWARD, SKIP_WEIGHT_SUM
+
+_SKIP_WEIGHT_SUM = SKIP_WEIGHT_SUM.tolist()
+REWARDS = {}
+
+
+def register_reward(name):
+    """Registers a RewardFunction subclass under name"""
+
+    def register(reward_class):
+        REWARDS[name] = reward_class
+        return reward_class
+
+    return register
+
+
+def make_reward(reward):
+    """A RewardFunction from a registered name, a RewardFunction class or an instance"""
+    if isinstance(reward, str):
+        if reward not in REWARDS:
+            raise ValueError("unknown reward {!r}, one of {}".format(reward, ", ".join(sorted(REWARDS))))
+        return REWARDS[reward]()
+    if isinstance(reward, type):
+        return reward()
+    return reward
+
+
+class RewardFunction:
+    """
+    Computes the reward of every step that didn't end on an invalid move, those get
+    invalid_move_reward. It is called once the dice for the next turn are rolled, so
+    env._is_done() tells whether the step ended the game.
+
+    The skip analysis, env.calculate_skip_reward, is only run for rewards setting
+    needs_skip_analysis and only on steps that marked nothing.
+    """
+    needs_skip_analysis = False
+    invalid_move_reward = INVALID_MOVE_REWARD
+
+    def __call__(self, env, changed_values, current_score, skip_reward):
+        """
+        changed_values are the (before, after) latest numbers of the rows the step
+        marked, current_score the score before the step and skip_reward the result of
+        the skip analysis, None when it wasn't run
+        """
+        raise NotImplementedError
+
+
+@register_reward("shaped")
+class ShapedReward(RewardFunction):
+    needs_skip_analysis = True
+
+    def __call__(self, env, changed_values, current_score, skip_reward):
+        if not changed_values:
+            return skip_reward
+        divisor = sum(_SKIP_WEIGHT_SUM[before][after] for before, after in changed_values) + 1
+        return (env._calculate_score() - current_score) / divisor * 100
+
+
+@register_reward("terminal")
+class TerminalReward(RewardFunction):
+
+    def __call__(self, env, changed_values, current_score, skip_reward):
+        return env._calculate_score() if env._is_done() else 0
+
+
+@register_reward("delta")
+class ScoreDeltaReward(RewardFunction):
+
+    def __call__(self, env, changed_values, current_score, skip_reward):
+        return env._calculate_score() - current_score
@@ -0,0 +1,100 @@
+import numpy as np
+
+DIE_ROLLS = range(1, 7)
+COLORS_MAX = {"red": 12, "yellow": 12, "green": 2, "blue": 2}
+WHITE_ACTION_COLOR = [None, "red", "yellow", "blue", "green"]
+COLOR_ACTION = [None,
+                ("white1", "red"), ("white1", "yellow"), ("white1", "blue"), ("white1", "green"),
+                ("white2", "red"), ("white2", "yellow"), ("white2", "blue"), ("white2", "green"),
+                ]
+SCORE = [0, 1, 3, 6, 10, 15, 21, 28, 36, 45, 55, 66, 78]
+SKIP_WEIGHT = [None, None, 1, 2, 3, 4, 5, 6, 5, 4, 3, 2, 1]
+LOCK_COUNT = 5
+
+
+def less_than(left, right):
+    return left < right
+
+
+def greater_than(left, right):
+    return left > right
+
+
+def can_lock(count):
+    return count == LOCK_COUNT
+
+
+COMPARE_FUNCTION = {
+    "red": greater_than, "yellow": greater_than, "green": less_than, "blue": less_than,
+}
+INVALID_MOVE_REWARD = 0
+WIN_REWARD = 1000
+LOSE_REWARD = 0
+SKIP_BIAS = -2
+MAX_TURNS = 50
+MAX_STRIKES = 4
+STRIKE_PENALTY = 5
+
+# Array forms of the rules above. Column order of the (..., 4) color arrays matches
+# ColorCount, the columns of the (..., 6) dice arrays match Dice.
+COLORS = ["red", "yellow", "green", "blue"]
+DICE = ["white1", "white2", "red", "yellow", "green", "blue"]
+RED, YELLOW, GREEN, BLUE = range(4)
+WHITE1, WHITE2 = range(2)
+
+MAX_VALUE = np.array([COLORS_MAX[c] for c in COLORS], dtype=np.int8)
+START_VALUE = np.array([1, 1, 13, 13], dtype=np.int8)
+ASCENDING = np.array([COMPARE_FUNCTION[c] is greater_than for c in COLORS])
+
+WHITE_ACTION_INDEX = np.array([-1 if c is None else COLORS.index(c) for c in WHITE_ACTION_COLOR])
+COLOR_ACTION_DIE = np.array([-1 if a is None else DICE.index(a[0]) for a in COLOR_ACTION])
+COLOR_ACTION_INDEX = np.array([-1 if a is None else COLORS.index(a[1]) for a in COLOR_ACTION])
+NUM_ACTIONS = len(WHITE_ACTION_COLOR) * len(COLOR_ACTION)
+# flat actions are white + 5 * color, ACTION_PAIRS[action] is (white, color)
+ACTION_PAIRS = np.array([divmod(action, len(WHITE_ACTION_COLOR))[::-1] for action in range(NUM_ACTIONS)])
+ACTION_PAIRS.flags.writeable = False
+
+SCORE_TABLE = np.array(SCORE, dtype=np.int16)
+# SKIP_WEIGHT_SUM[a, b] == sum(SKIP_WEIGHT[min(a, b) + 1: max(a, b)])
+_weights = np.array([0 if w is None else w for w in SKIP_WEIGHT])
+SKIP_WEIGHT_SUM = np.array([[_weights[min(a, b) + 1: max(a, b)].sum() for b in range(14)]
+                            for a in range(14)], dtype=np.int16)
+# Skip lookups of the shaped rewards, indexed by [color, latest, value]. NO_SKIP is the
+# reward when nothing is skipped, NOT_TAKEN marks values that don't count for a color.
+NO_SKIP = 10
+NOT_TAKEN = 99
+
+
+def _white_skip(color, latest, value):
+    """How many numbers marking the white sum value skips, as QwixxOneHotEnv.calculate_skip_reward"""
+    cmv = COLORS_MAX[color]
+    if cmv >= latest >= value or value >= latest >= cmv:
+        return NOT_TAKEN
+    low, high = min(latest, value), max(latest, value)
+    return len(SKIP_WEIGHT[low + 1: high]) if low < high else NOT_TAKEN
+
+
+def _color_skip(color, latest, value):
+    """How many numbers marking a white + color sum skips, as QwixxOneHotEnv.get_skipped_values"""
+    cmv = COLORS_MAX[color]
+    if cmv == latest:
+        return NOT_TAKEN
+    if cmv > latest:
+        return len(SKIP_WEIGHT[latest + 1: value]) if value - latest > 0 else NOT_TAKEN
+    return len(SKIP_WEIGHT[value: latest - 1]) if latest - value > 0 else NOT_TAKEN
+
+
+WHITE_SKIP = np.array([[[_white_skip(c, latest, value) for value in range(14)] for latest in range(14)]
+                       for c in COLORS], dtype=np.int8)
+COLOR_SKIP = np.array([[[_color_skip(c, latest, value) for value in range(14)] for latest in range(14)]
+                       for c in COLORS], dtype=np.int8)
+# ONE_HOT[v] is the six slot encoding of a die showing v, an unrolled 0 encodes as all zeros
+ONE_HOT = np.eye(7, dtype=np.float32)[:, 1:]
+# LATEST_ENCODING[color, latest] mirrors the scaling done in QwixxOneHotEnv._serialize_player
+LATEST_ENCODING = np.array([
+    [(v - 1) / 11.0 for v in range(14)],
+    [(v - 1) / 11.0 for v in range(14)],
+    [1 - (v - 2) / 11.0 for v in range(14)],
+    [1 - (v - 2) / 11.0 for v in range(14)],
+], dtype=np.float32)
+OBSERVATION_SIZE = 48
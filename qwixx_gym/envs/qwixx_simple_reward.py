@@ -1,17 +1,11 @@
 from qwixx_gym.envs import QwixxOneHotEnv
 
 class QwixxSimple(QwixxOneHotEnv):
-    def __init__(self, num_players=3, bot_player=0):
-        super(QwixxSimple, self).__init__(num_players, bot_player)
-        self.invalid_move_reward = 0
+    """QwixxOneHotEnv with the terminal reward, the final score once the game ends"""
+
+    def __init__(self, num_players=3, bot_player=0, **kwargs):
+        kwargs.setdefault("reward", "terminal")
+        super(QwixxSimple, self).__init__(num_players, bot_player, **kwargs)
         self.win_reward = 0
         self.lose_reward = 0
         self.skip_bias = 0
-
-    def calculate_skip_reward(self):
-        return 0
-
-    def calculate_reward(self, changed_values, current_score):
-        if self._is_done():
-            return self._calculate_score()
-        return 0
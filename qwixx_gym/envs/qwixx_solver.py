@@ -0,0 +1,248 @@
+"""
+Expected-score solver for the bot player's board under the QwixxOneHotEnv.step rules.
+
+A dynamic program over every reachable position is out of reach: four colors of
+(latest, count) pairs, strikes and the turn counter give billions of positions, each
+averaging over the 6^6 dice. The solver searches depth rolls ahead instead. It
+averages over every distinct dice outcome, maximizes over the legal actions, and
+values the positions at the horizon with leaf_value, the board's score by default.
+Positions that end within depth rolls are solved exactly. Invalid moves end the game,
+so the solver only considers legal actions.
+
+Afterstate values are memoized in a TranspositionTable keyed by the packed state, see
+qwixx_state. Afterstates are taken before the next roll and carry no dice, so the dice
+bits of a key hold the search depth instead. Tables are saved as sorted .npy arrays
+and memory mapped back.
+"""
+import os
+
+import numpy as np
+
+from qwixx_gym.envs.qwixx_action_mask import action_bits, action_mask, state_action_mask
+from qwixx_gym.envs.qwixx_outcomes import NUM_MASKS, locked_mask, outcome_table
+from qwixx_gym.envs.qwixx_rules import (
+    INVALID_MOVE_REWARD, MAX_VALUE, WHITE_ACTION_INDEX, COLOR_ACTION_DIE, COLOR_ACTION_INDEX,
+    NUM_ACTIONS, DICE, COLORS,
+)
+from qwixx_gym.envs.qwixx_state import pack_states, unpack_state, unpack_states, DIE_BITS
+from qwixx_gym.envs.qwixx_vector_env import calculate_score, is_done
+
+MAX_DEPTH = (1 << len(DICE) * DIE_BITS) - 1
+# a move is encoded as white slot * _COLOR_SLOTS + color slot, a slot being
+# (white action or color index + 1) * _SUMS + the marked sum, 0 for no mark
+_SUMS = 13
+_COLOR_SLOTS = (len(COLORS) + 1) * _SUMS
+_MOVES = 5 * _SUMS * _COLOR_SLOTS
+_ACTIONS = np.arange(NUM_ACTIONS)
+_OUTCOME_MOVES = [None] * NUM_MASKS
+
+
+def apply_marks(counts, latest, white_color, white_value, color, color_value):
+    """
+    Copies of (N, 4) boards with the white dice marked and then the color dice,
+    (N,) colors are -1 where nothing is marked
+    """
+    counts, latest = counts.copy(), latest.copy()
+    for marked, value in ((white_color, white_value), (color, color_value)):
+        rows = np.flatnonzero(marked >= 0)
+        counts[rows, marked[rows]] += 1
+        latest[rows, marked[rows]] = value[rows]
+    return counts, latest
+
+
+def expand(dice, counts, latest, strikes, turns, player, actions, num_players=1, bot_player=0):
+    """
+    Afterstates of legal flat actions for (N, ...) arrays of states, i.e. the boards
+    step leaves behind before the next roll. Returns (counts, latest, strikes, turns, player).
+    """
+    white_action, color_action = actions % 5, actions // 5
+    counts, latest = apply_marks(
+        counts, latest, WHITE_ACTION_INDEX[white_action], dice[:, 0] + dice[:, 1],
+        COLOR_ACTION_INDEX[color_action],
+        dice[np.arange(len(dice)), np.maximum(COLOR_ACTION_DIE[color_action], 0)]
+        + dice[np.arange(len(dice)), COLOR_ACTION_INDEX[color_action] + 2])
+    strikes = strikes + ((player == bot_player) & (actions == 0))
+    return counts, latest, strikes, turns + 1, (player + 1) % num_players
+
+
+def simulate(states, actions, dice, num_players=1, bot_player=0):
+    """
+    Applies QwixxOneHotEnv.step to (N,) packed states and flat actions without an env,
+    dice is the (N, 6) roll for the next turn, dice of rows locked after the move keep
+    their value as in step. Returns the packed next states, the score changes as
+    rewards and the done flags. Invalid moves end the game with INVALID_MOVE_REWARD,
+    their next state is the state they were made in.
+    """
+    states, actions = np.asarray(states, dtype=np.int64), np.asarray(actions, dtype=np.int64)
+    rolled, counts, latest, strikes, turns, player = unpack_states(states)
+    bits = action_bits(rolled, counts, latest, player == bot_player)
+    valid = (bits >> actions.astype(np.uint64) & np.uint64(1)).astype(np.bool_)
+    score = calculate_score(counts, latest, strikes)
+    counts, latest, strikes, turns, player = expand(rolled, counts, latest, strikes, turns, player, actions,
+                                                     num_players, bot_player)
+    dice = np.array(dice, dtype=np.int8)
+    # dice of locked colors aren't rolled
+    dice[:, 2:] = np.where(latest == MAX_VALUE, rolled[:, 2:], dice[:, 2:])
+    next_states = np.where(valid, pack_states(dice, counts, latest, strikes, turns, player), states)
+    rewards = np.where(valid, calculate_score(counts, latest, strikes) - score,
+                       INVALID_MOVE_REWARD).astype(np.float32)
+    dones = ~valid | is_done(turns, latest, strikes)
+    return next_states, rewards, dones
+
+
+def _outcome_moves(mask):
+    """The outcome_table of a locked color bitmask plus the (K, 45) move slots of every outcome and action"""
+    moves = _OUTCOME_MOVES[mask]
+    if moves is None:
+        table = outcome_table(mask)
+        white = _SUMS * np.arange(5) + table.white_sums[:, None]
+        white[:, 0] = 0
+        # the color sum of an action, white1 + color or white2 + color
+        color = _SUMS * (COLOR_ACTION_INDEX + 1) + table.color_sums[
+            :, np.maximum(COLOR_ACTION_INDEX, 0), np.maximum(COLOR_ACTION_DIE, 0)]
+        color[:, 0] = 0
+        moves = _OUTCOME_MOVES[mask] = white[:, _ACTIONS % 5] * _COLOR_SLOTS + color[:, _ACTIONS // 5]
+    return outcome_table(mask), moves
+
+
+class TranspositionTable:
+    """
+    Maps int64 keys to values. Stored keys are a sorted array, possibly memory mapped,
+    searched with np.searchsorted, new entries collect in a dict until save.
+    """
+
+    def __init__(self):
+        self._keys = np.empty(0, dtype=np.int64)
+        self._values = np.empty(0, dtype=np.float64)
+        self._new = {}
+
+    def __len__(self):
+        return len(self._keys) + len(self._new)
+
+    def lookup(self, keys):
+        """Values of keys, nan where a key is missing"""
+        values = np.full(len(keys), np.nan)
+        if len(self._keys):
+            index = np.minimum(np.searchsorted(self._keys, keys), len(self._keys) - 1)
+            hit = self._keys[index] == keys
+            values[hit] = self._values[index[hit]]
+        if self._new:
+            missing = np.flatnonzero(np.isnan(values))
+            values[missing] = [self._new.get(key, np.nan) for key in keys[missing].tolist()]
+        return values
+
+    def store(self, keys, values):
+        self._new.update(zip(keys.tolist(), values.tolist()))
+
+    def save(self, path):
+        """Writes keys.npy and values.npy into the directory path"""
+        keys = np.concatenate([self._keys, np.fromiter(self._new.keys(), np.int64, len(self._new))])
+        values = np.concatenate([self._values, np.fromiter(self._new.values(), np.float64, len(self._new))])
+        order = np.argsort(keys, kind="stable")
+        self._keys, self._values, self._new = keys[order], values[order], {}
+        os.makedirs(path, exist_ok=True)
+        for name, array in (("keys", self._keys), ("values", self._values)):
+            # replace instead of overwriting, the old file may still be memory mapped
+            temporary = os.path.join(path, name + ".tmp.npy")
+            np.save(temporary, array)
+            os.replace(temporary, os.path.join(path, name + ".npy"))
+
+    def load(self, path, mmap_mode="r"):
+        """Reads a table written by save, memory mapped unless mmap_mode is None"""
+        self._keys = np.load(os.path.join(path, "keys.npy"), mmap_mode=mmap_mode)
+        self._values = np.load(os.path.join(path, "values.npy"), mmap_mode=mmap_mode)
+
+
+class QwixxSolver:
+    """
+    Expectimax over the next depth rolls of a QwixxOneHotEnv game, see the module
+    docstring. depth=0 picks the action with the best leaf_value right away.
+    leaf_value(counts, latest, strikes) takes (N, 4), (N, 4), (N,) arrays, the table
+    is only valid for the leaf_value it was built with.
+    """
+
+    def __init__(self, depth=1, num_players=1, bot_player=0, leaf_value=None, table=None):
+        if not 0 <= depth <= MAX_DEPTH:
+            raise ValueError("depth must be between 0 and {}".format(MAX_DEPTH))
+        self.depth = depth
+        self.num_players = num_players
+        self.bot_player = bot_player
+        self.leaf_value = leaf_value or calculate_score
+        self.table = table if table is not None else TranspositionTable()
+
+    @classmethod
+    def load(cls, path, mmap_mode="r", **kwargs):
+        solver = cls(**kwargs)
+        solver.table.load(path, mmap_mode)
+        return solver
+
+    def save(self, path):
+        self.table.save(path)
+
+    def optimal_action(self, state):
+        """Flat action with the highest expected score for a state packed by get_state"""
+        return np.argmax(self.action_values(state))
+
+    def value(self, state):
+        """Expected score of a packed state under optimal play"""
+        return self.action_values(state).max()
+
+    def action_values(self, state):
+        """(45,) expected scores of the actions in a packed state, -inf for illegal ones"""
+        dice, counts, latest, strikes, turns, player = unpack_state(state)
+        actions = np.flatnonzero(state_action_mask(dice, counts, latest, player == self.bot_player))
+        n = len(actions)
+        children = expand(np.tile(np.array(dice, dtype=np.int8), (n, 1)),
+                          np.tile(np.array(counts, dtype=np.int8), (n, 1)),
+                          np.tile(np.array(latest, dtype=np.int8), (n, 1)),
+                          np.full(n, strikes, dtype=np.int8), np.full(n, turns, dtype=np.int16),
+                          np.full(n, player, dtype=np.int8), actions,
+                          self.num_players, self.bot_player)
+        values = np.full(NUM_ACTIONS, -np.inf)
+        values[actions] = self.afterstate_values(*children, self.depth)
+        return values
+
+    def afterstate_values(self, counts, latest, strikes, turns, player, depth):
+        """Expected final scores of (N, ...) afterstates, averaged over depth more rolls"""
+        values = calculate_score(counts, latest, strikes).astype(np.float64)
+        rows = np.flatnonzero(~is_done(turns, latest, strikes))
+        if not len(rows):
+            return values
+        if depth == 0:
+            values[rows] = self.leaf_value(counts[rows], latest[rows], strikes[rows])
+            return values
+        keys = pack_states(np.zeros((len(rows), len(DICE)), dtype=np.int8), counts[rows], latest[rows],
+                           strikes[rows], turns[rows], player[rows]) | depth
+        keys, first, inverse = np.unique(keys, return_index=True, return_inverse=True)
+        known = self.table.lookup(keys)
+        missing = np.flatnonzero(np.isnan(known))
+        for i in missing:
+            row = rows[first[i]]
+            known[i] = self._expectation(counts[row], latest[row], strikes[row], turns[row],
+                                         player[row], depth)
+        self.table.store(keys[missing], known[missing])
+        values[rows] = known[inverse]
+        return values
+
+    def _expectation(self, counts, latest, strikes, turns, player, depth):
+        """
+        Expected final score of one afterstate over the next roll. An afterstate of this
+        one is fixed by the color and sum the white dice mark and the color and sum the
+        color dice mark, so the few distinct children are valued once, through their
+        _MOVES slot, instead of once per outcome and action.
+        """
+        outcomes, moves = _outcome_moves(int(locked_mask(latest == MAX_VALUE)))
+        bots_roll = player == self.bot_player
+        mask = action_mask(outcomes.dice, counts, latest, bots_roll)
+        slots = np.flatnonzero(np.bincount(moves[mask], minlength=_MOVES))
+        white, color = np.divmod(slots, _COLOR_SLOTS)
+        n = len(slots)
+        children = apply_marks(np.broadcast_to(counts, (n, len(COLORS))),
+                               np.broadcast_to(latest, (n, len(COLORS))),
+                               WHITE_ACTION_INDEX[white // _SUMS], white % _SUMS,
+                               color // _SUMS - 1, color % _SUMS)
+        values = np.full(_MOVES, -np.inf)
+        values[slots] = self.afterstate_values(
+            *children, np.full(n, strikes) + (bots_roll & (slots == 0)), np.full(n, turns + 1),
+            np.full(n, (player + 1) % self.num_players), depth - 1)
+        return outcomes.probabilities @ np.where(mask, values[moves], -np.inf).max(axis=1)
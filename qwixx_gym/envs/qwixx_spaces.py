@@ -0,0 +1,69 @@
+"""
+gym spaces of the qwixx envs and the base class of the single game env. The spaces
+are built on first access, so the envs import and run without importing gym, which
+is by far the slowest part of a worker's startup.
+"""
+import numpy as np
+
+from qwixx_gym.envs.qwixx_rules import NUM_ACTIONS, OBSERVATION_SIZE
+
+
+def action_space():
+    """MultiDiscrete [white, color] actions, n is the number of flat actions"""
+    from gym import spaces
+    space = spaces.MultiDiscrete([5, 9])
+    space.n = NUM_ACTIONS
+    return space
+
+
+def observation_space():
+    from gym import spaces
+    return spaces.Box(-np.inf, np.inf, shape=(1, OBSERVATION_SIZE), dtype='float32')
+
+
+class LazySpace:
+    """Class attribute holding the space build returns, built on the first access"""
+
+    def __init__(self, build):
+        self.build = build
+        self.space = None
+
+    def __get__(self, instance, owner):
+        if self.space is None:
+            self.space = self.build()
+        return self.space
+
+
+class Env:
+    """
+    gym.Env's interface without importing gym, all that gym.make and the gym
+    wrappers use of an env
+    """
+    metadata = {'render.modes': []}
+    reward_range = (-float('inf'), float('inf'))
+    spec = None
+
+    def render(self, mode='human'):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+    def seed(self, seed=None):
+        return
+
+    @property
+    def unwrapped(self):
+        return self
+
+    def __str__(self):
+        if self.spec is None:
+            return '<{} instance>'.format(type(self).__name__)
+        return '<{}<{}>>'.format(type(self).__name__, self.spec.id)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+        return False
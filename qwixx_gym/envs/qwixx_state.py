@@ -0,0 +1,232 @@
+"""
+Compact game state. ColorCount and Dice keep their values in a small list indexed
+by the color/die ints of qwixx_rules, the named attributes are views into it.
+
+A whole board plus dice also packs into one non-negative 63 bit integer:
+
+    bits  0-17  dice, 3 bits each, white1, white2, red, yellow, green, blue
+    bits 18-33  counts, 4 bits each, red, yellow, green, blue
+    bits 34-49  latest numbers, 4 bits each
+    bits 50-52  strikes
+    bits 53-58  num_turns
+    bits 59-62  current_player
+"""
+import numpy as np
+
+from qwixx_gym.envs.qwixx_rules import COLORS, DICE, START_VALUE, MAX_VALUE, SCORE, STRIKE_PENALTY
+
+DIE_BITS, COLOR_BITS, STRIKE_BITS, TURN_BITS, PLAYER_BITS = 3, 4, 3, 6, 4
+COUNTS_SHIFT = len(DICE) * DIE_BITS
+LATEST_SHIFT = COUNTS_SHIFT + len(COLORS) * COLOR_BITS
+STRIKES_SHIFT = LATEST_SHIFT + len(COLORS) * COLOR_BITS
+TURNS_SHIFT = STRIKES_SHIFT + STRIKE_BITS
+PLAYER_SHIFT = TURNS_SHIFT + TURN_BITS
+STATE_BITS = PLAYER_SHIFT + PLAYER_BITS
+_MAX_VALUE = MAX_VALUE.tolist()
+
+
+def _value_property(index):
+    def get(self):
+        return self.values[index]
+
+    def set(self, value):
+        self.values[index] = value
+        self._changed()
+
+    return property(get, set)
+
+
+class _Values:
+    __slots__ = ("values", "owner")
+    _names = ()
+
+    def __getitem__(self, index):
+        return self.values[index]
+
+    def __setitem__(self, index, value):
+        self.values[index] = value
+        self._changed()
+
+    def __iter__(self):
+        return iter(self.values)
+
+    def __eq__(self, other):
+        return type(other) is type(self) and self.values == other.values
+
+    def __repr__(self):
+        return "{}({})".format(type(self).__name__, ", ".join(
+            "{}={}".format(name, value) for name, value in zip(self._names, self.values)))
+
+    def copy(self):
+        return type(self)(*self.values)
+
+    def _changed(self):
+        if self.owner is not None:
+            self.owner.invalidate()
+
+
+class ColorCount(_Values):
+    __slots__ = ()
+    _names = COLORS
+
+    def __init__(self, red, yellow, green, blue):
+        self.values = [red, yellow, green, blue]
+        self.owner = None
+
+    red = _value_property(0)
+    yellow = _value_property(1)
+    green = _value_property(2)
+    blue = _value_property(3)
+
+
+class Dice(_Values):
+    __slots__ = ()
+    _names = DICE
+
+    def __init__(self, white1=0, white2=0, red=0, yellow=0, green=0, blue=0):
+        self.values = [white1, white2, red, yellow, green, blue]
+        self.owner = None
+
+    white1 = _value_property(0)
+    white2 = _value_property(1)
+    red = _value_property(2)
+    yellow = _value_property(3)
+    green = _value_property(4)
+    blue = _value_property(5)
+
+
+def _board_property(name):
+    def get(self):
+        return getattr(self, name)
+
+    def set(self, value):
+        if isinstance(value, _Values):
+            value.owner = self
+        setattr(self, name, value)
+        self.invalidate()
+
+    return property(get, set)
+
+
+class PlayerProgress:
+    """
+    A player's board. Besides counts, latest_num and strikes it keeps the score and
+    the locked colors as a bitmask up to date as mark and strike change the board.
+    Any other change, through the named attributes or by assigning new counts,
+    latest_num or strikes, makes them recompute on the next read. Code that writes
+    to the values lists directly has to call invalidate.
+    """
+    __slots__ = ("_counts", "_latest_num", "_strikes", "_score", "_locked", "_dirty")
+
+    def __init__(self):
+        self.counts = ColorCount(0, 0, 0, 0)
+        self.latest_num = ColorCount(*START_VALUE.tolist())
+        self.strikes = 0
+
+    counts = _board_property("_counts")
+    latest_num = _board_property("_latest_num")
+    strikes = _board_property("_strikes")
+
+    @property
+    def score(self):
+        if self._dirty:
+            self._recompute()
+        return self._score
+
+    @property
+    def locked(self):
+        """Bit c set when color c is locked"""
+        if self._dirty:
+            self._recompute()
+        return self._locked
+
+    def mark(self, color, value):
+        counts = self._counts.values
+        if self._dirty:
+            self._recompute()
+        self._score += SCORE[counts[color] + 1] - SCORE[counts[color]]
+        counts[color] += 1
+        self._latest_num.values[color] = value
+        if value == _MAX_VALUE[color]:
+            self._score += 1
+            self._locked |= 1 << color
+
+    def strike(self):
+        if self._dirty:
+            self._recompute()
+        self._strikes += 1
+        self._score -= STRIKE_PENALTY
+
+    def invalidate(self):
+        self._dirty = True
+
+    def full_score(self):
+        """The score recomputed from the board, as QwixxOneHotEnv._calculate_score used to"""
+        latest_num = self._latest_num.values
+        score = -STRIKE_PENALTY * self._strikes
+        for color, count in enumerate(self._counts.values):
+            score += SCORE[count]
+            if latest_num[color] == _MAX_VALUE[color]:
+                score += 1
+        return score
+
+    def _recompute(self):
+        self._score = self.full_score()
+        self._locked = sum(1 << color for color, latest in enumerate(self._latest_num.values)
+                           if latest == _MAX_VALUE[color])
+        self._dirty = False
+
+    def __repr__(self):
+        return "PlayerProgress(counts={}, latest_num={}, strikes={})".format(
+            self.counts, self.latest_num, self.strikes)
+
+
+def pack_state(dice, counts, latest, strikes, num_turns, current_player):
+    """Packs one state given as sequences of ints into a single int"""
+    state = (int(current_player) << TURN_BITS | int(num_turns)) << STRIKE_BITS | int(strikes)
+    for value in reversed(latest):
+        state = state << COLOR_BITS | int(value)
+    for value in reversed(counts):
+        state = state << COLOR_BITS | int(value)
+    for value in reversed(dice):
+        state = state << DIE_BITS | int(value)
+    return state
+
+
+def unpack_state(state):
+    """Inverse of pack_state, returns (dice, counts, latest, strikes, num_turns, current_player)"""
+    dice = [state >> (i * DIE_BITS) & 7 for i in range(len(DICE))]
+    counts = [state >> (COUNTS_SHIFT + i * COLOR_BITS) & 15 for i in range(len(COLORS))]
+    latest = [state >> (LATEST_SHIFT + i * COLOR_BITS) & 15 for i in range(len(COLORS))]
+    return (dice, counts, latest, state >> STRIKES_SHIFT & 7, state >> TURNS_SHIFT & 63,
+            state >> PLAYER_SHIFT & 15)
+
+
+_DICE_SHIFTS = np.arange(len(DICE), dtype=np.int64) * DIE_BITS
+_COUNTS_SHIFTS = COUNTS_SHIFT + np.arange(len(COLORS), dtype=np.int64) * COLOR_BITS
+_LATEST_SHIFTS = LATEST_SHIFT + np.arange(len(COLORS), dtype=np.int64) * COLOR_BITS
+# the fields don't overlap, so shifting and or-ing is a dot product with powers of two
+_DICE_WEIGHTS = 1 << _DICE_SHIFTS
+_COUNTS_WEIGHTS = 1 << _COUNTS_SHIFTS
+_LATEST_WEIGHTS = 1 << _LATEST_SHIFTS
+
+
+def pack_states(dice, counts, latest, strikes, num_turns, current_player):
+    """Vectorized pack_state over (N, ...) arrays, returns an (N,) int64 array"""
+    return (dice.astype(np.int64) @ _DICE_WEIGHTS
+            | counts.astype(np.int64) @ _COUNTS_WEIGHTS
+            | latest.astype(np.int64) @ _LATEST_WEIGHTS
+            | strikes.astype(np.int64) << STRIKES_SHIFT
+            | num_turns.astype(np.int64) << TURNS_SHIFT
+            | current_player.astype(np.int64) << PLAYER_SHIFT)
+
+
+def unpack_states(states):
+    """Inverse of pack_states, returns (dice, counts, latest, strikes, num_turns, current_player)"""
+    states = np.asarray(states, dtype=np.int64)[..., None]
+    return ((states >> _DICE_SHIFTS & 7).astype(np.int8),
+            (states >> _COUNTS_SHIFTS & 15).astype(np.int8),
+            (states >> _LATEST_SHIFTS & 15).astype(np.int8),
+            (states[..., 0] >> STRIKES_SHIFT & 7).astype(np.int8),
+            (states[..., 0] >> TURNS_SHIFT & 63).astype(np.int16),
+            (states[..., 0] >> PLAYER_SHIFT & 15).astype(np.int8))
@@ -0,0 +1,224 @@
+import multiprocessing as mp
+from multiprocessing import shared_memory
+from multiprocessing.connection import wait
+
+import numpy as np
+
+from qwixx_gym.envs.qwixx_rules import OBSERVATION_SIZE
+from qwixx_gym.envs.qwixx_spaces import LazySpace, action_space, observation_space
+
+
+def _layout(num_envs, observation_shape):
+    """Offsets of the arrays packed into the shared memory block"""
+    fields = [
+        ("observations", np.float32, (num_envs,) + observation_shape),
+        ("terminal_observations", np.float32, (num_envs,) + observation_shape),
+        ("rewards", np.float32, (num_envs,)),
+        ("scores", np.int32, (num_envs,)),
+        ("dones", np.bool_, (num_envs,)),
+    ]
+    layout, offset = [], 0
+    for name, dtype, shape in fields:
+        layout.append((name, dtype, shape, offset))
+        offset += int(np.prod(shape)) * np.dtype(dtype).itemsize
+    return layout, offset
+
+
+def _attach(buffer, layout):
+    return {name: np.ndarray(shape, dtype=dtype, buffer=buffer, offset=offset)
+            for name, dtype, shape, offset in layout}
+
+
+def _worker(env_id, env_kwargs, start, stop, shm_name, layout, seed, pipe, parent_pipe):
+    parent_pipe.close()
+    from qwixx_gym import make
+
+    shm = shared_memory.SharedMemory(name=shm_name)
+    arrays = _attach(shm.buf, layout)
+    observations = arrays["observations"][start:stop]
+    terminal_observations = arrays["terminal_observations"][start:stop]
+    rewards, scores, dones = arrays["rewards"][start:stop], arrays["scores"][start:stop], arrays["dones"][start:stop]
+    envs = [make(env_id, **env_kwargs) for _ in range(stop - start)]
+    for env, env_seed in zip(envs, seed.spawn(len(envs))):
+        env.seed(env_seed)
+    shape = observations.shape[1:]
+    try:
+        while True:
+            command, actions = pipe.recv()
+            if command == "step":
+                for i, env in enumerate(envs):
+                    observation, reward, done, info = env.step(actions[i])
+                    if done:
+                        terminal_observations[i] = observation.reshape(shape)
+                        observation = env.reset()
+                    observations[i] = observation.reshape(shape)
+                    rewards[i] = reward
+                    scores[i] = info.get("score", 0)
+                    dones[i] = done
+            elif command == "reset":
+                for i, env in enumerate(envs):
+                    observations[i] = env.reset().reshape(shape)
+            elif command == "close":
+                break
+            pipe.send(command)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        del observations, terminal_observations, rewards, scores, dones, arrays
+        shm.close()
+        pipe.close()
+
+
+class QwixxSubprocVectorEnv:
+    """
+    Runs num_envs copies of a registered env, e.g. "qwixx-v0" or "qwixx-simple-v0",
+    spread over num_workers subprocesses. Workers write observations, rewards and
+    dones straight into one shared memory block, observations are stacked as
+    (num_envs,) + observation_space.shape. Only the actions and a short
+    acknowledgement go through the worker pipes.
+
+    Finished games are reset inside the worker, their last observation is in
+    info["terminal_observation"]. A worker that dies is restarted with fresh envs,
+    its games come back as done with info["restarted"] set.
+    """
+    single_action_space = LazySpace(action_space)
+    single_observation_space = LazySpace(observation_space)
+
+    def __init__(self, env_id="qwixx-v0", num_envs=8, num_workers=None, env_kwargs=None,
+                 seed=None, copy=True, context=None):
+        self.env_id = env_id
+        self.num_envs = num_envs
+        self.num_workers = min(num_workers or mp.cpu_count(), num_envs)
+        self.env_kwargs = env_kwargs or {}
+        self.copy = copy
+        self._context = mp.get_context(context)
+        self._seed_sequence = np.random.SeedSequence(seed)
+
+        self._layout, size = _layout(num_envs, (1, OBSERVATION_SIZE))
+        self._shm = shared_memory.SharedMemory(create=True, size=size)
+        self._arrays = _attach(self._shm.buf, self._layout)
+        self._restarted = np.zeros(num_envs, dtype=np.bool_)
+        bounds = np.linspace(0, num_envs, self.num_workers + 1).astype(int)
+        self._slices = [slice(start, stop) for start, stop in zip(bounds[:-1], bounds[1:])]
+        self._processes = [None] * self.num_workers
+        self._pipes = [None] * self.num_workers
+        self._pending = set()
+        for index in range(self.num_workers):
+            self._start_worker(index)
+        self._waiting = False
+        self.closed = False
+
+    def reset(self):
+        self._restarted[:] = False
+        for index in range(self.num_workers):
+            self._send(index, "reset")
+        self._wait_all()
+        return self._result("observations")
+
+    def step_async(self, actions):
+        actions = np.asarray(actions)
+        self._restarted[:] = False
+        for index, rows in enumerate(self._slices):
+            self._send(index, "step", actions[rows])
+        self._waiting = True
+
+    def step_wait(self, timeout=None):
+        self._wait_all(timeout)
+        self._waiting = False
+        dones = self._arrays["dones"] | self._restarted
+        info = {"score": self._result("scores"), "restarted": self._restarted.copy()}
+        if dones.any():
+            info["terminal_observation"] = self._arrays["terminal_observations"][dones]
+        return self._result("observations"), self._result("rewards"), dones, info
+
+    def step(self, actions):
+        self.step_async(actions)
+        return self.step_wait()
+
+    def close(self):
+        if self.closed:
+            return
+        if self._waiting:
+            self._wait_all()
+        for pipe, process in zip(self._pipes, self._processes):
+            if process.is_alive():
+                try:
+                    pipe.send(("close", None))
+                except (BrokenPipeError, EOFError):
+                    pass
+        for process in self._processes:
+            process.join(timeout=1)
+            if process.is_alive():
+                process.terminate()
+        for pipe in self._pipes:
+            pipe.close()
+        self._arrays = None
+        self._shm.close()
+        self._shm.unlink()
+        self.closed = True
+
+    def __del__(self):
+        if not getattr(self, "closed", True):
+            self.close()
+
+    def _result(self, name):
+        return self._arrays[name].copy() if self.copy else self._arrays[name]
+
+    def _start_worker(self, index):
+        rows = self._slices[index]
+        seed = self._seed_sequence.spawn(1)[0]
+        parent_pipe, child_pipe = self._context.Pipe()
+        process = self._context.Process(
+            target=_worker, daemon=True,
+            args=(self.env_id, self.env_kwargs, rows.start, rows.stop, self._shm.name,
+                  self._layout, seed, child_pipe, parent_pipe))
+        process.start()
+        child_pipe.close()
+        self._pipes[index] = parent_pipe
+        self._processes[index] = process
+
+    def _restart_worker(self, index):
+        self._processes[index].join(timeout=1)
+        self._pipes[index].close()
+        self._start_worker(index)
+        self._pipes[index].send(("reset", None))
+        self._pipes[index].recv()
+        rows = self._slices[index]
+        self._arrays["rewards"][rows] = 0
+        self._arrays["scores"][rows] = 0
+        self._arrays["terminal_observations"][rows] = self._arrays["observations"][rows]
+        self._restarted[rows] = True
+
+    def _send(self, index, command, actions=None):
+        try:
+            self._pipes[index].send((command, actions))
+        except (BrokenPipeError, ConnectionResetError):
+            # the worker died since the last step, its games start over
+            self._restart_worker(index)
+            if command != "step":
+                self._send(index, command, actions)
+            return
+        self._pending.add(index)
+
+    def _wait_all(self, timeout=None):
+        pending = {self._pipes[index]: index for index in self._pending}
+        self._pending = set()
+        while pending:
+            sentinels = {self._processes[index].sentinel: index for index in pending.values()}
+            ready = wait(list(pending) + list(sentinels), timeout)
+            if not ready:
+                raise TimeoutError("qwixx workers did not answer within {}s".format(timeout))
+            for handle in ready:
+                if handle in pending:
+                    index = pending.pop(handle)
+                    try:
+                        handle.recv()
+                    except (EOFError, ConnectionResetError):
+                        self._restart_worker(index)
+                    continue
+                index = sentinels[handle]
+                pipe = self._pipes[index]
+                # a dead worker's pipe polls as readable, recv() above then restarts it
+                if pipe in pending and not pipe.poll():
+                    del pending[pipe]
+                    self._restart_worker(index)
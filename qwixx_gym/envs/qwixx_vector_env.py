@@ -0,0 +1,237 @@
+import numpy as np
+
+from qwixx_gym.envs.qwixx_action_mask import action_mask
+from qwixx_gym.envs.qwixx_dice import DiceSource, DEFAULT_BLOCK_SIZE
+from qwixx_gym.envs.qwixx_spaces import LazySpace, action_space, observation_space
+from qwixx_gym.envs.qwixx_state import pack_states, unpack_states
+from qwixx_gym.envs.qwixx_rules import (
+    INVALID_MOVE_REWARD, SKIP_BIAS, MAX_TURNS, MAX_STRIKES, MAX_VALUE, START_VALUE, ASCENDING,
+    WHITE_ACTION_INDEX, COLOR_ACTION_DIE, COLOR_ACTION_INDEX, SCORE_TABLE, SKIP_WEIGHT_SUM,
+    ONE_HOT, LATEST_ENCODING, OBSERVATION_SIZE, LOCK_COUNT, STRIKE_PENALTY, WHITE_SKIP, COLOR_SKIP,
+    NO_SKIP, NOT_TAKEN,
+)
+
+_COLORS = np.arange(4)
+
+
+def calculate_score(counts, latest, strikes):
+    """Vectorized QwixxOneHotEnv._calculate_score over (..., 4) color arrays"""
+    return (SCORE_TABLE[counts].sum(-1) + (latest == MAX_VALUE).sum(-1)
+            - STRIKE_PENALTY * strikes.astype(np.int16))
+
+
+def is_done(turns, latest, strikes):
+    """Vectorized QwixxOneHotEnv._is_done"""
+    return (turns > MAX_TURNS) | (strikes == MAX_STRIKES) | ((latest == MAX_VALUE).sum(-1) >= 2)
+
+
+def calculate_skip_reward(dice, latest, bots_roll, skip_bias=SKIP_BIAS):
+    """Vectorized QwixxOneHotEnv.calculate_skip_reward for rows of dice and latest numbers"""
+    dice = dice.astype(np.intp)
+    latest = latest.astype(np.intp)
+    white = WHITE_SKIP[_COLORS, latest, (dice[:, 0] + dice[:, 1])[:, None]].min(1)
+    white[white == NOT_TAKEN] = NO_SKIP
+
+    # if the bot rolled the skipped color values count too, see get_skipped_values
+    colors = dice[:, 2:]
+    color = np.minimum(COLOR_SKIP[_COLORS, latest, dice[:, 0:1] + colors],
+                       COLOR_SKIP[_COLORS, latest, dice[:, 1:2] + colors]).min(1)
+    color[color == NOT_TAKEN] = NO_SKIP
+    return np.where(bots_roll, np.minimum(white, color) - skip_bias, white)
+
+
+def calculate_reward(counts, latest, strikes, current_score, skipped):
+    """Vectorized QwixxOneHotEnv.calculate_reward of rows that marked, skipped is the summed skip weight"""
+    return (calculate_score(counts, latest, strikes) - current_score) / (skipped + 1) * 100
+
+
+def take(counts, latest_num, rows, color, value, invalid, skipped):
+    """
+    Marks value in color on the boards of rows, rows with an invalid move are flagged
+    in invalid instead. skipped collects the skip weight of the marked values.
+    """
+    latest = latest_num[rows, color]
+    count = counts[rows, color]
+    valid = np.where(ASCENDING[color], value > latest, value < latest)
+    valid &= (value != MAX_VALUE[color]) | (count == LOCK_COUNT)
+    invalid[rows[~valid]] = True
+    rows, color, value, latest = rows[valid], color[valid], value[valid], latest[valid]
+    counts[rows, color] += 1
+    latest_num[rows, color] = value
+    skipped[rows] += SKIP_WEIGHT_SUM[latest, value]
+
+
+def serialize_state(out, dice, counts, latest, strikes, current_player, bot_player):
+    """Writes the QwixxOneHotEnv._serialize_state encoding of every row into out"""
+    n = len(dice)
+    out[:, 0] = current_player == bot_player
+    out[:, 1] = current_player
+    out[:, 2] = bot_player
+    out[:, 3:39] = ONE_HOT[dice].reshape(n, 36)
+    out[:, 39:43] = counts
+    out[:, 43:47] = LATEST_ENCODING[np.arange(4), latest]
+    out[:, 47] = strikes / 4.0
+    return out
+
+
+class QwixxVectorEnv:
+    """
+    Steps num_envs independent single player games of QwixxOneHotEnv at once. The
+    game state lives in NumPy arrays with one row per game:
+    - dice: (N, 6) int8, columns white1, white2, red, yellow, green, blue
+    - counts, latest_num: (N, 4) int8, columns red, yellow, green, blue
+    - strikes, num_turns, current_player: (N,)
+
+    Actions are either an (N, 2) array of [white, color] actions or an (N,) array
+    of flat actions where white = action % 5 and color = action // 5, exactly as
+    QwixxOneHotEnv.step decodes them. Finished games are reset automatically, the
+    observation of the finished game is returned in info["terminal_observation"],
+    info["action_mask"] holds the legal actions of the returned observations. With
+    copy=False the returned observations are the env's own buffer, overwritten by
+    the next step.
+    """
+    single_action_space = LazySpace(action_space)
+    single_observation_space = LazySpace(observation_space)
+
+    def __init__(self, num_envs, num_players=3, bot_player=0, copy=True, seed=None):
+        self.num_envs = num_envs
+        self.copy = copy
+        self.num_players = num_players
+        self.bot_player = bot_player
+        self.invalid_move_reward = INVALID_MOVE_REWARD
+        self.skip_bias = SKIP_BIAS
+
+        self.dice = np.zeros((num_envs, 6), dtype=np.int8)
+        self.counts = np.zeros((num_envs, 4), dtype=np.int8)
+        self.latest_num = np.zeros((num_envs, 4), dtype=np.int8)
+        self.strikes = np.zeros(num_envs, dtype=np.int8)
+        self.num_turns = np.zeros(num_envs, dtype=np.int16)
+        self.current_player = np.zeros(num_envs, dtype=np.int8)
+        self._observations = np.zeros((num_envs, OBSERVATION_SIZE), dtype=np.float32)
+        self._rows = np.arange(num_envs)
+        self.seed(seed)
+
+        self.reset()
+
+    def reset(self):
+        """Resets every game and returns the stacked observations"""
+        self._reset_rows(self._rows)
+        observations = self._serialize_state()
+        return observations.copy() if self.copy else observations
+
+    def step(self, actions):
+        actions = np.asarray(actions)
+        if actions.ndim == 2:
+            white_action, color_action = actions[:, 0], actions[:, 1]
+        else:
+            white_action, color_action = actions % 5, actions // 5
+        dice, counts, latest = self.dice, self.counts, self.latest_num
+
+        bots_roll = self.current_player == self.bot_player
+        next_player = (self.current_player + 1) % self.num_players
+        # non-roller players can't take the color die
+        invalid = ~bots_roll & (color_action != 0)
+        # If it chooses not to take white or color it adds a strike
+        strike = bots_roll & (white_action == 0) & (color_action == 0)
+        move = ~invalid & ~strike
+        current_score = calculate_score(counts, latest, self.strikes)
+        skipped = np.zeros(self.num_envs, dtype=np.int16)
+
+        # take white action
+        rows = np.flatnonzero(move & (white_action != 0))
+        color = WHITE_ACTION_INDEX[white_action[rows]]
+        value = dice[rows, 0] + dice[rows, 1]
+        self._take(rows, color, value, invalid, skipped)
+
+        # take color action, moves with an invalid white action already ended
+        rows = np.flatnonzero(move & (color_action != 0) & ~invalid)
+        color = COLOR_ACTION_INDEX[color_action[rows]]
+        value = dice[rows, COLOR_ACTION_DIE[color_action[rows]]] + dice[rows, color + 2]
+        self._take(rows, color, value, invalid, skipped)
+
+        self.current_player[:] = next_player
+        self.strikes[strike] += 1
+
+        rewards = np.full(self.num_envs, self.invalid_move_reward, dtype=np.float32)
+        moved = move & ~invalid
+        passed = moved & (white_action == 0) & (color_action == 0)
+        rows = np.flatnonzero(passed)
+        rewards[rows] = calculate_skip_reward(dice[rows], latest[rows],
+                                              next_player[rows] == self.bot_player,
+                                              self.skip_bias)
+        rows = np.flatnonzero(moved & ~passed)
+        rewards[rows] = calculate_reward(counts[rows], latest[rows], self.strikes[rows],
+                                         current_score[rows], skipped[rows])
+
+        self._roll_dice(np.flatnonzero(~invalid))
+        # the strike reward is calculated on the freshly rolled dice
+        rows = np.flatnonzero(strike)
+        rewards[rows] = calculate_skip_reward(dice[rows], latest[rows],
+                                              next_player[rows] == self.bot_player,
+                                              self.skip_bias)
+
+        dones = invalid | is_done(self.num_turns, latest, self.strikes)
+        info = {"score": calculate_score(counts, latest, self.strikes)}
+        observations = self._serialize_state()
+        rows = np.flatnonzero(dones)
+        if len(rows):
+            info["terminal_observation"] = observations[rows]
+            self._reset_rows(rows)
+            self._serialize_state(rows)
+        info["action_mask"] = self.legal_action_mask()
+        if self.copy:
+            observations = observations.copy()
+        return observations, rewards, dones, info
+
+    def legal_action_mask(self):
+        """(N, 45) bools, True where the flat action is a legal move for that game"""
+        return action_mask(self.dice, self.counts, self.latest_num,
+                           self.current_player == self.bot_player)
+
+    def seed(self, seed=None):
+        """Restarts the dice stream of all games from seed, an int or np.random.SeedSequence"""
+        self.dice_source = DiceSource(seed, block_size=max(DEFAULT_BLOCK_SIZE, 64 * 6 * self.num_envs))
+        return [seed]
+
+    def get_state(self):
+        """(N,) int64, every game packed as by QwixxOneHotEnv.get_state"""
+        return pack_states(self.dice, self.counts, self.latest_num, self.strikes,
+                           self.num_turns, self.current_player)
+
+    def set_state(self, states):
+        (self.dice[:], self.counts[:], self.latest_num[:], self.strikes[:],
+         self.num_turns[:], self.current_player[:]) = unpack_states(states)
+        self._serialize_state()
+
+    def close(self):
+        pass
+
+    def _take(self, rows, color, value, invalid, skipped):
+        take(self.counts, self.latest_num, rows, color, value, invalid, skipped)
+
+    def _reset_rows(self, rows):
+        self.counts[rows] = 0
+        self.latest_num[rows] = START_VALUE
+        self.strikes[rows] = 0
+        self.current_player[rows] = 0
+        self.dice[rows] = 0
+        self._roll_dice(rows)
+        self.num_turns[rows] = 0
+
+    def _roll_dice(self, rows):
+        self.num_turns[rows] += 1
+        rolled = self.dice_source.rolls((len(rows), 6))
+        self.dice[rows, :2] = rolled[:, :2]
+        # locked colors keep their last value
+        locked = self.latest_num[rows] == MAX_VALUE
+        self.dice[rows, 2:] = np.where(locked, self.dice[rows, 2:], rolled[:, 2:])
+
+    def _serialize_state(self, rows=None):
+        if rows is None:
+            return serialize_state(self._observations, self.dice, self.counts, self.latest_num,
+                                   self.strikes, self.current_player, self.bot_player)
+        self._observations[rows] = serialize_state(
+            np.empty((len(rows), OBSERVATION_SIZE), dtype=np.float32), self.dice[rows],
+            self.counts[rows], self.latest_num[rows], self.strikes[rows],
+            self.current_player[rows], self.bot_player)
+        return self._observations
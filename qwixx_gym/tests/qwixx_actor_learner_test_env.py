@@ -0,0 +1,96 @@
+import threading
+import unittest
+
+import numpy as np
+
+from actor_learner import ActorLearner, _LockedBuffer, ape_x_epsilons
+from qwixx_gym.envs.qwixx_rules import NUM_ACTIONS, OBSERVATION_SIZE
+from replay_buffer import ReplayBuffer
+
+
+class StubLayer:
+    """Stands in for a keras Dense layer"""
+
+    def __init__(self, kernel, activation):
+        self.name = "dense"
+        self.weights = [kernel, np.zeros(kernel.shape[1], dtype=np.float32)]
+        self.activation = activation
+
+    def get_config(self):
+        return {"activation": self.activation}
+
+    def get_weights(self):
+        return self.weights
+
+
+class StubModel:
+
+    def __init__(self, seed=0):
+        rng = np.random.RandomState(seed)
+        self.layers = [StubLayer(rng.normal(size=(OBSERVATION_SIZE, 8)).astype(np.float32), "tanh"),
+                       StubLayer(rng.normal(size=(8, NUM_ACTIONS)).astype(np.float32), "linear")]
+
+    def get_weights(self):
+        return [weight for layer in self.layers for weight in layer.get_weights()]
+
+
+class StubAgent:
+    """The parts of DQNAgent ActorLearner uses, replay only samples"""
+
+    def __init__(self):
+        self.model = StubModel()
+        self.memory = ReplayBuffer(10000)
+        self.batches = []
+
+    def replay(self, batch_size):
+        self.batches.append(self.memory.sample(batch_size))
+
+
+class QwixxActorLearnerTest(unittest.TestCase):
+
+    def test_ape_x_epsilons(self):
+        self.assertEqual([0.4], ape_x_epsilons(1))
+        epsilons = ape_x_epsilons(4)
+        self.assertAlmostEqual(0.4, epsilons[0])
+        self.assertAlmostEqual(0.4 ** 8, epsilons[-1])
+        self.assertEqual(sorted(epsilons, reverse=True), epsilons)
+
+    def test_priorities_of_overwritten_slots_are_dropped(self):
+        buffer = _LockedBuffer(ReplayBuffer(10, prioritized=True), threading.Lock())
+        states = np.arange(8, dtype=np.float32)[:, None]
+        buffer.add_batch(states, np.zeros(8), np.zeros(8), states + 1, np.arange(8) == 7)
+        np.random.seed(0)
+        batch = buffer.sample(64)
+        # the feeder adds three transitions while the learner computes TD errors
+        buffer.add_batch(states[:3] + 10, np.zeros(3), np.zeros(3), states[:3] + 11, np.arange(3) == 2)
+        indices = np.arange(8)
+        buffer.update_priorities(indices, np.full(8, 4.0))
+        priorities = buffer.tree[np.arange(10)]
+        alpha = buffer.alpha
+        # slots 8, 9 and 0 were rewritten with the highest priority and slot 1 waits for a next
+        # state, only the sampled slots 2 to 7 still hold the transitions the TD errors are of
+        np.testing.assert_allclose([1, 0] + [4 ** alpha] * 6 + [1, 1], priorities, rtol=1e-5)
+        self.assertTrue(set(batch.indices.tolist()) <= set(range(8)))
+
+    def test_run(self):
+        agent = StubAgent()
+        trainer = ActorLearner(agent, num_actors=1, envs_per_actor=4, batch_size=8, replay_ratio=0.5,
+                               warmup=64, sync_every=5, send_size=32, seed=0)
+        stats = trainer.run(num_updates=20, duration=60, log_every=None)
+        self.assertGreaterEqual(stats["updates"], 20)
+        self.assertGreaterEqual(stats["transitions"], 64)
+        self.assertGreater(stats["episodes"], 0)
+        self.assertIsNotNone(stats["mean_score"])
+        # the learner never got ahead of replay_ratio
+        self.assertLessEqual(stats["updates"], 0.5 * stats["transitions"] + 1)
+        # the buffer is handed back unwrapped, holding what the actor played
+        self.assertIs(ReplayBuffer, type(agent.memory))
+        self.assertEqual(stats["transitions"], agent.memory.added)
+        batch = agent.batches[-1]
+        self.assertEqual((8, OBSERVATION_SIZE), batch.states.shape)
+        self.assertTrue(((batch.actions >= 0) & (batch.actions < NUM_ACTIONS)).all())
+        self.assertFalse(trainer._actors)
+
+
+if __name__ == '__main__':
+    unittest.main()
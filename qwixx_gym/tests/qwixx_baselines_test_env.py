@@ -0,0 +1,73 @@
+import unittest
+
+import numpy as np
+
+from qwixx_gym.envs.qwixx_baselines import POLICIES, action_features, evaluate, make_policy, play
+from qwixx_gym.envs.qwixx_vector_env import QwixxVectorEnv, calculate_score
+
+
+class QwixxBaselinesTest(unittest.TestCase):
+
+    def test_gain_is_score_change(self):
+        env = QwixxVectorEnv(64, seed=3)
+        policy = make_policy("greedy_min_skip")
+        for _ in range(20):
+            states, mask = env.get_state(), env.legal_action_mask()
+            features = action_features(env.dice, env.counts, env.latest_num, env.current_player == env.bot_player)
+            before = calculate_score(env.counts, env.latest_num, env.strikes).astype(np.int64)
+            for action in range(45):
+                other = QwixxVectorEnv(64, copy=False)
+                other.set_state(states)
+                _, _, dones, info = other.step(np.full(64, action))
+                # finished games are reset, strikes change the score as well
+                rows = mask[:, action] & ~dones & ~features.strikes[:, action]
+                np.testing.assert_array_equal((info["score"] - before)[rows], features.gain[rows, action])
+            env.step(policy(env))
+
+    def test_policies_take_legal_actions(self):
+        env = QwixxVectorEnv(128, seed=0)
+        for name in POLICIES:
+            policy = make_policy(name)
+            for _ in range(30):
+                actions = policy(env)
+                self.assertTrue(env.legal_action_mask()[np.arange(128), actions].all())
+                env.step(actions)
+
+    def test_strike_avoidance(self):
+        env = QwixxVectorEnv(256, seed=1)
+        policy = make_policy("strike_avoidance")
+        for _ in range(30):
+            mask = env.legal_action_mask()
+            actions = policy(env)
+            rolling = env.current_player == env.bot_player
+            self.assertFalse((rolling & mask[:, 1:].any(1) & (actions == 0)).any())
+            env.step(actions)
+
+    def test_evaluate(self):
+        scores = play("greedy_min_skip", 300, num_envs=64, seed=5)
+        self.assertEqual(300, len(scores))
+        np.testing.assert_array_equal(scores, play("greedy_min_skip", 300, num_envs=64, seed=5))
+        result = evaluate("greedy_min_skip", 300, num_envs=64, seed=5)
+        self.assertAlmostEqual(result.scores.mean(), result.mean)
+        np.testing.assert_array_equal(result.scores, evaluate("greedy_min_skip", 300, num_envs=64, seed=5).scores)
+        self.assertLess(result.low, result.mean)
+        self.assertLess(result.mean, result.high)
+        self.assertEqual(sorted(result.quantiles.tolist()), result.quantiles.tolist())
+        self.assertGreater(result.mean, evaluate("random", 300, num_envs=64, seed=5).mean)
+        with self.assertRaises(ValueError):
+            make_policy("nope")
+
+    def test_evaluate_seeds_random_policy(self):
+        policy = make_policy("random")
+        for num_workers in (1, 2):
+            # the policy's own generator has moved on, the seed restarts it
+            first = evaluate(policy, 200, num_envs=32, seed=7, num_workers=num_workers)
+            second = evaluate(policy, 200, num_envs=32, seed=7, num_workers=num_workers)
+            np.testing.assert_array_equal(first.scores, second.scores)
+            self.assertEqual(first.mean, second.mean)
+        np.testing.assert_array_equal(first.scores, evaluate("random", 200, num_envs=32, seed=7, num_workers=2).scores)
+        self.assertFalse(np.array_equal(first.scores, evaluate(policy, 200, num_envs=32, seed=8, num_workers=2).scores))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,105 @@
+import json
+import os
+import tempfile
+import unittest
+from collections import deque
+
+import numpy as np
+
+from checkpoint import Checkpointer
+from dll_agent import DQNAgent
+from replay_buffer import ReplayBuffer
+
+
+class StubModel:
+    """Writes its weights where a keras model writes its h5 file"""
+
+    def __init__(self, weights):
+        self.weights = weights
+
+    def save(self, path):
+        with open(path, "w") as f:
+            json.dump(self.weights, f)
+
+    save_weights = save
+
+
+class StubAgent:
+    """The parts of DQNAgent a Checkpointer saves"""
+    CHECKPOINT_ATTRIBUTES = DQNAgent.CHECKPOINT_ATTRIBUTES
+
+    def __init__(self):
+        for name in self.CHECKPOINT_ATTRIBUTES:
+            setattr(self, name, 0.5)
+        self.replays = 0
+        self.model = StubModel(0)
+        self.target_model = StubModel(-1)
+        self.memory = ReplayBuffer(100)
+        self.last_ten_actions = deque(maxlen=10)
+
+
+class QwixxCheckpointTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.agent = StubAgent()
+        self.checkpointer = Checkpointer(self.agent, self.directory, keep=2)
+
+    def save(self, step):
+        agent = self.agent
+        agent.memory.add(np.full(3, step), step, 1.0, np.full(3, step + 1), False)
+        agent.replays = step
+        agent.epsilon = 1 / (step + 1)
+        agent.model.weights = step
+        agent.last_ten_actions.append(step)
+        return self.checkpointer.save(episode=step)
+
+    def test_no_checkpoint(self):
+        self.assertEqual([], self.checkpointer.checkpoints())
+        self.assertIsNone(self.checkpointer.latest())
+        self.assertIsNone(self.checkpointer.restore())
+
+    def test_rotation(self):
+        paths = [self.save(step) for step in range(4)]
+        self.assertEqual(paths[-2:], self.checkpointer.checkpoints())
+        self.assertEqual(paths[-1], self.checkpointer.latest())
+        self.assertFalse(os.path.exists(paths[0]))
+        # numbering goes on after the oldest ones were removed
+        self.assertEqual(sorted(paths), paths)
+        self.assertEqual(4, len(set(paths)))
+
+    def test_checkpoint_contents(self):
+        np.random.seed(3)
+        path = self.save(7)
+        expected = np.random.random()
+        with open(os.path.join(path, "agent.json")) as f:
+            state = json.load(f)
+        self.assertEqual({"episode": 7}, state["extra"])
+        self.assertEqual(7, state["attributes"]["replays"])
+        self.assertEqual(1 / 8, state["attributes"]["epsilon"])
+        self.assertEqual(set(DQNAgent.CHECKPOINT_ATTRIBUTES), set(state["attributes"]))
+        self.assertEqual([7], state["last_ten_actions"])
+        kind, keys, position, has_gauss, cached_gaussian = state["random_state"]
+        np.random.set_state((kind, np.array(keys, dtype=np.uint32), position, has_gauss, cached_gaussian))
+        self.assertEqual(expected, np.random.random())
+        for name, weights in (("model.h5", 7), ("target.h5", -1)):
+            with open(os.path.join(path, name)) as f:
+                self.assertEqual(weights, json.load(f))
+        memory = ReplayBuffer.load(os.path.join(self.directory, "replay"))
+        self.assertEqual(1, len(memory))
+        np.testing.assert_array_equal(self.agent.memory.states, memory.states)
+
+    def test_interrupted_save_keeps_latest(self):
+        path = self.save(0)
+        # a save cut short leaves its temporary directory behind
+        os.makedirs(os.path.join(self.directory, "checkpoint-00000001.tmp"))
+        self.assertEqual([path], self.checkpointer.checkpoints())
+        self.assertEqual(path, self.checkpointer.latest())
+        path = self.save(1)
+        self.assertEqual(path, self.checkpointer.latest())
+        self.assertTrue(path.endswith("checkpoint-00000001"))
+        self.assertFalse(os.path.exists(path + ".tmp"))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,131 @@
+import unittest
+
+import numpy as np
+
+from dll_agent import DQNAgent
+from qwixx_gym.envs.qwixx_rules import NUM_ACTIONS
+
+STATE_SIZE = 4
+
+
+class StubModel:
+    """A linear Q function in place of the keras model, every train_on_batch adds 1 to the weights"""
+
+    def __init__(self, seed):
+        self.weights = np.random.RandomState(seed).normal(size=(STATE_SIZE, NUM_ACTIONS))
+        self.trained = []
+
+    def predict_on_batch(self, states):
+        return states @ self.weights
+
+    def train_on_batch(self, states, targets, sample_weight=None):
+        self.trained.append((states.copy(), targets.copy(), sample_weight))
+        self.weights = self.weights + 1
+
+    def get_weights(self):
+        return [self.weights.copy()]
+
+    def set_weights(self, weights):
+        self.weights = weights[0].copy()
+
+
+class StubDQNAgent(DQNAgent):
+
+    def _build_model(self):
+        return StubModel(0)
+
+
+def make_agent(target_update=None, **kwargs):
+    agent = StubDQNAgent("/tmp", 0.99, None, state_size=STATE_SIZE, action_size=NUM_ACTIONS, gamma=0.5,
+                         **kwargs)
+    if target_update:
+        # DQNAgent clones the keras model for the target network
+        agent.target_update = target_update
+        agent.target_model = StubModel(1)
+    return agent
+
+
+def fill(agent, num_transitions, pairs=False):
+    rng = np.random.RandomState(2)
+    for i in range(num_transitions):
+        action = rng.randint(NUM_ACTIONS)
+        agent.remember(rng.normal(size=STATE_SIZE), [action % 5, action // 5] if pairs else action,
+                       rng.normal(), rng.normal(size=STATE_SIZE), i % 4 == 3)
+
+
+class QwixxDQNAgentTest(unittest.TestCase):
+
+    def setUp(self):
+        np.random.seed(0)
+
+    def assert_targets(self, agent, target_model, batch_size=16):
+        """replay's train_on_batch targets, checked against the sampled transitions"""
+        model = agent.model
+        weights, target_weights = model.weights, target_model.weights
+        state = np.random.get_state()
+        batch = agent.memory.sample(batch_size)
+        np.random.set_state(state)
+        agent.replay(batch_size)
+        states, targets, sample_weight = model.trained[-1]
+        np.testing.assert_array_equal(batch.states, states)
+        actions = batch.actions if batch.actions.ndim == 1 else batch.actions[:, 0] + 5 * batch.actions[:, 1]
+        expected = batch.states @ weights
+        next_values = (batch.next_states @ target_weights).max(axis=1)
+        expected[np.arange(batch_size), actions] = np.where(
+            batch.dones, batch.rewards, batch.rewards + 0.5 * next_values)
+        np.testing.assert_allclose(expected, targets)
+        np.testing.assert_array_equal(batch.weights, sample_weight)
+        rows = np.arange(batch_size)
+        return batch, expected[rows, actions] - (batch.states @ weights)[rows, actions]
+
+    def test_replay_targets(self):
+        agent = make_agent(flat_actions=True)
+        fill(agent, 40)
+        for _ in range(3):
+            batch, _ = self.assert_targets(agent, agent.model)
+            self.assertTrue(batch.dones.any() and not batch.dones.all())
+        self.assertEqual(3, agent.replays)
+        self.assertAlmostEqual(0.99 ** 3, agent.epsilon)
+
+    def test_replay_pair_actions(self):
+        agent = make_agent()
+        fill(agent, 40, pairs=True)
+        batch, _ = self.assert_targets(agent, agent.model)
+        self.assertEqual(2, batch.actions.ndim)
+
+    def test_replay_updates_priorities(self):
+        agent = make_agent(prioritized=True)
+        fill(agent, 40)
+        batch, td_errors = self.assert_targets(agent, agent.model)
+        memory = agent.memory
+        expected = (np.abs(td_errors) + memory.epsilon) ** memory.alpha
+        # a transition sampled twice keeps the priority of its last row
+        last = {index: row for row, index in enumerate(batch.indices)}
+        np.testing.assert_allclose(expected[list(last.values())], memory.tree[list(last.keys())])
+        # the next batch is weighted by the new priorities, assert_targets checks they are passed on
+        batch, _ = self.assert_targets(agent, agent.model)
+        self.assertLess(batch.weights.min(), 1)
+
+    def test_hard_target_update(self):
+        agent = make_agent(target_update=3)
+        fill(agent, 40)
+        target = agent.target_model.weights
+        for replay in range(1, 7):
+            self.assert_targets(agent, agent.target_model)
+            # copied every third replay, the targets before used the old weights
+            if replay % 3 == 0:
+                target = agent.model.weights
+            np.testing.assert_array_equal(target, agent.target_model.weights)
+        np.testing.assert_array_equal(agent.model.weights, agent.target_model.weights)
+
+    def test_soft_target_update(self):
+        agent = make_agent(target_update=0.25)
+        fill(agent, 40)
+        for _ in range(3):
+            target = agent.target_model.weights
+            self.assert_targets(agent, agent.target_model)
+            np.testing.assert_allclose(0.25 * agent.model.weights + 0.75 * target, agent.target_model.weights)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,65 @@
+import subprocess
+import sys
+import unittest
+
+import numpy as np
+
+import qwixx_gym
+
+
+def run(code):
+    """Runs code in a fresh interpreter and returns its stdout"""
+    return subprocess.run([sys.executable, "-c", code], check=True, capture_output=True, text=True).stdout
+
+
+class QwixxImportTest(unittest.TestCase):
+
+    def test_package_import_is_lightweight(self):
+        modules = run("import sys, qwixx_gym; print(' '.join(sys.modules))").split()
+        for heavy in ("gym", "numpy", "keras", "qwixx_gym.envs.qwixx_one_hot_env"):
+            self.assertNotIn(heavy, modules)
+        modules = run("import sys\n"
+                      "from qwixx_gym import make\n"
+                      "make('qwixx-v0').step(0)\n"
+                      "print(' '.join(sys.modules))").split()
+        self.assertNotIn("gym", modules)
+
+    def test_gym_make_after_package_import(self):
+        for code in ("import qwixx_gym\nimport gym\n", "import gym\nimport qwixx_gym\n",
+                     "import qwixx_gym\nfrom gym.envs.registration import make as gym_make\nimport gym\n"):
+            out = run(code + "print(gym.make('qwixx-v0').action_space.n)")
+            self.assertEqual(45, int(out))
+
+    def test_core_envs_run_without_gym(self):
+        out = run("import sys; sys.modules['gym'] = None\n"
+                  "from qwixx_gym.envs import QwixxVectorEnv, QwixxMultiAgentEnv\n"
+                  "from qwixx_gym import make\n"
+                  "QwixxVectorEnv(4, seed=0).step([0] * 4)\n"
+                  "QwixxMultiAgentEnv(seed=0).step([0, 0, 0])\n"
+                  "env = make('qwixx-v0')\n"
+                  "env.step(0)\n"
+                  "print(env.legal_action_mask().sum())")
+        self.assertGreater(int(out), 0)
+
+    def test_register_envs(self):
+        import gym
+        qwixx_gym.register_envs()
+        qwixx_gym.register_envs()
+        env = gym.make("qwixx-simple-v0")
+        self.assertEqual(type(qwixx_gym.make("qwixx-simple-v0")), type(env.unwrapped))
+        self.assertEqual(45, env.action_space.n)
+        self.assertEqual((1, 48), env.observation_space.shape)
+
+    def test_flat_and_pair_actions_agree(self):
+        flat, pair = qwixx_gym.make("qwixx-v0"), qwixx_gym.make("qwixx-v0")
+        for env in (flat, pair):
+            env.seed(0)
+            env.reset()
+        for action in (7, 0, 11):
+            flat_step, pair_step = flat.step(action), pair.step([action % 5, action // 5])
+            np.testing.assert_array_equal(flat_step[0], pair_step[0])
+            self.assertEqual(flat_step[1:3], pair_step[1:3])
+
+
+if __name__ == '__main__':
+    unittest.main()
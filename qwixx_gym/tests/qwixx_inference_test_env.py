@@ -0,0 +1,119 @@
+import os
+import tempfile
+import threading
+import unittest
+from concurrent.futures import CancelledError
+
+import numpy as np
+
+from inference import InferenceServer, NumpyQNetwork, RepeatGuard, select_actions
+from qwixx_gym.envs.qwixx_rules import NUM_ACTIONS, OBSERVATION_SIZE
+from qwixx_gym.envs.qwixx_vector_env import QwixxVectorEnv
+
+
+def network(seed=0):
+    rng = np.random.RandomState(seed)
+    return NumpyQNetwork([rng.normal(size=(OBSERVATION_SIZE, 8)), rng.normal(size=8),
+                          rng.normal(size=(8, NUM_ACTIONS)), rng.normal(size=NUM_ACTIONS)], ["tanh", "linear"])
+
+
+class QwixxInferenceTest(unittest.TestCase):
+
+    def setUp(self):
+        self.network = network()
+        self.env = QwixxVectorEnv(64, seed=0)
+        self.states = self.env.reset()
+        self.masks = self.env.legal_action_mask()
+
+    def test_network(self):
+        kernel, bias, out_kernel, out_bias = self.network.get_weights()
+        expected = np.tanh(self.states @ kernel + bias) @ out_kernel + out_bias
+        np.testing.assert_allclose(expected, self.network(self.states), rtol=1e-5, atol=1e-5)
+        path = os.path.join(tempfile.mkdtemp(), "network.npz")
+        self.network.save(path)
+        np.testing.assert_array_equal(self.network(self.states), NumpyQNetwork.load(path)(self.states))
+        with self.assertRaises(ValueError):
+            self.network.set_weights([kernel.T, bias, out_kernel, out_bias])
+
+    def test_actions_are_legal(self):
+        rng = np.random.default_rng(0)
+        for epsilon in (0.0, 0.5, 1.0):
+            states, masks = self.states, self.masks
+            for _ in range(20):
+                actions, _ = select_actions(self.network(states), masks, epsilon, rng, RepeatGuard(64))
+                self.assertTrue(masks[np.arange(64), actions].all())
+                states, _, _, info = self.env.step(actions)
+                masks = info["action_mask"]
+
+    def test_guard_replaces_repeated_action(self):
+        # env 0 always prefers action 3 over 4, env 1 prefers 4 but starts later
+        q_values = np.zeros((2, NUM_ACTIONS))
+        q_values[:, 3], q_values[:, 4] = [2, 1], [1, 2]
+        rng = np.random.default_rng(0)
+        guard = RepeatGuard(2)
+        for _ in range(10):
+            actions, random = select_actions(q_values[:1], None, 0.0, rng, guard, [0])
+            self.assertEqual([3], actions.tolist())
+            self.assertFalse(random[0])
+        # ten of the last ten were 3, more than 5, so act takes the second best and doesn't remember it
+        for _ in range(3):
+            actions, random = select_actions(q_values, None, 0.0, rng, guard, [0, 1])
+            self.assertEqual([4, 4], actions.tolist())
+            self.assertEqual([True, False], random.tolist())
+        guard.reset([0])
+        actions, random = select_actions(q_values[:1], None, 0.0, rng, guard, [0])
+        self.assertEqual([3], actions.tolist())
+
+    def test_per_env_epsilon(self):
+        with InferenceServer(self.network, 64, epsilon=np.tile([0.0, 1.0], 32), guard=False, seed=0) as server:
+            greedy = np.argmax(np.where(self.masks, self.network(self.states), -np.inf), axis=1)
+            env_ids = np.arange(64)[::-1]
+            actions, random = server.select(self.states[::-1], self.masks[::-1], env_ids)
+        np.testing.assert_array_equal(env_ids % 2 == 1, random)
+        np.testing.assert_array_equal(greedy[::-1][~random], actions[~random])
+        self.assertFalse((actions[random] == greedy[::-1][random]).all())
+
+    def test_server_batches_requests(self):
+        greedy = np.argmax(np.where(self.masks, self.network(self.states), -np.inf), axis=1)
+        results = {}
+        with InferenceServer(self.network, 64, max_latency=0.05, guard=False) as server:
+            def act(env_id):
+                results[env_id] = server.act(env_id, self.states[env_id], self.masks[env_id])
+
+            threads = [threading.Thread(target=act, args=(env_id,)) for env_id in range(64)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        self.assertEqual(greedy.tolist(), [results[env_id] for env_id in range(64)])
+        self.assertEqual(64, server.requests)
+        self.assertLess(server.batches, 64)
+
+    def test_stop_cancels_waiting_requests(self):
+        entered, release = threading.Event(), threading.Event()
+
+        def slow_network(states):
+            entered.set()
+            release.wait()
+            return self.network(states)
+
+        server = InferenceServer(slow_network, 2, max_latency=0.0, guard=False)
+        server.start()
+        served = server.submit(0, self.states[0])
+        entered.wait()
+        waiting = server.submit(1, self.states[1])
+        stopper = threading.Thread(target=server.stop)
+        stopper.start()
+        # the request being served finishes after stop was called
+        server._stop.wait(1)
+        release.set()
+        stopper.join()
+        self.assertIn(served.result(timeout=1), range(NUM_ACTIONS))
+        with self.assertRaises(CancelledError):
+            waiting.result(timeout=1)
+        with self.assertRaises(RuntimeError):
+            server.submit(0, self.states[0])
+
+
+if __name__ == '__main__':
+    unittest.main()
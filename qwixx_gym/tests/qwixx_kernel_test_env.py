@@ -0,0 +1,74 @@
+import copy
+import unittest
+
+import numpy as np
+
+from qwixx_gym.envs import QwixxOneHotEnv, QwixxSimple
+from qwixx_gym.envs.qwixx_kernel_env import QwixxKernelEnv
+from qwixx_gym.envs.qwixx_reward import RewardFunction
+from qwixx_gym.envs.qwixx_state import Dice
+
+
+class SkipAndMarks(RewardFunction):
+    needs_skip_analysis = True
+
+    def __call__(self, env, changed_values, current_score, skip_reward):
+        return env._calculate_score() - current_score, tuple(changed_values), skip_reward, env._is_done()
+
+
+def compare(test, reward, seed, steps=3000):
+    """Steps a python and a kernel env with the same actions, invalid ones included"""
+    python = QwixxOneHotEnv(reward=reward, backend="python")
+    kernel = QwixxOneHotEnv(reward=reward, backend="kernel")
+    python.seed(seed)
+    kernel.seed(seed)
+    np.testing.assert_array_equal(python.reset(), kernel.reset())
+    rng = np.random.RandomState(seed)
+    for _ in range(steps):
+        test.assertEqual(python.get_state(), kernel.get_state())
+        mask = python.legal_action_mask()
+        np.testing.assert_array_equal(mask, kernel.legal_action_mask())
+        action = rng.randint(45) if rng.rand() < 0.05 else rng.choice(np.flatnonzero(mask))
+        expected, result = python.step(int(action)), kernel.step(int(action))
+        np.testing.assert_array_equal(expected[0], result[0])
+        test.assertEqual(expected[1:3], result[1:3])
+        test.assertEqual(expected[3]["score"], result[3]["score"])
+        np.testing.assert_array_equal(expected[3]["action_mask"], result[3]["action_mask"])
+        test.assertEqual(python.last_reward, kernel.last_reward)
+        if expected[2]:
+            np.testing.assert_array_equal(python.reset(), kernel.reset())
+
+
+class QwixxKernelEnvTest(unittest.TestCase):
+
+    def test_backends(self):
+        self.assertIsInstance(QwixxOneHotEnv(backend="kernel"), QwixxKernelEnv)
+        self.assertNotIsInstance(QwixxOneHotEnv(backend="python"), QwixxKernelEnv)
+        self.assertIsInstance(copy.deepcopy(QwixxOneHotEnv(backend="kernel")), QwixxKernelEnv)
+        with self.assertRaises(ValueError):
+            QwixxOneHotEnv(backend="cuda")
+        with self.assertRaises(ValueError):
+            QwixxSimple(backend="kernel")
+
+    def test_same_games(self):
+        for reward in ("shaped", "terminal", "delta", SkipAndMarks):
+            compare(self, reward, seed=7)
+
+    def test_objects_write_back(self):
+        env = QwixxOneHotEnv(backend="kernel")
+        env.dice = Dice(3, 3, 5, 5, 5, 5)
+        env.progress.counts.red = 4
+        python = QwixxOneHotEnv(backend="python")
+        python.set_state(env.get_state())
+        np.testing.assert_array_equal(python._serialize_state(), env._serialize_state())
+        self.assertEqual(python._calculate_score(), env._calculate_score())
+        self.assertIsNone(env.previous_dice)
+        dice = env.dice.copy()
+        env.step(1)
+        self.assertEqual(dice, env.previous_dice)
+        self.assertEqual(5, env.progress.counts.red)
+        self.assertEqual(6, env.progress.latest_num.red)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,111 @@
+import unittest
+
+import numpy as np
+
+from qwixx_gym.envs.qwixx_multi_agent_env import QwixxMultiAgentEnv
+
+
+class QwixxMultiAgentEnvTest(unittest.TestCase):
+
+    def setUp(self) -> None:
+        np.random.seed(4)
+        self.env = QwixxMultiAgentEnv(num_players=3)
+
+    def _save(self):
+        env = self.env
+        return (env.dice.copy(), env.counts.copy(), env.latest_num.copy(), env.strikes.copy(),
+                env.locked.copy(), env.num_turns, env.current_player)
+
+    def _restore(self, state):
+        env = self.env
+        (env.dice[:], env.counts[:], env.latest_num[:], env.strikes[:], env.locked[:],
+         env.num_turns, env.current_player) = state
+
+    def test_reset(self):
+        observations = self.env.reset()
+        self.assertEqual((3, 48), observations.shape)
+        np.testing.assert_array_equal([1, 0, 0], observations[:, 0])
+        np.testing.assert_array_equal([0, 1, 2], observations[:, 2])
+        # every seat sees the same dice
+        self.assertTrue((observations[:, 3:39] == observations[0, 3:39]).all())
+
+    def test_white_dice_for_everyone(self):
+        self.env.dice[:] = [3, 4, 1, 1, 1, 1]
+        observations, rewards, done, info = self.env.step(np.array([1, 2, 3]))
+        np.testing.assert_array_equal([7, 1, 13, 13], self.env.latest_num[0])
+        np.testing.assert_array_equal([1, 7, 13, 13], self.env.latest_num[1])
+        np.testing.assert_array_equal([1, 1, 13, 7], self.env.latest_num[2])
+        np.testing.assert_array_equal([1, 1, 1], rewards)
+        np.testing.assert_array_equal([1, 1, 1], info["score"])
+        self.assertEqual(1, self.env.current_player)
+        self.assertFalse(done)
+
+    def test_roller_strike_and_color_for_roller_only(self):
+        self.env.dice[:] = [3, 4, 1, 1, 1, 1]
+        self.env.step(np.array([0, 0, 0]))
+        np.testing.assert_array_equal([1, 0, 0], self.env.strikes)
+        # seat 2 didn't roll and can't take a color die
+        _, rewards, done, _ = self.env.step(np.array([0, 0, 5 * 1]))
+        self.assertTrue(done)
+        self.assertEqual(self.env.invalid_move_reward, rewards[2])
+
+    def test_lock_closes_row_for_everyone(self):
+        env = self.env
+        env.counts[1] = [5, 0, 0, 0]
+        env.latest_num[1] = [11, 1, 13, 13]
+        env.dice[:] = [6, 6, 3, 3, 3, 3]
+        # seat 0 rolls, seat 1 locks red with the white dice, seat 0's red move is forfeited
+        mask = env.legal_action_mask()
+        self.assertTrue(mask[0, 5 * 1])
+        self.assertTrue(mask[1, 1])
+        state = self._save()
+        _, rewards, done, info = env.step(np.array([5 * 1, 1, 0]))
+        self.assertFalse(done)
+        np.testing.assert_array_equal([True, False, False, False], info["locked"])
+        self.assertEqual(0, rewards[0])
+        np.testing.assert_array_equal([0, 0, 0, 0], env.counts[0])
+        self.assertEqual(0, env.strikes[0])
+        self._restore(state)
+        red_die = env.dice[2]
+        _, _, done, info = env.step(np.array([3, 1, 0]))
+        self.assertFalse(done)
+        np.testing.assert_array_equal([True, False, False, False], info["locked"])
+        self.assertEqual(red_die, env.dice[2])
+        self.assertFalse(info["action_mask"][:, [1, 6, 7]].any())
+
+    def test_roller_can_not_use_own_lock(self):
+        env = self.env
+        env.counts[0] = [5, 0, 0, 0]
+        env.latest_num[0] = [11, 1, 13, 13]
+        env.dice[:] = [6, 6, 3, 3, 3, 3]
+        # seat 0 rolls and locks red with the white dice, a red color move after is invalid
+        mask = env.legal_action_mask()
+        self.assertTrue(mask[0, 1])
+        self.assertFalse(mask[0, 1 + 5 * 1])
+        _, rewards, done, _ = env.step(np.array([1 + 5 * 1, 0, 0]))
+        self.assertTrue(done)
+        self.assertEqual(env.invalid_move_reward, rewards[0])
+
+    def test_legal_action_mask_matches_step(self):
+        done = True
+        for _ in range(40):
+            if done:
+                self.env.reset()
+            state = self._save()
+            mask = self.env.legal_action_mask()
+            for seat in range(3):
+                for action in range(45):
+                    self._restore(state)
+                    # the other seats pass, so they can't close a row first
+                    actions = np.zeros(3, dtype=np.int64)
+                    actions[seat] = action
+                    self.env.step(actions)
+                    invalid = self.env.num_turns == state[-2]
+                    self.assertEqual(not mask[seat, action], invalid, (seat, action))
+            self._restore(state)
+            actions = [np.random.choice(np.flatnonzero(row)) for row in mask]
+            _, _, done, _ = self.env.step(np.array(actions))
+
+
+if __name__ == '__main__':
+    unittest.main()
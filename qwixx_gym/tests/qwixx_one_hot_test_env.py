@@ -1,5 +1,8 @@
 import unittest
-from qwixx_gym.envs.qwixx_one_hot_env import QwixxOneHotEnv, Dice, ColorCount
+
+import numpy as np
+
+from qwixx_gym.envs.qwixx_one_hot_env import QwixxOneHotEnv, Dice, ColorCount, PlayerProgress
 
 
 class QwixxOneHotEnvTest(unittest.TestCase):
@@ -57,6 +60,135 @@ class QwixxOneHotEnvTest(unittest.TestCase):
         reward = self.env.calculate_reward([(2, 4), (4, 5)], 3)
         self.assertEqual(3, reward)
 
+    def test_legal_action_mask_non_roller(self):
+        self.env.current_player = self.env.bot_player + 1
+        self.env.dice = Dice(2, 3, 4, 4, 4, 4)
+        mask = self.env.legal_action_mask()
+        # white 5 can go anywhere, color dice are never allowed
+        self.assertTrue(mask[:5].all())
+        self.assertFalse(mask[5:].any())
+
+    def test_legal_action_mask_lock(self):
+        self.env.current_player = self.env.bot_player
+        self.env.dice = Dice(6, 6, 6, 6, 1, 1)
+        self.env.progress.latest_num = ColorCount(11, 2, 13, 13)
+        self.env.progress.counts = ColorCount(4, 1, 0, 0)
+        mask = self.env.legal_action_mask()
+        self.assertFalse(mask[1], "white 12 can't lock red with 4 marks")
+        self.assertFalse(mask[2], "white 12 can't lock yellow with 1 mark")
+        self.assertTrue(mask[0 + 5 * 4], "white 1 + green is 7")
+        self.env.progress.counts = ColorCount(5, 1, 0, 0)
+        self.assertTrue(self.env.legal_action_mask()[1])
+
+    def test_serialize_state_buffers(self):
+        self.env.dice = Dice(1, 6, 0, 3, 3, 3)
+        observation = self.env._serialize_state()
+        self.assertEqual(np.float32, observation.dtype)
+        np.testing.assert_array_equal([1, 0, 0, 0, 0, 0], observation[3:9])
+        np.testing.assert_array_equal([0, 0, 0, 0, 0, 0], observation[15:21], "unrolled die")
+        self.assertIsNot(observation, self.env._serialize_state())
+        out = np.zeros((1, 48), dtype=np.float32)
+        self.assertIs(out, self.env._serialize_state(out))
+        np.testing.assert_array_equal(observation, out[0])
+        self.env.copy = False
+        self.assertIs(self.env._serialize_state(), self.env._serialize_state())
+
+    def _restore(self, state):
+        dice, counts, latest, strikes, player, turns = state
+        self.env.dice = Dice(*dice)
+        self.env.progress.counts = ColorCount(*counts)
+        self.env.progress.latest_num = ColorCount(*latest)
+        self.env.progress.strikes, self.env.current_player, self.env.num_turns = strikes, player, turns
+
+    def test_legal_action_mask_matches_step(self):
+        np.random.seed(0)
+        done = True
+        for _ in range(300):
+            if done:
+                self.env.reset()
+            progress = self.env.progress
+            state = (list(self.env.dice.values), list(progress.counts.values),
+                     list(progress.latest_num.values), progress.strikes,
+                     self.env.current_player, self.env.num_turns)
+            mask = self.env.legal_action_mask()
+            for action in range(45):
+                self._restore(state)
+                _, _, done, _ = self.env.step(np.int64(action))
+                # invalid moves end the game without rolling
+                invalid = done and self.env.num_turns == state[-1]
+                self.assertNotEqual(invalid, mask[action], action)
+            self._restore(state)
+            _, _, done, _ = self.env.step(np.random.choice(np.flatnonzero(mask)))
+
+    def test_get_set_state(self):
+        np.random.seed(1)
+        self.env.step(np.int64(0))
+        state = self.env.get_state()
+        observation = self.env._serialize_state()
+        for _ in range(3):
+            self.env.step(np.int64(0))
+        self.assertNotEqual(state, self.env.get_state())
+        self.env.set_state(state)
+        self.assertEqual(state, self.env.get_state())
+        np.testing.assert_array_equal(observation, self.env._serialize_state())
+
+    def test_seed(self):
+        rolls = []
+        for _ in range(2):
+            self.env.seed(5)
+            self.env.reset()
+            dice = [self.env.dice.copy()]
+            for _ in range(3):
+                self.env.step(np.int64(0))
+                dice.append(self.env.dice.copy())
+            rolls.append(dice)
+        self.assertEqual(rolls[0], rolls[1])
+        self.env.seed(6)
+        self.env.reset()
+        self.assertNotEqual(rolls[0][0], self.env.dice)
+
+    def test_incremental_score(self):
+        env = QwixxOneHotEnv(num_players=1, debug=True)
+        env.seed(7)
+        for _ in range(500):
+            _, _, done, _ = env.step(np.random.choice(np.flatnonzero(env.legal_action_mask())))
+            if done:
+                env.reset()
+        # changes from outside are picked up too
+        env.progress.counts = ColorCount(5, 0, 0, 0)
+        env.progress.latest_num = ColorCount(11, 1, 13, 13)
+        env.progress.strikes = 1
+        self.assertEqual(15 - 5, env._calculate_score())
+        env.progress.latest_num.red = 12
+        self.assertEqual(16 - 5, env._calculate_score())
+        self.assertEqual(["red"], env.locked_colors)
+
+    def test_strike_before_read(self):
+        progress = PlayerProgress()
+        progress.strike()
+        self.assertEqual(-5, progress.score)
+        progress.counts = ColorCount(2, 0, 0, 0)
+        progress.strike()
+        self.assertEqual(3 - 10, progress.score)
+        self.assertEqual(2, progress.strikes)
+
+    def test_action_decoding(self):
+        results = []
+        for action in (23, np.int64(23), [3, 4], np.array([3, 4]), np.array(23)):
+            self.env.seed(8)
+            self.env.reset()
+            observation, reward, done, _ = self.env.step(action)
+            results.append((observation.tolist(), reward, done, self.env.last_actions))
+        self.env.seed(8)
+        self.env.reset()
+        observation, reward, done, _ = self.env.step_unchecked(23)
+        results.append((observation.tolist(), reward, done, self.env.last_actions))
+        self.assertEqual([results[0]] * len(results), results)
+        self.assertEqual(("blue", ("white1", "green")), results[0][3])
+        for action in (45, -1, [5, 0], [0, 9]):
+            with self.assertRaises(ValueError):
+                self.env.step(action)
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,40 @@
+import itertools
+import unittest
+
+import numpy as np
+
+from qwixx_gym.envs.qwixx_outcomes import (
+    COLOR_SUM_PROBABILITIES, WHITE_SUM_PROBABILITIES, expectation, locked_mask, outcome_table,
+)
+
+
+class QwixxOutcomesTest(unittest.TestCase):
+
+    def test_expectation_matches_enumeration(self):
+        rolls = np.array(list(itertools.product(range(1, 7), repeat=6)))
+        for locked in ([False] * 4, [True, False, False, True]):
+            mask = int(locked_mask(locked))
+            table = outcome_table(mask)
+            self.assertIs(table, outcome_table(mask))
+            dice = rolls.copy()
+            dice[:, 2:][:, locked] = 1
+            # something symmetric in the white dice, as the actions are
+            values = np.maximum(dice[:, 0], dice[:, 1]) * dice[:, 2:].sum(1) + (dice[:, 0] + dice[:, 1]) ** 2
+            table_dice = table.dice.astype(np.int64)
+            table_values = (np.maximum(table_dice[:, 0], table_dice[:, 1]) * table_dice[:, 2:].sum(1)
+                            + table.white_sums.astype(np.int64) ** 2)
+            self.assertAlmostEqual(values.mean(), expectation(mask, table_values))
+
+    def test_sums(self):
+        table = outcome_table(0)
+        np.testing.assert_array_equal(table.dice[:, 0] + table.dice[:, 1], table.white_sums)
+        np.testing.assert_array_equal(table.dice[:, 1] + table.dice[:, 4], table.color_sums[:, 2, 1])
+        white = np.bincount(table.white_sums, table.probabilities, minlength=13)
+        np.testing.assert_allclose(WHITE_SUM_PROBABILITIES, white)
+        self.assertAlmostEqual(6 / 36, WHITE_SUM_PROBABILITIES[7])
+        self.assertAlmostEqual(1 / 216, COLOR_SUM_PROBABILITIES[2, 2])
+        self.assertAlmostEqual(1.0, COLOR_SUM_PROBABILITIES.sum())
+
+
+if __name__ == '__main__':
+    unittest.main()
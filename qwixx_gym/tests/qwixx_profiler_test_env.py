@@ -0,0 +1,71 @@
+import json
+import os
+import tempfile
+import unittest
+
+import numpy as np
+
+from qwixx_gym.envs import QwixxOneHotEnv
+from qwixx_gym.envs.qwixx_profiler import HISTOGRAM_BUCKETS, Profiler
+
+
+def play(env, steps):
+    env.seed(0)
+    env.reset()
+    rng = np.random.RandomState(0)
+    for _ in range(steps):
+        _, _, done, _ = env.step(int(rng.choice(np.flatnonzero(env.legal_action_mask()))))
+        if done:
+            env.reset()
+
+
+class QwixxProfilerTest(unittest.TestCase):
+
+    def test_env_phases(self):
+        env = QwixxOneHotEnv(backend="python")
+        profiler = env.enable_profiling()
+        play(env, 200)
+        phases = profiler.phases
+        self.assertEqual(200, phases["env.step"].calls)
+        self.assertEqual(200, phases["env.step_unchecked"].calls)
+        self.assertGreaterEqual(phases["env._roll_dice"].calls, 200)
+        self.assertEqual(phases["env.step"].calls, sum(phases["env.step"].histogram))
+        self.assertGreaterEqual(phases["env.step"].total_ns, phases["env.step_unchecked"].total_ns)
+        self.assertIn("env.step", profiler.summary())
+
+        env.disable_profiling()
+        self.assertNotIn("step", env.__dict__)
+        play(env, 10)
+        self.assertEqual(200, phases["env.step"].calls)
+
+    def test_same_results(self):
+        plain, profiled = QwixxOneHotEnv(backend="python"), QwixxOneHotEnv(backend="python")
+        profiled.enable_profiling(Profiler(track_allocations=True))
+        for env in (plain, profiled):
+            play(env, 100)
+        self.assertEqual(plain.get_state(), profiled.get_state())
+
+    def test_exports(self):
+        profiler = Profiler()
+        with profiler.phase("wait"):
+            pass
+        profiler.timed("call", len)([1, 2])
+        self.assertEqual({"wait", "call"}, set(profiler.to_dict()["phases"]))
+        directory = tempfile.mkdtemp()
+        path = os.path.join(directory, "profile.json")
+        profiler.save_json(path)
+        with open(path) as f:
+            self.assertEqual(1, json.load(f)["phases"]["call"]["calls"])
+        path = os.path.join(directory, "profile.prom")
+        profiler.save_prometheus(path)
+        with open(path) as f:
+            lines = f.read().splitlines()
+        self.assertIn('qwixx_phase_seconds_count{phase="call"} 1', lines)
+        self.assertIn('qwixx_phase_seconds_bucket{phase="wait",le="+Inf"} 1', lines)
+        self.assertEqual(2 * (HISTOGRAM_BUCKETS + 2) + 2, len(lines))
+        profiler.reset()
+        self.assertEqual(0, profiler.phases["call"].calls)
+
+
+if __name__ == '__main__':
+    unittest.main()
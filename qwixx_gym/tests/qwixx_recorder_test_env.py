@@ -0,0 +1,89 @@
+import os
+import tempfile
+import unittest
+
+import numpy as np
+
+from qwixx_gym.envs.qwixx_one_hot_env import QwixxOneHotEnv
+from qwixx_gym.envs.qwixx_recorder import QwixxRecorder, TrajectoryReader, TrajectoryWriter
+from qwixx_gym.envs.qwixx_state import unpack_state
+from qwixx_gym.envs.qwixx_vector_env import QwixxVectorEnv
+
+
+class QwixxRecorderTest(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.directory = tempfile.mkdtemp()
+
+    def test_single_env(self):
+        env = QwixxOneHotEnv()
+        env.seed(0)
+        rng = np.random.RandomState(0)
+        expected = []
+        with QwixxRecorder(env, self.directory, shard_size=8, compress=True) as recorder:
+            for episode in range(3):
+                recorder.reset()
+                done = False
+                while not done:
+                    state = env.get_state()
+                    action = rng.choice(np.flatnonzero(env.legal_action_mask()))
+                    pair = [action % 5, action // 5]
+                    _, reward, done, info = recorder.step(pair if episode == 1 else action)
+                    expected.append((state, action, reward, info["score"], done, episode))
+        self.assertGreater(recorder.writer.num_shards, 1)
+        columns = TrajectoryReader(self.directory).read()
+        for values, column in zip(zip(*expected), columns.values()):
+            np.testing.assert_array_equal(np.array(values, dtype=column.dtype), column)
+
+    def test_vector_env(self):
+        env = QwixxVectorEnv(16, seed=1)
+        preference = np.random.RandomState(1).random_sample((16, 45))
+        states, dones = [], []
+        with QwixxRecorder(env, self.directory, shard_size=100) as recorder:
+            recorder.reset()
+            for _ in range(80):
+                states.append(env.get_state())
+                _, _, done, _ = recorder.step(np.argmax(env.legal_action_mask() * preference, axis=1))
+                dones.append(done)
+        reader = TrajectoryReader(self.directory)
+        self.assertEqual(16 * 80, len(reader))
+        self.assertIsInstance(next(reader.shards(["state"]))["state"], np.memmap)
+        columns = reader.read(["state", "done", "episode", "dice", "turns"])
+        np.testing.assert_array_equal(np.concatenate(states), columns["state"])
+        np.testing.assert_array_equal(np.concatenate(dones), columns["done"])
+        dice, _, _, _, turns, _ = zip(*map(unpack_state, np.concatenate(states).tolist()))
+        np.testing.assert_array_equal(dice, columns["dice"])
+        np.testing.assert_array_equal(turns, columns["turns"])
+        # every game gets a new episode id, each one a single run of rows per env
+        episodes, dones = columns["episode"].reshape(80, 16), np.array(dones)
+        self.assertEqual(16 + dones[:-1].sum(), len(np.unique(episodes)))
+        np.testing.assert_array_equal(dones[:-1], np.diff(episodes, axis=0) != 0)
+
+    def test_close_leaves_env_open(self):
+        env = QwixxVectorEnv(2, seed=2)
+        with QwixxRecorder(env, self.directory) as recorder:
+            recorder.reset()
+            recorder.step(np.argmax(env.legal_action_mask(), axis=1))
+        # the caller keeps playing the env after the recording
+        env.step(np.argmax(env.legal_action_mask(), axis=1))
+        self.assertEqual(2, len(TrajectoryReader(self.directory)))
+        closed = []
+        env.close = lambda: closed.append(True)
+        QwixxRecorder(env, tempfile.mkdtemp()).close()
+        self.assertEqual([], closed)
+        QwixxRecorder(env, tempfile.mkdtemp(), close_env=True).close()
+        self.assertEqual([True], closed)
+
+    def test_writer_errors_are_raised(self):
+        writer = TrajectoryWriter(self.directory, shard_size=4)
+        # a directory below a file can be neither created nor written to
+        open(os.path.join(self.directory, "file"), "w").close()
+        writer.directory = os.path.join(self.directory, "file", "dir")
+        writer.append(np.arange(4), np.zeros(4), np.zeros(4), np.zeros(4), np.zeros(4), np.zeros(4))
+        with self.assertRaises(OSError):
+            writer.flush()
+        writer.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,196 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+import numpy as np
+
+from replay_buffer import ReplayBuffer, SumTree
+
+
+def transition(i, done=False):
+    """Transition i of an episode, states numbered by the step they were seen at"""
+    return np.full(3, i, dtype=np.float32), i % 45, float(i), np.full(3, i + 1, dtype=np.float32), done
+
+
+def read(directory, name):
+    with open(os.path.join(directory, name), "rb") as f:
+        return f.read()
+
+
+class QwixxReplayBufferTest(unittest.TestCase):
+
+    def setUp(self):
+        np.random.seed(0)
+
+    def test_wraparound(self):
+        buffer = ReplayBuffer(5)
+        for i in range(7):
+            buffer.add(*transition(i))
+        self.assertEqual(5, len(buffer))
+        self.assertEqual(7 % 5, buffer.position)
+        # slots 0 and 1 were overwritten by transitions 5 and 6, slot 2 holds 6's next state
+        np.testing.assert_array_equal([5, 6, 7, 3, 4], buffer.states[:, 0])
+        np.testing.assert_array_equal([5, 6, 2, 3, 4], buffer.actions)
+        np.testing.assert_array_equal([5, 6, 2, 3, 4], buffer.rewards)
+
+    def test_next_states_after_filling(self):
+        buffer = ReplayBuffer(5)
+        for i in range(12):
+            buffer.add(*transition(i, done=i == 11))
+        batch = buffer.sample(1000)
+        # the oldest slot lost its next state and is never sampled
+        self.assertNotIn(buffer.position, batch.indices)
+        self.assertEqual({8, 9, 10, 11}, set(batch.states[:, 0].tolist()))
+        np.testing.assert_array_equal(batch.states + 1, batch.next_states)
+        np.testing.assert_array_equal(batch.states[:, 0], batch.rewards)
+        np.testing.assert_array_equal(np.ones(1000), batch.weights)
+
+    def test_next_states_across_episodes(self):
+        buffer = ReplayBuffer(10)
+        buffer.add(*transition(0))
+        buffer.add(*transition(1, done=True))
+        # the reset observation replaces the terminal next state, done targets don't use it
+        buffer.add(np.full(3, 100, dtype=np.float32), 0, 0.0, np.full(3, 101, dtype=np.float32), False)
+        batch = buffer.sample(200)
+        following = dict(zip(batch.states[:, 0].tolist(), batch.next_states[:, 0].tolist()))
+        self.assertEqual({0: 1, 1: 100, 100: 101}, following)
+        np.testing.assert_array_equal(batch.states[:, 0] == 1, batch.dones)
+
+    def test_sum_tree(self):
+        tree = SumTree(5)
+        self.assertEqual(8, tree.leaves)
+        tree.update([0, 1, 2, 4], [1.0, 2.0, 3.0, 4.0])
+        self.assertEqual(10.0, tree.total)
+        np.testing.assert_array_equal([0, 0, 1, 1, 2, 2, 2, 4, 4], tree.find([0, 0.5, 1, 2.9, 3, 5.9, 5.99, 6, 9.99]))
+        tree.update([4], [0.0])
+        self.assertEqual(6.0, tree.total)
+        # values at the very end don't end up in an empty leaf
+        self.assertEqual([2], tree.find([6.0]).tolist())
+
+    def test_prioritized_weights(self):
+        buffer = ReplayBuffer(8, prioritized=True, alpha=0.5, beta=1.0, epsilon=0.0)
+        for i in range(4):
+            buffer.add(*transition(i))
+        # new transitions get the highest priority, the slot after the last none
+        np.testing.assert_allclose([1, 1, 1, 1, 0], buffer.tree[np.arange(5)])
+        buffer.update_priorities(np.arange(4), np.array([1.0, -4.0, 9.0, 16.0]))
+        np.testing.assert_allclose([1, 2, 3, 4], buffer.tree[np.arange(4)])
+        self.assertEqual(16.0, buffer.max_priority)
+        buffer.add(*transition(4))
+        self.assertAlmostEqual(4.0, buffer.tree[4])
+
+        batch = buffer.sample(2000)
+        probabilities = np.array([1, 2, 3, 4, 4]) / 14
+        frequencies = np.bincount(batch.indices, minlength=5) / 2000
+        np.testing.assert_allclose(probabilities, frequencies, atol=0.03)
+        # importance sampling weights (N * P) ** -beta, normalized to the largest
+        expected = 1 / (5 * probabilities[batch.indices])
+        np.testing.assert_allclose(expected / expected.max(), batch.weights, rtol=1e-6)
+        np.testing.assert_array_equal(batch.states + 1, batch.next_states)
+
+    def test_add_batch_matches_add(self):
+        rng = np.random.RandomState(1)
+        added, batched = ReplayBuffer(50, prioritized=True), ReplayBuffer(50, prioritized=True)
+        for _ in range(8):
+            # several whole episodes per call, each ending with done
+            episodes = []
+            for _ in range(rng.randint(1, 4)):
+                length = rng.randint(1, 12)
+                states = rng.random_sample((length + 1, 3)).astype(np.float32)
+                dones = np.arange(length) == length - 1
+                episodes.append((states[:-1], rng.randint(0, 45, length), rng.random_sample(length),
+                                 states[1:], dones))
+            for episode in episodes:
+                for row in zip(*episode):
+                    added.add(*row)
+            batched.add_batch(*(np.concatenate(column) for column in zip(*episodes)))
+            indices = rng.randint(0, len(added), 5)
+            td_errors = rng.normal(size=5)
+            added.update_priorities(indices, td_errors)
+            batched.update_priorities(indices, td_errors)
+        self.assertEqual((added.position, added.size, added.added), (batched.position, batched.size, batched.added))
+        for name in ReplayBuffer.ARRAYS:
+            np.testing.assert_array_equal(getattr(added, name), getattr(batched, name), name)
+        np.testing.assert_allclose(added.tree.tree, batched.tree.tree)
+        self.assertEqual(added.max_priority, batched.max_priority)
+
+    def assert_buffers_equal(self, expected, actual):
+        self.assertEqual((expected.position, expected.size, expected.added),
+                         (actual.position, actual.size, actual.added))
+        for name in ReplayBuffer.ARRAYS:
+            np.testing.assert_array_equal(getattr(expected, name), getattr(actual, name), name)
+        if expected.prioritized:
+            np.testing.assert_allclose(expected.tree.tree, actual.tree.tree)
+            self.assertEqual(expected.max_priority, actual.max_priority)
+
+    def test_save_and_load(self):
+        rng = np.random.RandomState(2)
+        for prioritized in (False, True):
+            directory = tempfile.mkdtemp()
+            buffer = ReplayBuffer(40, prioritized=prioritized)
+            buffer.save(directory)
+            self.assertIsNone(ReplayBuffer.load(directory).states)
+            step = 0
+            # a few rows, nothing, more than fit, and wrapping around in between
+            for count in (5, 0, 30, 17, 60, 3, 39):
+                for _ in range(count):
+                    buffer.add(*transition(step, done=rng.random_sample() < 0.1))
+                    step += 1
+                if prioritized and len(buffer):
+                    buffer.update_priorities(rng.randint(0, len(buffer), 4), rng.normal(size=4))
+                buffer.save(directory)
+                loaded = ReplayBuffer.load(directory)
+                self.assert_buffers_equal(buffer, loaded)
+                self.assertIsInstance(loaded.states, np.memmap)
+
+    def test_save_after_load(self):
+        directory = tempfile.mkdtemp()
+        buffer = ReplayBuffer(20, prioritized=True)
+        for i in range(25):
+            buffer.add(*transition(i))
+        buffer.save(directory)
+        files = {name: read(directory, name) for name in os.listdir(directory)}
+        loaded = ReplayBuffer.load(directory)
+        for i in range(25, 32):
+            loaded.add(*transition(i))
+            buffer.add(*transition(i))
+        np.testing.assert_array_equal(np.arange(26, 33), loaded.states[6:13, 0])
+        self.assert_buffers_equal(buffer, loaded)
+        # copy on write, adding doesn't change the files
+        self.assertEqual(files, {name: read(directory, name) for name in files})
+        loaded.save(directory)
+        self.assert_buffers_equal(buffer, ReplayBuffer.load(directory))
+        # the new rows and the next state slot after them went to a segment, the arrays stayed
+        segments = [name for name in os.listdir(directory) if name.startswith("segment-")]
+        self.assertEqual(1, len(segments))
+        with np.load(os.path.join(directory, segments[0])) as segment:
+            np.testing.assert_array_equal(np.arange(5, 13), segment["rows"])
+        for name in files:
+            if name.startswith("states-"):
+                self.assertEqual(files[name], read(directory, name))
+
+    def test_interrupted_save(self):
+        # a few rows go to a segment, more than half the capacity to a new generation of arrays
+        for count in (3, 15):
+            directory = tempfile.mkdtemp()
+            buffer = ReplayBuffer(20, prioritized=True)
+            for i in range(25):
+                buffer.add(*transition(i))
+            buffer.save(directory)
+            snapshot = ReplayBuffer.load(directory, mmap_mode=None)
+            for i in range(25, 25 + count):
+                buffer.add(*transition(i))
+            buffer.update_priorities(np.arange(5), np.arange(5.0))
+            # the save stops after writing the rows, before buffer.npz is replaced
+            with mock.patch("replay_buffer.os.replace", side_effect=OSError("interrupted")):
+                with self.assertRaises(OSError):
+                    buffer.save(directory)
+            self.assert_buffers_equal(snapshot, ReplayBuffer.load(directory))
+            buffer.save(directory)
+            self.assert_buffers_equal(buffer, ReplayBuffer.load(directory))
+            self.assertEqual(5, len([name for name in os.listdir(directory) if not name.startswith("segment-")]))
+
+
+if __name__ == '__main__':
+    unittest.main()
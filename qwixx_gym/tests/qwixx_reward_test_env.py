@@ -0,0 +1,83 @@
+import unittest
+from unittest import mock
+
+import gym
+import numpy as np
+
+import qwixx_gym
+from qwixx_gym.envs import QwixxOneHotEnv, QwixxSimple
+from qwixx_gym.envs.qwixx_reward import REWARDS, RewardFunction, ShapedReward, TerminalReward, register_reward
+
+
+def play(env, seed, games=5):
+    """Rewards, done flags and final scores of games of random legal actions"""
+    env.seed(seed)
+    rng = np.random.RandomState(seed)
+    rewards, dones, scores = [], [], []
+    for _ in range(games):
+        env.reset()
+        done = False
+        while not done:
+            _, reward, done, info = env.step(np.int64(rng.choice(np.flatnonzero(env.legal_action_mask()))))
+            rewards.append(reward)
+            dones.append(done)
+        scores.append(info["score"])
+    return rewards, dones, scores
+
+
+class QwixxRewardTest(unittest.TestCase):
+
+    def test_make_by_name(self):
+        qwixx_gym.register_envs()
+        env = gym.make("qwixx-v0", reward="terminal")
+        self.assertIsInstance(env.unwrapped.reward, TerminalReward)
+        self.assertIsInstance(QwixxOneHotEnv().reward, ShapedReward)
+        self.assertIsInstance(QwixxSimple().reward, TerminalReward)
+        with self.assertRaises(ValueError):
+            QwixxOneHotEnv(reward="unknown")
+
+    def test_terminal_pays_final_score(self):
+        rewards, dones, scores = play(QwixxOneHotEnv(reward="terminal"), 0)
+        rewards, dones = np.array(rewards), np.array(dones)
+        self.assertTrue((rewards[~dones] == 0).all())
+        self.assertEqual(scores, rewards[dones].tolist())
+
+    def test_delta_sums_to_final_score(self):
+        env = QwixxOneHotEnv(reward="delta")
+        for seed in range(5):
+            rewards, _, scores = play(env, seed, games=1)
+            self.assertEqual(scores[0], sum(rewards))
+
+    def test_shaped_is_default(self):
+        self.assertEqual(play(QwixxOneHotEnv(), 1), play(QwixxOneHotEnv(reward=ShapedReward()), 1))
+
+    def test_skip_analysis_only_when_needed(self):
+        # the kernel backend does the skip analysis inside its step kernel
+        env = QwixxOneHotEnv(reward="terminal", backend="python")
+        with mock.patch.object(env, "calculate_skip_reward") as skip:
+            play(env, 2)
+        skip.assert_not_called()
+        env = QwixxOneHotEnv(backend="python")
+        with mock.patch.object(env, "calculate_skip_reward", return_value=0) as skip:
+            play(env, 2)
+        skip.assert_called()
+
+    def test_custom_reward(self):
+        @register_reward("marks")
+        class MarkCount(RewardFunction):
+            invalid_move_reward = -1
+
+            def __call__(self, env, changed_values, current_score, skip_reward):
+                return len(changed_values)
+
+        try:
+            env = QwixxOneHotEnv(reward="marks")
+            rewards, _, _ = play(env, 3)
+            self.assertTrue(set(rewards) <= {0, 1, 2})
+            self.assertEqual(-1, env.invalid_move_reward)
+        finally:
+            del REWARDS["marks"]
+
+
+if __name__ == '__main__':
+    unittest.main()
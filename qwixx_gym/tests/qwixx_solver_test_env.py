@@ -0,0 +1,121 @@
+import tempfile
+import unittest
+
+import numpy as np
+
+from qwixx_gym.envs.qwixx_one_hot_env import QwixxOneHotEnv
+from qwixx_gym.envs.qwixx_outcomes import dice_outcomes
+from qwixx_gym.envs.qwixx_solver import QwixxSolver, expand, simulate
+from qwixx_gym.envs.qwixx_state import unpack_state
+
+
+class QwixxSolverTest(unittest.TestCase):
+
+    def setUp(self) -> None:
+        np.random.seed(2)
+        self.env = QwixxOneHotEnv(num_players=1)
+
+    def test_dice_outcomes(self):
+        dice, probabilities = dice_outcomes(np.array([False, False, False, False]))
+        self.assertEqual((21 * 6 ** 4, 6), dice.shape)
+        self.assertAlmostEqual(1.0, probabilities.sum())
+        dice, probabilities = dice_outcomes(np.array([True, False, False, True]))
+        self.assertEqual(21 * 6 ** 2, len(dice))
+        self.assertTrue((dice[:, [2, 5]] == 1).all())
+        self.assertAlmostEqual(1.0, probabilities.sum())
+
+    def test_expand_matches_step(self):
+        for _ in range(50):
+            state = self.env.get_state()
+            dice, counts, latest, strikes, turns, player = unpack_state(state)
+            actions = np.flatnonzero(self.env.legal_action_mask())
+            n = len(actions)
+            children = expand(np.tile(np.array(dice, dtype=np.int8), (n, 1)),
+                              np.tile(np.array(counts, dtype=np.int8), (n, 1)),
+                              np.tile(np.array(latest, dtype=np.int8), (n, 1)),
+                              np.full(n, strikes), np.full(n, turns), np.full(n, player), actions)
+            for i, action in enumerate(actions):
+                self.env.set_state(state)
+                self.env.step(action)
+                _, counts, latest, strikes, turns, player = unpack_state(self.env.get_state())
+                self.assertEqual(counts, children[0][i].tolist())
+                self.assertEqual(latest, children[1][i].tolist())
+                self.assertEqual((strikes, turns, player), tuple(int(c[i]) for c in children[2:]))
+            self.env.set_state(state)
+            _, _, done, _ = self.env.step(np.random.choice(actions))
+            if done:
+                self.env.reset()
+
+    def test_simulate_matches_step(self):
+        env = QwixxOneHotEnv(num_players=2, reward="delta")
+        env.seed(4)
+        states, actions, dice, expected = [], [], [], []
+        for _ in range(400):
+            state = env.get_state()
+            legal = np.flatnonzero(env.legal_action_mask())
+            # now and then an invalid move
+            action = np.random.randint(45) if np.random.random() < 0.1 else np.random.choice(legal)
+            _, reward, done, _ = env.step(np.int64(action))
+            states.append(state)
+            actions.append(action)
+            dice.append(list(env.dice.values))
+            expected.append((env.get_state(), reward, done, action in legal))
+            if done:
+                env.reset()
+        next_states, rewards, dones = simulate(states, actions, dice, num_players=2)
+        for i, (state, reward, done, legal) in enumerate(expected):
+            self.assertEqual((reward, done), (rewards[i], dones[i]))
+            self.assertEqual(state if legal else states[i], next_states[i])
+        self.assertEqual(env.simulate(states[0], actions[0], dice[0]),
+                         (next_states[0], rewards[0], dones[0]))
+
+    def test_clone_and_restore(self):
+        snapshot = self.env.clone_state()
+        played = []
+        for _ in range(2):
+            self.env.restore_state(snapshot)
+            for action in (0, 0, 0):
+                observation, _, _, _ = self.env.step(np.int64(action))
+                played.append(observation)
+        np.testing.assert_array_equal(played[:3], played[3:])
+        dice, probabilities = self.env.dice_outcomes()
+        self.assertAlmostEqual(1.0, probabilities.sum())
+        self.assertEqual(21 * 6 ** 4, len(dice))
+
+    def test_last_turn_is_exact(self):
+        # the game ends after this roll, every legal action is worth its final score
+        self.env.num_turns = 50
+        solver = QwixxSolver(depth=2)
+        values = solver.action_values(self.env.get_state())
+        mask = self.env.legal_action_mask()
+        np.testing.assert_array_equal(np.isfinite(values), mask)
+        state = self.env.get_state()
+        for action in np.flatnonzero(mask):
+            self.env.set_state(state)
+            _, _, done, info = self.env.step(action)
+            self.assertTrue(done)
+            self.assertEqual(info["score"], values[action])
+
+    def test_table_save_and_load(self):
+        solver = QwixxSolver(depth=1)
+        state = self.env.get_state()
+        values = solver.action_values(state)
+        self.assertGreater(len(solver.table), 0)
+        with tempfile.TemporaryDirectory() as path:
+            solver.save(path)
+            loaded = QwixxSolver.load(path, depth=1)
+            self.assertIsInstance(loaded.table._keys, np.memmap)
+            self.assertEqual(len(solver.table), len(loaded.table))
+            np.testing.assert_array_equal(values, loaded.action_values(state))
+            # everything came from the table
+            self.assertFalse(loaded.table._new)
+            del loaded
+
+    def test_env_optimal_action(self):
+        action = self.env.optimal_action()
+        self.assertTrue(self.env.legal_action_mask()[action])
+        self.assertEqual(action, self.env.solver.optimal_action(self.env.get_state()))
+
+
+if __name__ == '__main__':
+    unittest.main()
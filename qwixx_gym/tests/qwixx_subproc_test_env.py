@@ -0,0 +1,50 @@
+import os
+import signal
+import unittest
+
+import numpy as np
+
+from qwixx_gym.envs.qwixx_subproc_env import QwixxSubprocVectorEnv
+
+
+class QwixxSubprocVectorEnvTest(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.env = QwixxSubprocVectorEnv("qwixx-v0", num_envs=6, num_workers=3, seed=0)
+
+    def tearDown(self) -> None:
+        self.env.close()
+
+    def test_step_shapes(self):
+        observations = self.env.reset()
+        self.assertEqual((6, 1, 48), observations.shape)
+        observations, rewards, dones, info = self.env.step(np.random.randint(0, 45, size=6))
+        self.assertEqual((6, 1, 48), observations.shape)
+        self.assertEqual((6,), rewards.shape)
+        self.assertEqual((6,), info["score"].shape)
+        self.assertEqual(dones.sum(), len(info.get("terminal_observation", [])))
+
+    def test_dead_worker_is_restarted(self):
+        self.env.reset()
+        process = self.env._processes[1]
+        os.kill(process.pid, signal.SIGKILL)
+        process.join()
+        observations, rewards, dones, info = self.env.step(np.zeros(6, dtype=np.int64))
+        np.testing.assert_array_equal([False, False, True, True, False, False], info["restarted"])
+        self.assertTrue(dones[2:4].all())
+        # the new worker keeps stepping normally
+        observations, rewards, dones, info = self.env.step(np.zeros(6, dtype=np.int64))
+        self.assertFalse(info["restarted"].any())
+
+    def test_seed_is_reproducible(self):
+        other = QwixxSubprocVectorEnv("qwixx-v0", num_envs=6, num_workers=3, seed=0)
+        try:
+            np.testing.assert_array_equal(self.env.reset(), other.reset())
+            actions = np.zeros(6, dtype=np.int64)
+            np.testing.assert_array_equal(self.env.step(actions)[0], other.step(actions)[0])
+        finally:
+            other.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
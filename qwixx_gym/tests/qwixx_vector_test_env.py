@@ -0,0 +1,87 @@
+import unittest
+
+import numpy as np
+
+from qwixx_gym.envs.qwixx_one_hot_env import QwixxOneHotEnv, Dice, ColorCount, PlayerProgress
+from qwixx_gym.envs.qwixx_vector_env import QwixxVectorEnv
+
+
+class QwixxVectorEnvTest(unittest.TestCase):
+
+    def setUp(self) -> None:
+        np.random.seed(10)
+        self.vec = QwixxVectorEnv(64, num_players=2)
+        self.env = QwixxOneHotEnv(num_players=2)
+
+    def _mirror(self, i):
+        """Copies game i of the vector env into the single env"""
+        self.env.dice = Dice(*self.vec.dice[i].tolist())
+        self.env.progress = PlayerProgress()
+        self.env.progress.counts = ColorCount(*self.vec.counts[i].tolist())
+        self.env.progress.latest_num = ColorCount(*self.vec.latest_num[i].tolist())
+        self.env.progress.strikes = int(self.vec.strikes[i])
+        self.env.num_turns = int(self.vec.num_turns[i])
+        self.env.current_player = int(self.vec.current_player[i])
+
+    def test_reset_observation_matches_single_env(self):
+        observations = self.vec.reset()
+        for i in range(self.vec.num_envs):
+            self._mirror(i)
+            np.testing.assert_allclose(observations[i], self.env._serialize_state(), rtol=1e-6)
+
+    def test_step_matches_single_env(self):
+        self.vec.reset()
+        for _ in range(40):
+            # bias towards strikes so the post roll reward path is covered too
+            actions = np.random.randint(0, 45, size=self.vec.num_envs)
+            actions[np.random.random(self.vec.num_envs) < 0.3] = 0
+            strikes = (self.vec.current_player == self.vec.bot_player) & (actions == 0)
+            expected = []
+            for i, action in enumerate(actions):
+                self._mirror(i)
+                expected.append(self.env.step(action) + (self.env.progress,))
+            observations, rewards, dones, info = self.vec.step(actions)
+            terminal = iter(info.get("terminal_observation", []))
+            for i, (observation, reward, done, notes, progress) in enumerate(expected):
+                self.assertEqual(done, dones[i])
+                if "score" in notes:
+                    self.assertEqual(notes["score"], info["score"][i])
+                vec_observation = next(terminal) if done else observations[i]
+                # everything except the freshly rolled dice
+                np.testing.assert_allclose(observation[:3], vec_observation[:3])
+                np.testing.assert_allclose(observation[39:], vec_observation[39:], rtol=1e-6)
+                if strikes[i]:
+                    # the strike reward is computed on the newly rolled dice
+                    self.env.progress = progress
+                    self.env.current_player = (self.vec.bot_player + 1) % 2
+                    self.env.dice = Dice(*(vec_observation[3:39].reshape(6, 6).argmax(1) + 1).tolist())
+                    reward = self.env.calculate_skip_reward()
+                self.assertAlmostEqual(reward, rewards[i], places=4)
+
+    def test_flat_and_pair_actions_agree(self):
+        actions = np.random.randint(0, 45, size=self.vec.num_envs)
+        self.vec.seed(3)
+        self.vec.reset()
+        flat = self.vec.step(actions)
+        self.vec.seed(3)
+        self.vec.reset()
+        pairs = self.vec.step(np.stack([actions % 5, actions // 5], axis=1))
+        np.testing.assert_array_equal(flat[0], pairs[0])
+        np.testing.assert_array_equal(flat[1], pairs[1])
+        np.testing.assert_array_equal(flat[2], pairs[2])
+
+    def test_get_set_state_matches_single_env(self):
+        self.vec.step(np.random.randint(0, 45, size=self.vec.num_envs))
+        states = self.vec.get_state()
+        observations = self.vec._serialize_state().copy()
+        for i in range(self.vec.num_envs):
+            self._mirror(i)
+            self.assertEqual(states[i], self.env.get_state())
+        self.vec.reset()
+        self.vec.set_state(states)
+        np.testing.assert_array_equal(states, self.vec.get_state())
+        np.testing.assert_array_equal(observations, self.vec._serialize_state())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,270 @@
+import os
+import re
+from collections import namedtuple
+
+import numpy as np
+
+# the array and segment files ReplayBuffer.save writes, by generation
+_SNAPSHOT_FILE = re.compile(r"(states|actions|rewards|dones)-\d+\.npy|segment-\d+-\d+\.npz")
+
+Batch = namedtuple("Batch", ["states", "actions", "rewards", "next_states", "dones", "indices", "weights"])
+
+
+class SumTree:
+    """
+    Binary tree over capacity leaf priorities where every node holds the sum of its
+    children, the root the total. Updates and sampling touch one node per level and
+    run for a whole batch of leaves at once.
+    """
+
+    def __init__(self, capacity):
+        self.leaves = 1 << max(int(capacity - 1).bit_length(), 0)
+        self.depth = self.leaves.bit_length() - 1
+        self.tree = np.zeros(2 * self.leaves)
+
+    @property
+    def total(self):
+        return self.tree[1]
+
+    def __getitem__(self, indices):
+        return self.tree[self.leaves + np.asarray(indices)]
+
+    def update(self, indices, priorities):
+        nodes = self.leaves + np.asarray(indices)
+        self.tree[nodes] = priorities
+        for _ in range(self.depth):
+            nodes = np.unique(nodes >> 1)
+            self.tree[nodes] = self.tree[2 * nodes] + self.tree[2 * nodes + 1]
+
+    def find(self, values):
+        """Leaf indices whose prefix sums of priorities contain values"""
+        values = np.array(values, dtype=np.float64)
+        nodes = np.ones(len(values), dtype=np.int64)
+        for _ in range(self.depth):
+            left = 2 * nodes
+            # rounding must not lead into an empty subtree
+            right = (values >= self.tree[left]) & (self.tree[left + 1] > 0)
+            values -= np.where(right, self.tree[left], 0)
+            nodes = left + right
+        return nodes - self.leaves
+
+
+class ReplayBuffer:
+    """
+    Ring buffer of transitions in preallocated arrays, allocated on the first add
+    with the shapes and dtypes of that transition.
+
+    Next states are stored by index: add writes state to its slot and next_state to
+    the following slot, which the next transition of the episode overwrites with the
+    same observation. Transitions must therefore be added in the order they were
+    played, one env per buffer. After a done the next slot holds the reset
+    observation, targets of done transitions don't use the next state. Once full, the
+    oldest slot has lost its next state and isn't sampled.
+
+    With prioritized=True transitions are sampled proportionally to priority ** alpha
+    through a SumTree, new transitions get the highest priority seen so far and
+    update_priorities sets them from the TD errors. Batch.weights are the importance
+    sampling weights, normalized to a maximum of 1, all ones for uniform sampling.
+
+    save writes snapshots to a directory, the arrays whole now and then and the rows
+    added since in between, and load maps them back without reading them.
+    """
+
+    ARRAYS = ("states", "actions", "rewards", "dones")
+
+    def __init__(self, capacity, prioritized=False, alpha=0.6, beta=0.4, epsilon=1e-6):
+        self.capacity = capacity
+        self.prioritized = prioritized
+        self.alpha = alpha
+        self.beta = beta
+        self.epsilon = epsilon
+        self.position = 0
+        self.size = 0
+        self.states = self.actions = self.rewards = self.dones = None
+        self.tree = SumTree(capacity) if prioritized else None
+        self.max_priority = 1.0
+        # transitions added ever, and the directory, count, generation, segments and segment rows of the last save
+        self.added = 0
+        self._saved = None, 0, -1, 0, 0
+
+    def __len__(self):
+        return self.size
+
+    def add(self, state, action, reward, next_state, done):
+        if self.states is None:
+            self._allocate(np.asarray(state), np.asarray(action))
+        position = self.position
+        following = (position + 1) % self.capacity
+        self.states[position] = state
+        self.states[following] = next_state
+        self.actions[position] = action
+        self.rewards[position] = reward
+        self.dones[position] = done
+        if self.prioritized:
+            self.tree.update([position, following], [self.max_priority ** self.alpha, 0])
+        self.position = following
+        self.size = min(self.size + 1, self.capacity)
+        self.added += 1
+
+    def add_batch(self, states, actions, rewards, next_states, dones):
+        """
+        add for rows of consecutive transitions of one env, e.g. several whole
+        episodes concatenated. Only the last row's next state is written, every other
+        row's next state is taken to be the following row's state. That holds within
+        an episode, and at an episode boundary only if the row ending the episode has
+        done=True, whose target doesn't use the next state. An episode cut off without
+        done must not be followed by other rows in the same call.
+        """
+        n = len(states)
+        if not n:
+            return
+        if self.states is None:
+            self._allocate(np.asarray(states[0]), np.asarray(actions[0]))
+        positions = (self.position + np.arange(n)) % self.capacity
+        following = (self.position + n) % self.capacity
+        self.states[positions] = states
+        self.states[following] = next_states[-1]
+        self.actions[positions] = actions
+        self.rewards[positions] = rewards
+        self.dones[positions] = dones
+        if self.prioritized:
+            self.tree.update(np.append(positions, following),
+                             np.append(np.full(n, self.max_priority ** self.alpha), 0))
+        self.position = following
+        self.size = min(self.size + n, self.capacity)
+        self.added += n
+
+    def sample(self, batch_size):
+        if self.prioritized:
+            # one value from each of batch_size equal slices of the total priority
+            bounds = self.tree.total * (np.arange(batch_size) + np.random.random(batch_size)) / batch_size
+            indices = self.tree.find(bounds)
+            probabilities = self.tree[indices] / self.tree.total
+            weights = (self._sampleable() * probabilities) ** -self.beta
+            weights /= weights.max()
+        else:
+            indices = np.random.randint(0, self._sampleable(), size=batch_size)
+            if self.size == self.capacity:
+                # skip the oldest slot, its next state was overwritten
+                indices = (indices + self.position + 1) % self.capacity
+            weights = np.ones(batch_size)
+        following = (indices + 1) % self.capacity
+        return Batch(self.states[indices], self.actions[indices], self.rewards[indices],
+                     self.states[following], self.dones[indices], indices, weights.astype(np.float32))
+
+    def update_priorities(self, indices, td_errors):
+        priorities = np.abs(td_errors) + self.epsilon
+        self.max_priority = max(self.max_priority, priorities.max())
+        self.tree.update(indices, priorities ** self.alpha)
+
+    def save(self, directory):
+        """
+        Writes a snapshot of the buffer to directory. The first save writes the arrays
+        whole as a new generation of .npy files, later ones only the rows added since
+        to a new segment file, until the segments grow past half the capacity and the
+        next generation is written. No file of the last snapshot is changed: buffer.npz,
+        with the position, size and priorities, is replaced last and names the
+        generation and segments, so an interrupted save leaves the last snapshot intact.
+        """
+        directory = os.path.abspath(directory)
+        os.makedirs(directory, exist_ok=True)
+        last_directory, last_added, generation, segments, segment_rows = self._saved
+        if last_directory != directory:
+            committed = _read_metadata(directory)
+            generation = -1 if committed is None else int(committed["generation"])
+            segments = segment_rows = 0
+        if self.states is not None:
+            new = self.added - last_added
+            if last_directory != directory or segment_rows + new + 1 > self.capacity // 2:
+                generation, segments, segment_rows = generation + 1, 0, 0
+                for name, array in zip(self.ARRAYS, self._arrays()):
+                    _write(_array_path(directory, name, generation), np.save, array)
+            else:
+                rows = (self.position - new + np.arange(new + 1)) % self.capacity
+                _write(_segment_path(directory, generation, segments), np.savez, rows=rows,
+                       **{name: array[rows] for name, array in zip(self.ARRAYS, self._arrays())})
+                segments, segment_rows = segments + 1, segment_rows + len(rows)
+        metadata = dict(capacity=self.capacity, prioritized=self.prioritized, alpha=self.alpha, beta=self.beta,
+                        epsilon=self.epsilon, position=self.position, size=self.size, added=self.added,
+                        max_priority=self.max_priority, allocated=self.states is not None, generation=generation,
+                        segments=segments, segment_rows=segment_rows)
+        if self.prioritized:
+            metadata["priorities"] = self.tree[np.arange(self.capacity)]
+        temporary = os.path.join(directory, "buffer.tmp.npz")
+        _write(temporary, np.savez, **metadata)
+        os.replace(temporary, os.path.join(directory, "buffer.npz"))
+        if self.states is not None:
+            self._saved = directory, self.added, generation, segments, segment_rows
+        # files of older snapshots and of interrupted saves
+        current = {os.path.basename(_array_path(directory, name, generation)) for name in self.ARRAYS}
+        current.update(os.path.basename(_segment_path(directory, generation, k)) for k in range(segments))
+        for name in os.listdir(directory):
+            if _SNAPSHOT_FILE.fullmatch(name) and name not in current:
+                os.remove(os.path.join(directory, name))
+
+    @classmethod
+    def load(cls, directory, mmap_mode="c"):
+        """
+        The buffer saved to directory with its arrays memory mapped copy on write, so
+        adding to it doesn't change the files, or read into memory with mmap_mode=None
+        """
+        if mmap_mode not in ("c", None):
+            raise ValueError("the saved files must not change, mmap_mode is 'c' or None, not {!r}".format(mmap_mode))
+        directory = os.path.abspath(directory)
+        metadata = _read_metadata(directory)
+        buffer = cls(int(metadata["capacity"]), prioritized=bool(metadata["prioritized"]),
+                     alpha=float(metadata["alpha"]), beta=float(metadata["beta"]), epsilon=float(metadata["epsilon"]))
+        buffer.position = int(metadata["position"])
+        buffer.size = int(metadata["size"])
+        buffer.added = int(metadata["added"])
+        buffer.max_priority = float(metadata["max_priority"])
+        if buffer.prioritized:
+            buffer.tree.update(np.arange(buffer.capacity), metadata["priorities"])
+        if metadata["allocated"]:
+            generation, segments = int(metadata["generation"]), int(metadata["segments"])
+            arrays = [np.load(_array_path(directory, name, generation), mmap_mode=mmap_mode) for name in cls.ARRAYS]
+            for k in range(segments):
+                with np.load(_segment_path(directory, generation, k)) as segment:
+                    rows = segment["rows"]
+                    for name, array in zip(cls.ARRAYS, arrays):
+                        array[rows] = segment[name]
+            buffer.states, buffer.actions, buffer.rewards, buffer.dones = arrays
+            buffer._saved = directory, buffer.added, generation, segments, int(metadata["segment_rows"])
+        return buffer
+
+    def _arrays(self):
+        return self.states, self.actions, self.rewards, self.dones
+
+    def _sampleable(self):
+        return self.size - 1 if self.size == self.capacity else self.size
+
+    def _allocate(self, state, action):
+        self.states = np.zeros((self.capacity,) + state.shape, dtype=state.dtype)
+        self.actions = np.zeros((self.capacity,) + action.shape, dtype=action.dtype)
+        self.rewards = np.zeros(self.capacity, dtype=np.float32)
+        self.dones = np.zeros(self.capacity, dtype=np.bool_)
+
+
+def _array_path(directory, name, generation):
+    return os.path.join(directory, "{}-{:06d}.npy".format(name, generation))
+
+
+def _segment_path(directory, generation, index):
+    return os.path.join(directory, "segment-{:06d}-{:06d}.npz".format(generation, index))
+
+
+def _write(path, save, *args, **kwargs):
+    """Writes path with np.save or np.savez and syncs it to disk before the snapshot names it"""
+    with open(path, "wb") as f:
+        save(f, *args, **kwargs)
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def _read_metadata(directory):
+    """The contents of directory's buffer.npz, None without one"""
+    path = os.path.join(directory, "buffer.npz")
+    if not os.path.exists(path):
+        return None
+    with np.load(path) as f:
+        return {key: f[key] for key in f.files}
@@ -4,6 +4,10 @@ setup(name='qwixx_gym',
       use_scm_version=True,
       setup_requires=['setuptools_scm'],
       install_requires=['gym'],
+      # compiles the kernels of QwixxOneHotEnv(backend="kernel"), the default once installed
+      extras_require={'numba': ['numba']},
       packages=find_packages(),
       include_package_data=True,
+      # gym versions with env plugins call register_envs on import
+      entry_points={'gym.envs': ['__root__ = qwixx_gym:register_envs']},
       )